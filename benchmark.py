@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+#Benchmark suite: stepping engines x board sizes x densities on seeded boards
+#Results are written as JSON/CSV and can be checked against a stored baseline
+
+#Module Imports
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from core import ENGINES, LifeRule
+from verify import Verifier
+from soup import Soup
+
+
+
+class Benchmark():
+
+    def __init__(self, sizes, probs, engines, min_seconds=0.5, max_generations=1000, seed=0, render=False,
+                 reference_max_cells=10000, workers=None, rule='B3/S23', verify=False):
+
+        self.sizes = sizes
+        self.probs = probs
+        self.engines = engines
+        #each case steps until min_seconds have passed or max_generations are done
+        self.min_seconds = min_seconds
+        self.max_generations = max_generations
+        self.seed = seed
+        self.render = render
+        #the per-Cell reference engine is skipped on boards larger than this
+        self.reference_max_cells = reference_max_cells
+        self.workers = workers
+        self.rule = LifeRule(rule)
+        #check every engine against the reference (verify.Verifier) first, engines that fail are not timed
+        self.verify = verify
+        self.failures = {}
+
+
+    def create_engine(self, name):
+        if name == 'parallel':
+            return ENGINES[name](self.workers, rule=self.rule)
+
+        return ENGINES[name](rule=self.rule)
+
+
+    def set_board(self, rows, cols, prob):
+        #filled a band of rows at a time, a big board never has a full size float temporary
+        return Soup(rows, cols, self.seed, prob).fill(np.empty((rows, cols), dtype=bool))
+
+
+    def time_engine(self, name, rows, cols, board):
+
+        conway = self.create_engine(name)
+        board1, board2 = conway.create_boards(board)
+
+        #one generation outside the timing for buffer/pool start up
+        board1, board2 = conway.get_board_next_gen(rows, cols, 1, board1, board2)
+
+        generations = 0
+        start = time.perf_counter()
+
+        while generations < self.max_generations:
+            board1, board2 = conway.get_board_next_gen(rows, cols, 1, board1, board2)
+            generations += 1
+
+            if time.perf_counter() - start >= self.min_seconds:
+                break
+
+        seconds = time.perf_counter() - start
+
+        if hasattr(conway, 'close'):
+            conway.close()
+
+        return generations, seconds
+
+
+    def get_peak_memory(self, name, rows, cols, board):
+        #peak traced allocation for board set up plus two generations, in a separate untimed run
+        tracemalloc.start()
+
+        conway = self.create_engine(name)
+        board1, board2 = conway.create_boards(board)
+        for gen in range(2):
+            board1, board2 = conway.get_board_next_gen(rows, cols, 1, board1, board2)
+
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        if hasattr(conway, 'close'):
+            conway.close()
+
+        return peak
+
+
+    def time_render(self, rows, cols, board, frames=10):
+        #ms per frame of ArrayGrid.screen_colour_fill, pygame is only imported when asked for
+        import pygame as pg
+        import main
+
+        scale = max(1, min(10, 800 // cols))
+        if rows * cols * scale * scale > 16000000:
+            return None
+
+        screen = pg.Surface((cols * scale, rows * scale))
+        grid = main.ArrayGrid()
+        colours = {'standard': {'BLACK': (0,0,0), 'WHITE': (255,255,255)}}
+
+        start = time.perf_counter()
+        for frame in range(frames):
+            grid.screen_colour_fill(screen, board, colours, rows, cols, scale, False, 0, False)
+
+        return (time.perf_counter() - start) * 1000 / frames
+
+
+    def verify_engines(self, log=None):
+        #{engine: failures} from a short differential run on the fixed awkward shapes
+        verifier = Verifier(self.engines, generations=16, seed=self.seed, rule=self.rule.rulestring, random_shapes=0)
+        self.failures = verifier.run(log)
+
+        return self.failures
+
+
+    def run_case(self, name, rows, cols, prob):
+
+        board = self.set_board(rows, cols, prob)
+        generations, seconds = self.time_engine(name, rows, cols, board)
+
+        return {
+            'engine': name,
+            'verified': not self.failures.get(name) if self.verify else None,
+            'rows': rows,
+            'cols': cols,
+            'rule': self.rule.rulestring,
+            'prob': prob,
+            'seed': self.seed,
+            'generations': generations,
+            'seconds': seconds,
+            'gens_per_sec': generations / seconds,
+            'ns_per_cell': seconds * 1e9 / (generations * rows * cols),
+            'peak_mb': self.get_peak_memory(name, rows, cols, board) / 2**20,
+            'render_ms': self.time_render(rows, cols, board) if self.render else None,
+        }
+
+
+    def run(self, log=None):
+        results = []
+
+        if self.verify:
+            self.verify_engines(log)
+
+        for rows, cols in self.sizes:
+            for prob in self.probs:
+                for name in self.engines:
+
+                    if name == 'reference' and rows * cols > self.reference_max_cells:
+                        continue
+
+                    if self.failures.get(name):
+                        continue
+
+                    result = self.run_case(name, rows, cols, prob)
+                    results.append(result)
+
+                    if log:
+                        log(f"{name:>10} {rows}x{cols} p={prob}: {result['gens_per_sec']:.1f} gens/s, "
+                            f"{result['ns_per_cell']:.2f} ns/cell, {result['peak_mb']:.1f} MB")
+
+        return results
+
+
+    def run_scaling(self, rows, cols, worker_counts, generations=20, log=None):
+        #parallel engine gens/sec and speedup over the first worker count, one seeded board at the first density
+        prob = self.probs[0]
+        report = ENGINES['parallel'](rule=self.rule).get_scaling_report(rows, cols, worker_counts, generations, prob, self.seed)
+        results = []
+
+        for line in report:
+            result = {'engine': 'parallel', 'rows': rows, 'cols': cols, 'rule': self.rule.rulestring, 'prob': prob,
+                      'seed': self.seed, 'generations': generations, **line}
+            results.append(result)
+
+            if log:
+                log(f"{line['workers']:>3} workers {rows}x{cols} p={prob}: {line['gens_per_sec']:.1f} gens/s, "
+                    f"{line['speedup']:.2f}x")
+
+        return results
+
+
+    def write_json(self, results, path):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+    def write_csv(self, results, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+
+
+    def check_regression(self, results, baseline, threshold):
+        #cases whose gens/sec dropped by more than threshold (fraction) against the baseline results
+        key = lambda result: (result['engine'], result.get('rule', 'B3/S23'), result['rows'], result['cols'], result['prob'])
+        stored = {key(result): result for result in baseline}
+        regressions = []
+
+        for result in results:
+            old = stored.get(key(result))
+
+            if old is not None and result['gens_per_sec'] < old['gens_per_sec'] * (1 - threshold):
+                regressions.append({'case': key(result), 'baseline': old['gens_per_sec'], 'current': result['gens_per_sec']})
+
+        return regressions
+
+
+
+class BenchmarkCLI():
+
+    def main(argv=None):
+
+        parser = argparse.ArgumentParser(description='Benchmark the Game of Life stepping engines')
+        parser.add_argument('--sizes', default='60x80,256x256,1024x1024,4096x4096',
+                            help='comma separated ROWSxCOLS list')
+        parser.add_argument('--probs', default='0.2', help='comma separated initial densities')
+        parser.add_argument('--engines', default=','.join(ENGINES), help='comma separated engine names')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--rule', default='B3/S23', help='Life-like rulestring, e.g. B36/S23')
+        parser.add_argument('--min-seconds', type=float, default=0.5)
+        parser.add_argument('--max-generations', type=int, default=1000)
+        parser.add_argument('--workers', default=None,
+                            help='parallel engine process count, or comma separated counts with --scaling')
+        parser.add_argument('--scaling', default=None, metavar='ROWSxCOLS',
+                            help='report parallel engine speedup against --workers (default: 1,2,4,... up to the CPU count)')
+        parser.add_argument('--scaling-generations', type=int, default=20, help='generations timed per worker count')
+        parser.add_argument('--render', action='store_true', help='also time rendering (imports pygame)')
+        parser.add_argument('--json', default=None, help='write results as JSON')
+        parser.add_argument('--csv', default=None, help='write results as CSV')
+        parser.add_argument('--baseline', default=None, help='JSON results to check for regressions against')
+        parser.add_argument('--threshold', type=float, default=0.1, help='allowed fractional gens/sec drop')
+        parser.add_argument('--verify', action='store_true',
+                            help='check the engines against the reference first, failing engines are not timed')
+        args = parser.parse_args(argv)
+
+        sizes = [tuple(int(n) for n in size.split('x')) for size in args.sizes.split(',')]
+        probs = [float(prob) for prob in args.probs.split(',')]
+        workers = [int(n) for n in args.workers.split(',')] if args.workers else None
+
+        if args.scaling:
+            #the scaling report times one engine on one board, there is no baseline to compare it with
+            if args.baseline:
+                parser.error('--baseline does not work with --scaling')
+            if workers is None:
+                workers = [1]
+                while workers[-1] * 2 <= os.cpu_count():
+                    workers.append(workers[-1] * 2)
+        elif workers is not None and len(workers) > 1:
+            parser.error('more than one --workers count needs --scaling')
+
+        bench = Benchmark(sizes, probs, args.engines.split(','), args.min_seconds, args.max_generations, args.seed,
+                          args.render, workers=workers[0] if workers else None, rule=args.rule, verify=args.verify)
+
+        if args.scaling:
+            rows, cols = (int(n) for n in args.scaling.split('x'))
+            results = bench.run_scaling(rows, cols, workers, args.scaling_generations, log=print)
+        else:
+            results = bench.run(log=print)
+
+        failed = [name for name, failures in bench.failures.items() if failures]
+        for name in failed:
+            print(f'UNVERIFIED {name}: {len(bench.failures[name])} mismatches against the reference, not timed')
+
+        if args.json:
+            bench.write_json(results, args.json)
+
+        if args.csv:
+            bench.write_csv(results, args.csv)
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = bench.check_regression(results, json.load(f), args.threshold)
+
+            for regression in regressions:
+                print(f"REGRESSION {regression['case']}: {regression['baseline']:.1f} -> {regression['current']:.1f} gens/s")
+
+            if regressions:
+                sys.exit(1)
+
+        if failed:
+            sys.exit(1)
+
+        return results
+
+
+    if __name__ == '__main__':
+        main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+#Runs on memory-mapped boards with atomic checkpoints, for boards too big (or runs too long) to trust to RAM
+#
+#A run directory holds three board files and checkpoint.json. The checkpointed board file is never written
+#to: stepping alternates between the other two, and a checkpoint flushes the current one and then atomically
+#replaces checkpoint.json to point at it. A crash at any moment leaves the last checkpoint intact, and resuming
+#is just mapping that file again, no parse or copy.
+
+#Module Imports
+import json
+import os
+import numpy as np
+
+from core import LifeRule, NumpyConwayLogic, BitPackedConwayLogic
+from soup import Soup
+
+
+FORMATS = ('packed', 'uint8')
+
+
+
+class MappedRun():
+    #format 'packed': 64 cells per uint64 word, stepped by BitPackedConwayLogic
+    #format 'uint8': one byte per cell, stepped by NumpyConwayLogic
+    #either way only band_rows rows are worked on in RAM at a time, the OS pages the rest
+
+    def __init__(self, path, band_rows=1024):
+        self.path = path
+        self.band_rows = band_rows
+        self.boards = None
+
+
+    def get_board_path(self, i):
+        return os.path.join(self.path, f'board-{i}.bin')
+
+
+    def get_shape(self):
+        if self.format == 'packed':
+            return self.rows, BitPackedConwayLogic().get_word_count(self.cols)
+
+        return self.rows, self.cols
+
+
+    def map_boards(self, mode):
+        dtype = np.uint64 if self.format == 'packed' else bool
+        self.boards = [np.memmap(self.get_board_path(i), dtype=dtype, mode=mode, shape=self.get_shape()) for i in range(3)]
+
+        rule = LifeRule(self.rule)
+        if self.format == 'packed':
+            self.conway = BitPackedConwayLogic(self.band_rows, rule)
+        else:
+            self.conway = NumpyConwayLogic(rule)
+
+
+    def create(self, rows, cols, format='packed', rule='B3/S23', prob=0.2, seed=None):
+        #new run of a seeded random soup, checkpointed at generation 0
+        if format not in FORMATS:
+            raise ValueError(f'unknown board format {format!r}, expected one of {FORMATS}')
+
+        os.makedirs(self.path, exist_ok=True)
+        self.rows, self.cols = rows, cols
+        self.format = format
+        self.rule = LifeRule(rule).rulestring
+        self.prob = prob
+        self.seed = seed
+        self.generation = 0
+
+        self.map_boards('w+')
+
+        #filled band by band, the soup is the same however it is split
+        soup = Soup(rows, cols, seed, prob)
+        self.seed = soup.seed
+        for start in range(0, rows, self.band_rows):
+            self.set_rows(0, start, soup.get_rows(start, min(start + self.band_rows, rows)))
+
+        self.current = self.checkpointed = 0
+        self.checkpoint()
+
+
+    def resume(self):
+        #map the boards of the last checkpoint, returns its generation
+        with open(os.path.join(self.path, 'checkpoint.json')) as f:
+            state = json.load(f)
+
+        self.rows, self.cols = state['rows'], state['cols']
+        self.format = state['format']
+        self.rule = state['rule']
+        self.prob = state['prob']
+        self.seed = state['seed']
+        self.generation = state['generation']
+
+        self.map_boards('r+')
+        self.current = self.checkpointed = state['board']
+
+        return self.generation
+
+
+    def checkpoint(self):
+        #make the current generation the one a resume starts from
+        self.boards[self.current].flush()
+
+        state = {
+            'rows': self.rows,
+            'cols': self.cols,
+            'format': self.format,
+            'rule': self.rule,
+            'prob': self.prob,
+            'seed': self.seed,
+            'generation': self.generation,
+            'board': self.current,
+        }
+
+        temp = os.path.join(self.path, 'checkpoint.json.tmp')
+        with open(temp, 'w') as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp, os.path.join(self.path, 'checkpoint.json'))
+        self.checkpointed = self.current
+
+
+    def step(self):
+        #next generation into whichever board file is neither the current nor the checkpointed one
+        target = next(i for i in range(3) if i not in (self.current, self.checkpointed))
+        board1, board2 = self.boards[self.current], self.boards[target]
+
+        if self.format == 'packed':
+            self.conway.get_packed_next_gen(self.rows, self.cols, board1, board2)
+
+        else:
+            for start in range(0, self.rows, self.band_rows):
+                stop = min(start + self.band_rows, self.rows)
+                self.conway.get_band_next_gen(stop - start, self.cols, board1[start:stop], board2[start:stop],
+                                              board1[start - 1], board1[stop % self.rows])
+
+        self.current = target
+        self.generation += 1
+
+
+    def advance(self, generations, checkpoint_every=None):
+        #step generations, checkpointing every checkpoint_every generations and at the end
+        for gen in range(generations):
+            self.step()
+
+            if checkpoint_every and self.generation % checkpoint_every == 0:
+                self.checkpoint()
+
+        if self.checkpointed != self.current:
+            self.checkpoint()
+
+
+    def set_rows(self, i, start, rows):
+        #write a bool band of rows into board file i
+        if self.format == 'packed':
+            self.boards[i][start:start + len(rows)] = self.conway.pack_board(rows)
+        else:
+            self.boards[i][start:start + len(rows)] = rows
+
+
+    def get_board(self, rows=None, cols=None, top=0, left=0):
+        #bool window of the current generation (the whole board by default)
+        rows = self.rows - top if rows is None else rows
+        cols = self.cols - left if cols is None else cols
+        board = self.boards[self.current]
+
+        if self.format == 'packed':
+            words = board[top:top + rows, left // 64:-(-(left + cols) // 64)]
+            return self.conway.unpack_board(words, left % 64 + cols)[:, left % 64:]
+
+        return np.array(board[top:top + rows, left:left + cols])
+
+
+    def get_population(self):
+        board = self.boards[self.current]
+        population = 0
+
+        for start in range(0, self.rows, self.band_rows):
+            band = board[start:start + self.band_rows]
+            if self.format == 'packed':
+                population += int(np.unpackbits(np.ascontiguousarray(band).view(np.uint8)).sum())
+            else:
+                population += int(np.count_nonzero(band))
+
+        return population
+
+
+    def close(self):
+        self.boards = None
@@ -0,0 +1,2062 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+#Simulation core: boards and stepping engines
+#Importing this module never imports pygame, so it runs on display-less machines and starts workers fast
+
+#Module Imports
+import numpy as np
+import json
+import time
+import os
+import queue
+import threading
+from collections import deque
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+from soup import Soup, TILE
+from monitor import count_band, count_packed_band
+
+
+
+class Cell():
+    
+    def __init__(self, state=False):
+        #True = Alive, False = Dead 
+        self.state = state      
+
+
+
+class CellBoard():
+    #Board stored as an object array of Cells
+    
+    def create_empty_2d_array(self, rows, cols):
+        return np.full(shape=(rows, cols),fill_value=None)
+
+    
+    def fill_array_with_cells(self, board, rows, cols, rand=None, prob=None, seed=None):
+            #rand fills a seeded Soup of density prob (seed None = a fresh soup each time)
+
+            states = Soup(rows, cols, seed, prob).get_rows(0, rows) if rand else np.zeros((rows, cols), dtype=bool)
+
+            for r in range(rows):
+
+                for c in range(cols):
+
+                    board[r][c] = Cell(bool(states[r, c]))
+                            
+            return board
+
+
+    def get_cell_state(self, board, r, c):
+        return board[r][c].state
+
+
+    def set_cell_state(self, board, r, c, state):
+        board[r][c].state = state
+
+
+    def set_cells_state(self, board, rows, cols, state):
+        for r, c in zip(rows, cols):
+            board[r][c].state = state
+
+
+    def cells_to_bool_array(self, board):
+        #Cell object array -> contiguous bool array of states
+        return np.frompyfunc(lambda cell: cell.state, 1, 1)(board).astype(bool)
+
+
+    def bool_array_to_cells(self, array, board):
+        #write a bool array back into an existing Cell object array
+        for r, c in np.ndindex(array.shape):
+            board[r][c].state = bool(array[r, c])
+
+        return board
+
+
+
+class ArrayBoard(CellBoard):
+    #Board stored as a contiguous bool array (True = Alive) instead of an object array of Cells
+
+    def create_empty_2d_array(self, rows, cols):
+        return np.zeros(shape=(rows, cols), dtype=bool)
+
+
+    def fill_array_with_cells(self, board, rows, cols, rand=None, prob=None, seed=None):
+
+        if rand:
+            Soup(rows, cols, seed, prob).fill(board)
+        else:
+            board[:rows, :cols] = False
+
+        return board
+
+
+    def get_cell_state(self, board, r, c):
+        return bool(board[r, c])
+
+
+    def set_cell_state(self, board, r, c, state):
+        board[r, c] = state
+
+
+    def set_cells_state(self, board, rows, cols, state):
+        board[rows, cols] = state
+                
+
+
+
+class LifeRule():
+    #Life-like rule from a B/S rulestring (B3/S23, B36/S23, B2/S, or the older S/B form 23/3)
+    #compiled to a lookup table indexed by alive*9 + live neighbour count
+
+    def __init__(self, rulestring='B3/S23'):
+
+        self.birth, self.survival = self.parse(rulestring)
+        self.rulestring = 'B' + ''.join(map(str, self.birth)) + '/S' + ''.join(map(str, self.survival))
+
+        #table[alive, neighbour_total] -> next state
+        self.table = np.zeros((2, 9), dtype=bool)
+        self.table[0, self.birth] = True
+        self.table[1, self.survival] = True
+
+        #the same 18 entries as bits of one word, so a vectorised lookup is a shift and mask
+        self.mask = np.uint32(sum(1 << i for i, entry in enumerate(self.table.ravel()) if entry))
+
+
+    def parse(self, rulestring):
+        parts = rulestring.strip().upper().split('/')
+
+        if len(parts) != 2:
+            raise ValueError(f'rulestring {rulestring!r} is not of the form B.../S...')
+
+        if parts[0].isdigit() or parts[1].isdigit() or parts == ['', '']:
+            #older S/B notation, e.g. 23/3
+            parts = ['S' + parts[0], 'B' + parts[1]]
+
+        digits = {}
+        for part in parts:
+            if not part or part[0] not in 'BS' or any(d not in '012345678' for d in part[1:]):
+                raise ValueError(f'rulestring {rulestring!r} is not of the form B.../S...')
+            digits[part[0]] = sorted({int(d) for d in part[1:]})
+
+        if set(digits) != {'B', 'S'}:
+            raise ValueError(f'rulestring {rulestring!r} needs one B and one S part')
+
+        return digits['B'], digits['S']
+
+
+    def get_next_state(self, state, neighbour_total):
+        return bool(self.table[int(state), neighbour_total])
+
+
+    def lookup(self, index, out=None, scratch=None):
+        #next states for an array of alive*9 + neighbour_total indexes, one vectorised gather
+        scratch = np.right_shift(self.mask, index, out=scratch)
+        np.bitwise_and(scratch, 1, out=scratch)
+
+        if out is None:
+            return scratch.astype(bool)
+
+        out.view(np.uint8)[...] = scratch
+
+        return out
+
+
+    def __eq__(self, other):
+        return isinstance(other, LifeRule) and self.rulestring == other.rulestring
+
+
+    def __repr__(self):
+        return f'LifeRule({self.rulestring!r})'
+
+
+
+class ConwayLogic():
+
+    def __init__(self, rule=None):
+        #None keeps the hard coded B3/S23 branches below, a LifeRule replaces them with its table
+        self.rule = rule
+        #monitor.StatsStream told about every generation, counted in the cell loop
+        self.stats = None
+
+    
+    def get_neighbours(self, r, c, rows, cols, board):
+    
+            total = 0
+
+            for n in range(-1,2):
+                for m in range(-1,2):
+
+                    row_wrap = (r + n + rows) % (rows)
+                    col_wrap = (c + m + cols)  % (cols)
+
+                    if board[row_wrap][col_wrap].state == True:
+                        total+=1
+
+            if board[r][c].state ==True:
+                total -=1
+
+            return total
+    
+
+    def get_cell_next_state(self, r, c, rows, cols, scale, board):
+        
+        neighbour_total = self.get_neighbours(r, c, rows, cols, board)
+
+        if self.rule is not None:
+            return self.rule.get_next_state(board[r][c].state, neighbour_total)
+
+        if board[r][c].state == True:
+            
+            #RULE: ANY LIVE CELL WITH N < 2 OR N > 3 DIES
+            if neighbour_total>3 or neighbour_total < 2:
+                return False
+            
+            #RULE: ANY LIVE CELL WITH N ==2 OR N ==3 LIVES
+            if neighbour_total == 2 or neighbour_total == 3:
+                return True
+
+
+        #RULE: ANY DEAD CELL WITH N == 3 LIVES
+        if board[r][c].state == False:
+            if neighbour_total == 3:
+                return True
+            #ELSE DEAD REMAIN DEAD
+            else:
+                return False
+        
+                                    
+        
+        
+    def get_board_next_gen(self, rows, cols, scale, board1, board2):
+
+                if self.stats is not None:
+                    return self.get_board_next_gen_with_stats(rows, cols, scale, board1, board2)
+
+                for r in range(rows):
+
+                    for c in range(cols):
+
+                        board2[r][c].state = self.get_cell_next_state(r, c, rows, cols, scale, board1)
+
+                board1, board2 = board2, board1
+
+                return board1, board2
+
+
+    def get_board_next_gen_with_stats(self, rows, cols, scale, board1, board2):
+        #the same cell loop, counting population, births, deaths and the live bounding box as it goes
+        population = births = deaths = 0
+        top, left, bottom, right = rows, cols, -1, -1
+
+        for r in range(rows):
+
+            for c in range(cols):
+
+                state = self.get_cell_next_state(r, c, rows, cols, scale, board1)
+                board2[r][c].state = state
+
+                if state:
+                    population += 1
+                    top, bottom = min(top, r), max(bottom, r)
+                    left, right = min(left, c), max(right, c)
+
+                    if not board1[r][c].state:
+                        births += 1
+
+                elif board1[r][c].state:
+                    deaths += 1
+
+        self.stats.record_counts(population, births, deaths, (top, left, bottom, right) if population else None)
+
+        return board2, board1
+
+
+    def create_boards(self, board):
+        #bool board -> (board1, board2) in this engine's own format
+        rows, cols = board.shape
+        board1 = CellBoard().fill_array_with_cells(CellBoard().create_empty_2d_array(rows, cols), rows, cols)
+        board2 = CellBoard().fill_array_with_cells(CellBoard().create_empty_2d_array(rows, cols), rows, cols)
+
+        return CellBoard().bool_array_to_cells(board, board1), board2
+
+
+    def to_bool_array(self, rows, cols, board):
+        return CellBoard().cells_to_bool_array(board)
+
+
+
+class NumpyConwayLogic():
+    #Vectorised stepping over whole bool arrays for any LifeRule (B3/S23 by default)
+    #Same toroidal wrap and get_board_next_gen contract as ConwayLogic
+
+    def __init__(self, rule=None):
+        self.rule = rule or LifeRule()
+
+        #scratch buffers reused between generations, views of flat buffers that only grow
+        self.padded = None
+        self.counts = None
+        self.scratch = None
+        self.buffers = None
+        #advance(): band copies with halos, and the full board between sweeps
+        self.bands = None
+        self.sweep_board = None
+        #monitor.StatsStream told about every get_board_next_gen generation, each band counted as it is stepped
+        self.stats = None
+
+
+    def get_neighbour_counts(self, rows, cols, board, above=None, below=None, with_state=False):
+        #above/below are the halo rows for a band of a larger board, default wraps the board itself
+        #with_state adds 9 for live cells, giving LifeRule table indexes instead of plain counts
+        #leading axes are treated as a stack of independent boards (see Ensemble)
+
+        if above is None:
+            above, below = board[..., -1, :], board[..., 0, :]
+
+        stack = board.shape[:-2]
+
+        if self.padded is None or self.padded.shape != stack + (rows+2, cols+2):
+            self.padded, self.counts, self.scratch = self.get_buffers(stack, rows, cols)
+
+        padded = self.padded
+        counts = self.counts
+
+        #copy the board into a one cell halo that repeats the opposite edges (torus wrap)
+        padded[..., 1:-1, 1:-1] = board
+        padded[..., 0, 1:-1] = above
+        padded[..., -1, 1:-1] = below
+        padded[..., :, 0] = padded[..., :, -2]
+        padded[..., :, -1] = padded[..., :, 1]
+
+        #sum the eight shifted neighbour planes
+        if with_state:
+            np.multiply(padded[..., 1:-1, 1:-1], 9, out=counts)
+            counts += padded[..., :-2, :-2]
+            counts += padded[..., :-2, 1:-1]
+        else:
+            np.add(padded[..., :-2, :-2], padded[..., :-2, 1:-1], out=counts)
+
+        counts += padded[..., :-2, 2:]
+        counts += padded[..., 1:-1, :-2]
+        counts += padded[..., 1:-1, 2:]
+        counts += padded[..., 2:, :-2]
+        counts += padded[..., 2:, 1:-1]
+        counts += padded[..., 2:, 2:]
+
+        return counts
+
+
+    def get_buffers(self, stack, rows, cols):
+        #(padded, counts, scratch) for a board shape, changing shapes (advance() bands) reuse the same memory
+        size = int(np.prod(stack, dtype=np.int64)) * (rows+2) * (cols+2)
+
+        if self.buffers is None or self.buffers[0].size < size:
+            self.buffers = (np.empty(size, dtype=np.uint8), np.empty(size, dtype=np.uint8), np.empty(size, dtype=np.uint32))
+
+        padded, counts, scratch = self.buffers
+        cells = size // (rows+2) // (cols+2) * rows * cols
+
+        return (padded[:size].reshape(stack + (rows+2, cols+2)), counts[:cells].reshape(stack + (rows, cols)),
+                scratch[:cells].reshape(stack + (rows, cols)))
+
+
+    def get_board_next_gen(self, rows, cols, scale, board1, board2):
+
+        cells = board1.dtype == object
+
+        if cells:
+            #Cell object boards still work, at the cost of a conversion each way
+            state = CellBoard().cells_to_bool_array(board1)
+        else:
+            state = board1
+
+        if cells:
+            next_state = self.get_band_next_gen(rows, cols, state)
+            CellBoard().bool_array_to_cells(next_state, board2)
+
+            if self.stats is not None:
+                self.stats.record(state, next_state)
+
+        elif self.stats is not None:
+            self.get_board_next_gen_with_stats(rows, cols, state, board2)
+        else:
+            self.get_band_next_gen(rows, cols, state, board2)
+
+        board1, board2 = board2, board1
+
+        return board1, board2
+
+
+    def get_board_next_gen_with_stats(self, rows, cols, board, out):
+        #the step a band of rows at a time (about 256k cells, like advance()), each band counted for self.stats
+        #straight after it is stepped, while it is still in cache
+        band_rows = max(1, 2**18 // cols)
+        bands = []
+
+        for start in range(0, rows, band_rows):
+            stop = min(start + band_rows, rows)
+            self.get_band_next_gen(stop - start, cols, board[start:stop], out[start:stop], board[start - 1], board[stop % rows])
+            bands.append((start, count_band(board[start:stop], out[start:stop])))
+
+        self.stats.record_bands(bands)
+
+
+    def get_band_next_gen(self, rows, cols, band, out=None, above=None, below=None):
+        #next state of band (the whole board unless above/below halo rows are given)
+        index = self.get_neighbour_counts(rows, cols, band, above, below, with_state=True)
+
+        return self.rule.lookup(index, out, self.scratch)
+
+
+    def advance(self, board, k, out=None, depth=8, band_rows=None):
+        #k generations of a bool board in one call, the same as k get_board_next_gen steps
+        #temporal blocking: each band of band_rows rows is copied with depth halo rows above and below and
+        #stepped depth generations while it is in cache, the halo shrinking a row a side per generation,
+        #so the board streams through memory once per depth generations instead of every generation
+        #out must not be board, the bands read the starting board until the sweep is done
+        rows, cols = board.shape
+        out = np.empty_like(board) if out is None else out
+
+        #about 256k cells a band keeps its working set (about 8 bytes a cell) in cache
+        if band_rows is None:
+            band_rows = max(4 * depth, 2**18 // cols)
+
+        if k <= 0:
+            out[...] = board
+            return out
+
+        if self.sweep_board is None or self.sweep_board.shape != board.shape:
+            self.sweep_board = np.empty_like(board)
+
+        sweeps = [depth] * (k // depth) + ([k % depth] if k % depth else [])
+
+        #alternate between out and sweep_board so that the last sweep lands in out
+        targets = [out, self.sweep_board] if len(sweeps) % 2 else [self.sweep_board, out]
+        source = board
+
+        for i, generations in enumerate(sweeps):
+            self.sweep(source, targets[i % 2], generations, band_rows)
+            source = targets[i % 2]
+
+        return out
+
+
+    def sweep(self, board, out, generations, band_rows):
+        #one temporally blocked pass of advance(): generations steps, band by band
+        rows, cols = board.shape
+        height = band_rows + 2 * generations
+
+        if self.bands is None or self.bands[0].shape[0] < height or self.bands[0].shape[1] != cols:
+            self.bands = (np.empty((height, cols), dtype=bool), np.empty((height, cols), dtype=bool))
+
+        for start in range(0, rows, band_rows):
+            stop = min(start + band_rows, rows)
+            height = stop - start + 2 * generations
+            band, next_band = self.bands[0][:height], self.bands[1][:height]
+
+            #rows start-generations to stop+generations with torus wrap, halos may wrap more than once on small boards
+            np.take(board, np.arange(start - generations, stop + generations) % rows, axis=0, out=band)
+
+            for gen in range(generations):
+                #row gen and row height-1-gen are the halo rows of this generation, rows outside them are stale
+                self.get_band_next_gen(height - 2 - 2*gen, cols, band[gen+1:height-1-gen], next_band[gen+1:height-1-gen],
+                                       band[gen], band[height-1-gen])
+                band, next_band = next_band, band
+
+            out[start:stop] = band[generations:generations + stop - start]
+
+        return out
+
+
+    def create_boards(self, board):
+        #bool board -> (board1, board2) in this engine's own format
+        return board.astype(bool), np.zeros(board.shape, dtype=bool)
+
+
+    def to_bool_array(self, rows, cols, board):
+        if board.dtype == object:
+            return CellBoard().cells_to_bool_array(board)
+
+        return board
+
+
+
+class BitPackedConwayLogic():
+    #LifeRule stepping (B3/S23 by default) on boards packed 64 cells per uint64 word along each row
+    #bit j of word w holds column w*64 + j, unused bits of the last word stay zero
+
+    def __init__(self, block_rows=256, rule=None):
+        #rows stepped per block, bounds the size of the temporary bit planes
+        self.block_rows = block_rows
+        self.rule = rule or LifeRule()
+        #monitor.StatsStream told about every generation, each block counted on the packed words as it is stepped
+        self.stats = None
+
+
+    def get_word_count(self, cols):
+        return (cols + 63) // 64
+
+
+    def create_empty_packed_array(self, rows, cols):
+        return np.zeros(shape=(rows, self.get_word_count(cols)), dtype=np.uint64)
+
+
+    def pack_board(self, board):
+        #Cell object or bool board -> packed uint64 board
+        if board.dtype == object:
+            board = CellBoard().cells_to_bool_array(board)
+
+        rows, cols = board.shape
+        padded = np.zeros((rows, self.get_word_count(cols) * 64), dtype=bool)
+        padded[:, :cols] = board
+
+        return np.packbits(padded, axis=1, bitorder='little').view('<u8').astype(np.uint64)
+
+
+    def unpack_board(self, packed, cols):
+        #packed uint64 board -> bool board
+        as_bytes = np.ascontiguousarray(packed, dtype='<u8').view(np.uint8)
+
+        return np.unpackbits(as_bytes, axis=1, bitorder='little')[:, :cols].astype(bool)
+
+
+    def packed_to_cells(self, packed, cols, board):
+        #write a packed board back into an existing Cell object array
+        return CellBoard().bool_array_to_cells(self.unpack_board(packed, cols), board)
+
+
+    def shift_west(self, words, cols):
+        #plane holding each cell's west neighbour (column c-1, wrapping to cols-1)
+        tail = cols - 64 * (words.shape[1] - 1)
+        plane = (words << np.uint64(1)) | (np.roll(words, 1, axis=1) >> np.uint64(63))
+        plane[:, 0] |= (words[:, -1] >> np.uint64(tail - 1)) & np.uint64(1)
+
+        return plane
+
+
+    def shift_east(self, words, cols):
+        #plane holding each cell's east neighbour (column c+1, wrapping to 0)
+        tail = cols - 64 * (words.shape[1] - 1)
+        plane = (words >> np.uint64(1)) | (np.roll(words, -1, axis=1) << np.uint64(63))
+        plane[:, -1] |= (words[:, 0] & np.uint64(1)) << np.uint64(tail - 1)
+
+        return plane
+
+
+    def full_add(self, a, b, c):
+        #bitwise full adder, returns (sum, carry)
+        half = a ^ b
+        return half ^ c, (a & b) | (half & c)
+
+
+    def get_block_next_gen(self, rows_above, rows, rows_below, cols):
+        #rows_above/rows_below are the block shifted by one row with torus wrap
+        west, east = self.shift_west(rows, cols), self.shift_east(rows, cols)
+
+        #add the eight neighbour planes as 1-bit counters
+        ones_a, twos_a = self.full_add(rows_above, self.shift_west(rows_above, cols), self.shift_east(rows_above, cols))
+        ones_b, twos_b = self.full_add(rows_below, self.shift_west(rows_below, cols), self.shift_east(rows_below, cols))
+        ones_c, twos_c = west ^ east, west & east
+
+        ones, twos_d = self.full_add(ones_a, ones_b, ones_c)
+        twos_e, fours_e = self.full_add(twos_a, twos_b, twos_c)
+        twos, fours_f = twos_e ^ twos_d, twos_e & twos_d
+
+        return self.apply_rule(rows, ones, twos, fours_e ^ fours_f, fours_e & fours_f)
+
+
+    def apply_rule(self, alive, ones, twos, fours, eights):
+        #OR together a (neighbour_total == n) plane for every n the rule table switches on
+        next_state = np.zeros_like(alive)
+
+        for n in range(9):
+            born, survives = self.rule.table[0, n], self.rule.table[1, n]
+
+            if not (born or survives):
+                continue
+
+            if n == 8:
+                plane = eights.copy()
+            else:
+                plane = ~eights
+                for bit, counter in enumerate((ones, twos, fours)):
+                    plane &= counter if n >> bit & 1 else ~counter
+
+            if not survives:
+                plane &= ~alive
+            elif not born:
+                plane &= alive
+
+            next_state |= plane
+
+        return next_state
+
+
+    def get_packed_next_gen(self, rows, cols, board1, board2, bands=None):
+        #bands: a list each block's (start, count_packed_band counts) is appended to, counted while it is in cache
+
+        tail = cols - 64 * (board1.shape[1] - 1)
+        tail_mask = np.uint64((1 << tail) - 1)
+
+        for start in range(0, rows, self.block_rows):
+            stop = min(start + self.block_rows, rows)
+
+            above = np.take(board1, range(start - 1, stop - 1), axis=0, mode='wrap')
+            below = np.take(board1, range(start + 1, stop + 1), axis=0, mode='wrap')
+
+            board2[start:stop] = self.get_block_next_gen(above, board1[start:stop], below, cols)
+
+            #clear the unused bits of the last word
+            board2[start:stop, -1] &= tail_mask
+
+            if bands is not None:
+                bands.append((start, count_packed_band(board1[start:stop], board2[start:stop], cols)))
+
+        return board2
+
+
+    def get_board_next_gen(self, rows, cols, scale, board1, board2):
+
+        bands = [] if self.stats is not None else None
+
+        if board1.dtype == np.uint64:
+            self.get_packed_next_gen(rows, cols, board1, board2, bands)
+
+        else:
+            #Cell object and bool boards are packed and unpacked around the step
+            packed = self.get_packed_next_gen(rows, cols, self.pack_board(board1), self.create_empty_packed_array(rows, cols), bands)
+
+            if board2.dtype == object:
+                self.packed_to_cells(packed, cols, board2)
+            else:
+                board2[...] = self.unpack_board(packed, cols)
+
+        if bands is not None:
+            self.stats.record_bands(bands)
+
+        board1, board2 = board2, board1
+
+        return board1, board2
+
+
+    def create_boards(self, board):
+        #bool board -> (board1, board2) in this engine's own format
+        rows, cols = board.shape
+        return self.pack_board(board), self.create_empty_packed_array(rows, cols)
+
+
+    def to_bool_array(self, rows, cols, board):
+        if board.dtype == np.uint64:
+            return self.unpack_board(board, cols)
+
+        return NumpyConwayLogic().to_bool_array(rows, cols, board)
+
+
+
+class SparseConwayLogic():
+    #LifeRule stepping (B3/S23 by default) on bool boards that only re-evaluates tiles near the last generation's changes
+    #Stable and empty tiles are skipped, so cost per generation follows activity rather than area
+
+    def __init__(self, tile_size=16, rule=None):
+        self.tile_size = tile_size
+        self.rule = rule or LifeRule()
+        self.fallback = NumpyConwayLogic(self.rule)
+        self.last_board = None
+        #tiles (tile row, tile col) that changed in the last generation
+        self.changed_tiles = set()
+        #monitor.StatsStream told about every generation, births and deaths counted in the changed tiles only
+        self.stats = None
+        #live cells per tile and in all while stats are attached, recounted from the whole board when they are
+        self.tile_population = None
+        self.population = 0
+
+
+    def mark_changed(self, r, c):
+        #record an edit made to the board outside of stepping (e.g. mouse drawing)
+        self.changed_tiles.add((r // self.tile_size, c // self.tile_size))
+
+
+    def mark_cells_changed(self, rows, cols):
+        #mark_changed for arrays of edited cells (a brush stroke)
+        tiles = np.unique(np.column_stack([rows // self.tile_size, cols // self.tile_size]), axis=0)
+        self.changed_tiles.update(map(tuple, tiles.tolist()))
+
+
+    def mark_all_changed(self):
+        self.last_board = None
+
+
+    def get_tile_counts(self, rows, cols):
+        return -(-rows // self.tile_size), -(-cols // self.tile_size)
+
+
+    def count_tiles(self, rows, cols, board):
+        #live cells in every tile of a whole board, for a new board or stats attached part way through a run
+        size = self.tile_size
+        counts = np.add.reduceat(board.view(np.uint8), np.arange(0, rows, size), axis=0, dtype=np.int64)
+        self.tile_population = np.add.reduceat(counts, np.arange(0, cols, size), axis=1)
+        self.population = int(self.tile_population.sum())
+
+
+    def get_bounding_box(self, board):
+        #live cell box of board, only the outermost occupied tile rows and columns are read
+        occupied = self.tile_population > 0
+        tile_rows = np.flatnonzero(occupied.any(axis=1))
+        if not len(tile_rows):
+            return None
+
+        tile_cols = np.flatnonzero(occupied.any(axis=0))
+        size = self.tile_size
+
+        top = tile_rows[0] * size + np.flatnonzero(board[tile_rows[0] * size:(tile_rows[0] + 1) * size].any(axis=1))[0]
+        bottom = tile_rows[-1] * size + np.flatnonzero(board[tile_rows[-1] * size:(tile_rows[-1] + 1) * size].any(axis=1))[-1]
+        band = board[top:bottom + 1]
+        left = tile_cols[0] * size + np.flatnonzero(band[:, tile_cols[0] * size:(tile_cols[0] + 1) * size].any(axis=0))[0]
+        right = tile_cols[-1] * size + np.flatnonzero(band[:, tile_cols[-1] * size:(tile_cols[-1] + 1) * size].any(axis=0))[-1]
+
+        return int(top), int(left), int(bottom), int(right)
+
+
+    def get_tiles_to_evaluate(self, rows, cols):
+        #changed tiles plus their 8 tile neighbourhoods, wrapping like get_neighbours
+        tile_rows, tile_cols = self.get_tile_counts(rows, cols)
+        tiles = set()
+
+        for tr, tc in self.changed_tiles:
+            for n in range(-1, 2):
+                for m in range(-1, 2):
+                    tiles.add(((tr + n) % tile_rows, (tc + m) % tile_cols))
+
+        return tiles
+
+
+    def get_tile_next_gen(self, tr, tc, rows, cols, board):
+
+        size = self.tile_size
+        r0, c0 = tr * size, tc * size
+        r1, c1 = min(r0 + size, rows), min(c0 + size, cols)
+
+        #tile plus one cell halo, wrapped at the board edges
+        patch = board[np.ix_(np.arange(r0 - 1, r1 + 1) % rows, np.arange(c0 - 1, c1 + 1) % cols)].view(np.uint8)
+
+        #alive*9 + neighbour_total, the LifeRule table index
+        counts = patch[1:-1, 1:-1] * np.uint8(9)
+        counts += patch[:-2, :-2]
+        counts += patch[:-2, 1:-1]
+        counts += patch[:-2, 2:]
+        counts += patch[1:-1, :-2]
+        counts += patch[1:-1, 2:]
+        counts += patch[2:, :-2]
+        counts += patch[2:, 1:-1]
+        counts += patch[2:, 2:]
+
+        return (slice(r0, r1), slice(c0, c1)), board[r0:r1, c0:c1], self.rule.lookup(counts)
+
+
+    def get_board_next_gen(self, rows, cols, scale, board1, board2):
+
+        if board1.dtype == object:
+            #no activity tracking across Cell object boards
+            return self.fallback.get_board_next_gen(rows, cols, scale, board1, board2)
+
+        if board1 is not self.last_board or board1.shape != board2.shape or self.rule.table[0, 0]:
+            #unknown board (new, reset or resized): evaluate everything once and resync board2
+            #B0 rules give birth in empty space, so every tile is active every generation
+            tile_rows, tile_cols = self.get_tile_counts(rows, cols)
+            self.changed_tiles = {(tr, tc) for tr in range(tile_rows) for tc in range(tile_cols)}
+            board2[...] = board1
+            self.tile_population = None
+
+        else:
+            #board2 only lags board1 in the tiles that changed last generation
+            size = self.tile_size
+            for tr, tc in self.changed_tiles:
+                tile = (slice(tr * size, (tr + 1) * size), slice(tc * size, (tc + 1) * size))
+                board2[tile] = board1[tile]
+
+        stats = self.stats
+        if stats is None:
+            self.tile_population = None
+        elif self.tile_population is None:
+            self.count_tiles(rows, cols, board1)
+
+        changed_tiles = set()
+        births = deaths = 0
+
+        for tr, tc in self.get_tiles_to_evaluate(rows, cols):
+            tile, state, next_state = self.get_tile_next_gen(tr, tc, rows, cols, board1)
+
+            changed = not np.array_equal(state, next_state)
+
+            #tiles that change are recounted, and so are last generation's changed tiles, which edits are marked as
+            if stats is not None and (changed or (tr, tc) in self.changed_tiles):
+                population = int(np.count_nonzero(next_state))
+                self.population += population - int(self.tile_population[tr, tc])
+                self.tile_population[tr, tc] = population
+
+            if changed:
+                board2[tile] = next_state
+                changed_tiles.add((tr, tc))
+
+                if stats is not None:
+                    changes = int(np.count_nonzero(state != next_state))
+                    born = int(np.count_nonzero(next_state & ~state))
+                    births += born
+                    deaths += changes - born
+
+        self.changed_tiles = changed_tiles
+
+        if stats is not None:
+            stats.record_counts(self.population, births, deaths, self.get_bounding_box(board2))
+        self.last_board = board2
+
+        board1, board2 = board2, board1
+
+        return board1, board2
+
+
+    def create_boards(self, board):
+        #bool board -> (board1, board2) in this engine's own format
+        return board.astype(bool), np.zeros(board.shape, dtype=bool)
+
+
+    def to_bool_array(self, rows, cols, board):
+        if board.dtype == object:
+            return CellBoard().cells_to_bool_array(board)
+
+        return board
+
+
+
+class QuadNode():
+    #Canonical quadtree node: a 2**level square made of four 2**(level-1) quadrants
+    #Level 0 nodes are single cells and have no quadrants
+    __slots__ = ('level', 'nw', 'ne', 'sw', 'se', 'population', 'results')
+
+    def __init__(self, level, nw, ne, sw, se, population):
+        self.level = level
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.population = population
+        #memoised successors keyed by step exponent j (advanced 2**j generations)
+        self.results = {}
+
+
+
+class HashlifeUniverse():
+    #Memoised quadtree (Hashlife) universe on an unbounded plane (no torus wrap), for any LifeRule without B0
+    #Coordinates are (row, col) relative to the top left of the imported board
+
+    def __init__(self, max_nodes=2000000, rule=None):
+        #node budget for the canonical cache, garbage collected between steps when exceeded
+        self.max_nodes = max_nodes
+        self.rule = rule or LifeRule()
+
+        if self.rule.table[0, 0]:
+            raise ValueError(f'{self.rule.rulestring}: B0 rules fill the unbounded plane and cannot run in Hashlife')
+
+        self.dead = QuadNode(0, None, None, None, None, 0)
+        self.alive = QuadNode(0, None, None, None, None, 1)
+
+        self.generation = 0
+        self.reset_cache()
+        self.root = self.get_empty_node(3)
+        self.origin = (0, 0)
+
+
+    def reset_cache(self):
+        self.nodes = {}
+        self.empty_nodes = [self.dead]
+        self.node_hits = 0
+        self.node_misses = 0
+        self.result_hits = 0
+        self.result_misses = 0
+        self.gc_runs = 0
+
+
+    def join(self, nw, ne, sw, se):
+        #canonical node from four quadrants, shared between every occurrence in the universe
+        key = (nw, ne, sw, se)
+        node = self.nodes.get(key)
+
+        if node is not None:
+            self.node_hits += 1
+            return node
+
+        self.node_misses += 1
+        node = QuadNode(nw.level + 1, nw, ne, sw, se, nw.population + ne.population + sw.population + se.population)
+        self.nodes[key] = node
+
+        return node
+
+
+    def get_empty_node(self, level):
+        while len(self.empty_nodes) <= level:
+            e = self.empty_nodes[-1]
+            self.empty_nodes.append(self.join(e, e, e, e))
+
+        return self.empty_nodes[level]
+
+
+    def centre(self, node):
+        #node surrounded by an empty border, one level up and centred on the same area
+        e = self.get_empty_node(node.level - 1)
+
+        return self.join(self.join(e, e, e, node.nw), self.join(e, e, node.ne, e),
+                         self.join(e, node.sw, e, e), self.join(node.se, e, e, e))
+
+
+    def life_4x4(self, node):
+        #level 2 base case: centre 2x2 after one generation
+        cells = [[0] * 4 for i in range(4)]
+
+        for qr, qc, quad in ((0, 0, node.nw), (0, 2, node.ne), (2, 0, node.sw), (2, 2, node.se)):
+            cells[qr][qc], cells[qr][qc+1] = quad.nw.population, quad.ne.population
+            cells[qr+1][qc], cells[qr+1][qc+1] = quad.sw.population, quad.se.population
+
+        centre = []
+        for r in (1, 2):
+            for c in (1, 2):
+                total = sum(cells[r+n][c+m] for n in range(-1, 2) for m in range(-1, 2)) - cells[r][c]
+
+                if self.rule.get_next_state(cells[r][c], total):
+                    centre.append(self.alive)
+                else:
+                    centre.append(self.dead)
+
+        return self.join(*centre)
+
+
+    def successor(self, node, j):
+        #centre of node (one level down) advanced 2**j generations, j <= level - 2
+
+        j = min(j, node.level - 2)
+
+        result = node.results.get(j)
+        if result is not None:
+            self.result_hits += 1
+            return result
+
+        self.result_misses += 1
+
+        if node.population == 0:
+            result = self.get_empty_node(node.level - 1)
+
+        elif node.level == 2:
+            result = self.life_4x4(node)
+
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            join = self.join
+
+            #nine overlapping sub squares, each advanced 2**j (or 2**(j-1)) generations
+            c1 = self.successor(nw, j)
+            c2 = self.successor(join(nw.ne, ne.nw, nw.se, ne.sw), j)
+            c3 = self.successor(ne, j)
+            c4 = self.successor(join(nw.sw, nw.se, sw.nw, sw.ne), j)
+            c5 = self.successor(join(nw.se, ne.sw, sw.ne, se.nw), j)
+            c6 = self.successor(join(ne.sw, ne.se, se.nw, se.ne), j)
+            c7 = self.successor(sw, j)
+            c8 = self.successor(join(sw.ne, se.nw, sw.se, se.sw), j)
+            c9 = self.successor(se, j)
+
+            if j < node.level - 2:
+                #single step of 2**j: stitch the centres of the nine results together
+                result = join(join(c1.se, c2.sw, c4.ne, c5.nw),
+                              join(c2.se, c3.sw, c5.ne, c6.nw),
+                              join(c4.se, c5.sw, c7.ne, c8.nw),
+                              join(c5.se, c6.sw, c8.ne, c9.nw))
+            else:
+                #superspeed: two half steps of 2**(j-1) generations
+                result = join(self.successor(join(c1, c2, c4, c5), j),
+                              self.successor(join(c2, c3, c5, c6), j),
+                              self.successor(join(c4, c5, c7, c8), j),
+                              self.successor(join(c5, c6, c8, c9), j))
+
+        node.results[j] = result
+
+        return result
+
+
+    def is_padded(self, node):
+        #True when all live cells sit inside the central half of node
+        if node.level < 3:
+            return node.population == 0
+
+        inner = (node.nw.se.population + node.ne.sw.population +
+                 node.sw.ne.population + node.se.nw.population)
+
+        return node.population == inner
+
+
+    def expand(self):
+        #grow the root one level, keeping its content in the middle
+        half = 1 << (self.root.level - 1)
+        self.root = self.centre(self.root)
+        self.origin = (self.origin[0] - half, self.origin[1] - half)
+
+
+    def step_power_of_two(self, j):
+
+        while self.root.level < j + 2 or not self.is_padded(self.root):
+            self.expand()
+
+        #one more border so the successor covers the current root area
+        self.expand()
+        half = 1 << (self.root.level - 2)
+        self.root = self.successor(self.root, j)
+        self.origin = (self.origin[0] + half, self.origin[1] + half)
+
+        self.generation += 1 << j
+
+        if len(self.nodes) > self.max_nodes:
+            self.collect_garbage()
+
+
+    def advance(self, n):
+        #jump n generations using the binary expansion of n as power of two steps
+        j = 0
+
+        while n:
+            if n & 1:
+                self.step_power_of_two(j)
+
+            n >>= 1
+            j += 1
+
+
+    def collect_garbage(self):
+        #drop every node unreachable from the root and evict all memoised results
+        reachable = {}
+        stack = [self.root] + self.empty_nodes[1:]
+
+        while stack:
+            node = stack.pop()
+            if node.level == 0 or id(node) in reachable:
+                continue
+
+            reachable[id(node)] = node
+            node.results = {}
+            stack.extend((node.nw, node.ne, node.sw, node.se))
+
+        self.nodes = {(node.nw, node.ne, node.sw, node.se): node for node in reachable.values()}
+        self.gc_runs += 1
+
+
+    def build_node(self, board, r, c, level):
+
+        if level == 0:
+            return self.alive if board[r, c] else self.dead
+
+        size = 1 << level
+        if not board[r:r+size, c:c+size].any():
+            return self.get_empty_node(level)
+
+        half = size >> 1
+        return self.join(self.build_node(board, r, c, level - 1),
+                         self.build_node(board, r, c + half, level - 1),
+                         self.build_node(board, r + half, c, level - 1),
+                         self.build_node(board, r + half, c + half, level - 1))
+
+
+    def set_board(self, board):
+        #import a Cell object or bool board, its top left cell becomes (0, 0)
+        if board.dtype == object:
+            board = CellBoard().cells_to_bool_array(board)
+
+        rows, cols = board.shape
+        level = max(3, int(max(rows, cols) - 1).bit_length())
+
+        padded = np.zeros((1 << level, 1 << level), dtype=bool)
+        padded[:rows, :cols] = board
+
+        self.root = self.build_node(padded, 0, 0, level)
+        self.origin = (0, 0)
+        self.generation = 0
+
+
+    def fill_board(self, node, board, top, left, r, c):
+        #write live cells of node (top left at r, c) into board, which starts at (top, left)
+        rows, cols = board.shape
+        size = 1 << node.level
+
+        if node.population == 0 or r >= top + rows or c >= left + cols or r + size <= top or c + size <= left:
+            return
+
+        if node.level == 0:
+            board[r - top, c - left] = True
+            return
+
+        half = size >> 1
+        self.fill_board(node.nw, board, top, left, r, c)
+        self.fill_board(node.ne, board, top, left, r, c + half)
+        self.fill_board(node.sw, board, top, left, r + half, c)
+        self.fill_board(node.se, board, top, left, r + half, c + half)
+
+
+    def get_board(self, rows, cols, top=0, left=0):
+        #export the rows x cols window starting at (top, left) as a bool board
+        board = np.zeros((rows, cols), dtype=bool)
+        self.fill_board(self.root, board, top, left, self.origin[0], self.origin[1])
+
+        return board
+
+
+    def get_population(self):
+        return self.root.population
+
+
+    def get_stats(self):
+        lookups = self.result_hits + self.result_misses
+
+        return {
+            'generation': self.generation,
+            'population': self.root.population,
+            'nodes': len(self.nodes),
+            'node_hits': self.node_hits,
+            'node_misses': self.node_misses,
+            'result_hits': self.result_hits,
+            'result_misses': self.result_misses,
+            'hit_rate': self.result_hits / lookups if lookups else 0.0,
+            'gc_runs': self.gc_runs,
+        }
+
+
+
+class ParallelConwayLogic():
+    #LifeRule stepping (B3/S23 by default) split into row band tiles, each stepped by a process pool worker
+    #Both boards live in shared memory: workers read their band plus one halo row either side
+    #straight from the current board and write the next board in place, nothing is pickled but the tile bounds
+
+    #per worker process state, filled in by attach_worker
+    worker_state = {}
+
+    def __init__(self, workers=None, tiles=None, rule=None):
+        self.workers = workers or os.cpu_count()
+        self.tiles = tiles or self.workers
+        self.rule = rule or LifeRule()
+        self.shape = None
+        self.shared = []
+        self.boards = []
+        self.bands = []
+        self.pool = None
+        #monitor.StatsStream told about every generation, each band counted by the worker that stepped it
+        self.stats = None
+
+
+    def create_shared_boards(self, rows, cols):
+        self.close()
+
+        for i in range(2):
+            shm = shared_memory.SharedMemory(create=True, size=max(rows*cols, 1))
+            board = np.ndarray((rows, cols), dtype=bool, buffer=shm.buf)
+            board[...] = False
+            self.shared.append(shm)
+            self.boards.append(board)
+
+        edges = np.linspace(0, rows, min(self.tiles, rows) + 1).astype(int)
+        self.bands = list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+        self.shape = (rows, cols)
+
+        names = [shm.name for shm in self.shared]
+        self.pool = mp.Pool(self.workers, initializer=ParallelConwayLogic.attach_worker, initargs=(names, rows, cols, self.rule.rulestring))
+
+        return self.boards[0], self.boards[1]
+
+
+    @staticmethod
+    def attach_worker(names, rows, cols, rulestring):
+        state = ParallelConwayLogic.worker_state
+        state['shared'] = [shared_memory.SharedMemory(name=name) for name in names]
+        state['boards'] = [np.ndarray((rows, cols), dtype=bool, buffer=shm.buf) for shm in state['shared']]
+        state['logic'] = NumpyConwayLogic(LifeRule(rulestring))
+
+
+    @staticmethod
+    def step_tile(tile):
+        #with_stats: also return the band's count_band counts, taken by the worker while the band is in its cache
+        src, start, stop, with_stats = tile
+        state = ParallelConwayLogic.worker_state
+        board, out = state['boards'][src], state['boards'][1 - src]
+        rows, cols = board.shape
+
+        state['logic'].get_band_next_gen(stop - start, cols, board[start:stop], out[start:stop],
+                                         board[(start - 1) % rows], board[stop % rows])
+
+        if with_stats:
+            return count_band(board[start:stop], out[start:stop])
+
+
+    def get_board_next_gen(self, rows, cols, scale, board1, board2):
+
+        if self.shape != (rows, cols):
+            self.create_shared_boards(rows, cols)
+
+        if board1 is self.boards[0] or board1 is self.boards[1]:
+            src = 0 if board1 is self.boards[0] else 1
+        else:
+            #outside board (first generation, reset, Cell board): copy it into shared memory once
+            src = 0
+            if board1.dtype == object:
+                self.boards[0][...] = CellBoard().cells_to_bool_array(board1)
+            else:
+                self.boards[0][...] = board1
+
+        with_stats = self.stats is not None
+        counts = self.pool.map(ParallelConwayLogic.step_tile, [(src, start, stop, with_stats) for start, stop in self.bands])
+
+        if with_stats:
+            self.stats.record_bands([(start, band) for (start, stop), band in zip(self.bands, counts)])
+
+        if board1.dtype == object:
+            CellBoard().bool_array_to_cells(self.boards[1 - src], board2)
+            return board2, board1
+
+        return self.boards[1 - src], self.boards[src]
+
+
+    def create_boards(self, board):
+        #bool board -> (board1, board2) in shared memory
+        rows, cols = board.shape
+        board1, board2 = self.create_shared_boards(rows, cols)
+        board1[...] = board
+
+        return board1, board2
+
+
+    def to_bool_array(self, rows, cols, board):
+        return NumpyConwayLogic().to_bool_array(rows, cols, board)
+
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        self.boards = []
+        for shm in self.shared:
+            shm.close()
+            shm.unlink()
+
+        self.shared = []
+        self.shape = None
+
+
+    def get_scaling_report(self, rows, cols, worker_counts, generations=20, prob=0.2, seed=0):
+        #generations/sec and speedup over one worker for each worker count, on the same seeded board
+        soup = Soup(rows, cols, seed, prob)
+        report = []
+
+        for workers in worker_counts:
+            logic = ParallelConwayLogic(workers, max(self.tiles, workers), self.rule)
+            board1, board2 = logic.create_shared_boards(rows, cols)
+            soup.fill(board1)
+
+            #first generation outside the timing, pool start up is not stepping cost
+            board1, board2 = logic.get_board_next_gen(rows, cols, 1, board1, board2)
+
+            start = time.perf_counter()
+            for gen in range(generations):
+                board1, board2 = logic.get_board_next_gen(rows, cols, 1, board1, board2)
+            seconds = time.perf_counter() - start
+
+            logic.close()
+
+            report.append({'workers': workers, 'tiles': logic.tiles, 'seconds': seconds,
+                           'gens_per_sec': generations / seconds})
+
+        for line in report:
+            line['speedup'] = line['gens_per_sec'] / report[0]['gens_per_sec']
+
+        return report
+
+
+
+class ChunkedUniverse():
+    #Unbounded LifeRule universe stored as a dict of fixed size bool chunks, allocated on demand
+    #Chunks with no live cells are dropped after every step, so memory follows the population
+    #Also steps a rows x cols window at (0, 0) through the get_board_next_gen contract, without wrapping
+
+    def __init__(self, chunk_size=64, rule=None):
+        self.chunk_size = chunk_size
+        self.rule = rule or LifeRule()
+
+        if self.rule.table[0, 0]:
+            raise ValueError(f'{self.rule.rulestring}: B0 rules fill the unbounded plane and cannot run chunked')
+
+        #(chunk row, chunk col) -> (chunk_size, chunk_size) bool array
+        self.chunks = {}
+        self.generation = 0
+        self.last_board = None
+        self.padded = np.zeros((chunk_size + 2, chunk_size + 2), dtype=np.uint8)
+        #monitor.StatsStream told about every step, over the whole plane rather than the window
+        self.stats = None
+
+
+    def set_cell(self, r, c, state):
+        size = self.chunk_size
+        key = (r // size, c // size)
+        chunk = self.chunks.get(key)
+
+        if chunk is None:
+            if not state:
+                return
+            chunk = self.chunks[key] = np.zeros((size, size), dtype=bool)
+
+        chunk[r % size, c % size] = state
+
+        if not state and not chunk.any():
+            del self.chunks[key]
+
+
+    def get_cell(self, r, c):
+        size = self.chunk_size
+        chunk = self.chunks.get((r // size, c // size))
+
+        return chunk is not None and bool(chunk[r % size, c % size])
+
+
+    def set_board(self, board, top=0, left=0):
+        #stamp a Cell object or bool board with its top left cell at (top, left)
+        if board.dtype == object:
+            board = CellBoard().cells_to_bool_array(board)
+
+        size = self.chunk_size
+        rows, cols = board.shape
+
+        for cr in range(top // size, (top + rows - 1) // size + 1):
+            for cc in range(left // size, (left + cols - 1) // size + 1):
+                r0, c0 = max(cr * size, top), max(cc * size, left)
+                r1, c1 = min((cr + 1) * size, top + rows), min((cc + 1) * size, left + cols)
+
+                part = board[r0 - top:r1 - top, c0 - left:c1 - left]
+                chunk = self.chunks.get((cr, cc))
+
+                if chunk is None:
+                    if not part.any():
+                        continue
+                    chunk = self.chunks[(cr, cc)] = np.zeros((size, size), dtype=bool)
+
+                chunk[r0 - cr * size:r1 - cr * size, c0 - cc * size:c1 - cc * size] = part
+
+                if not chunk.any():
+                    del self.chunks[(cr, cc)]
+
+
+    def get_board(self, rows, cols, top=0, left=0):
+        #bool copy of the rows x cols window with its top left cell at (top, left)
+        size = self.chunk_size
+        board = np.zeros((rows, cols), dtype=bool)
+
+        for cr in range(top // size, (top + rows - 1) // size + 1):
+            for cc in range(left // size, (left + cols - 1) // size + 1):
+                chunk = self.chunks.get((cr, cc))
+
+                if chunk is not None:
+                    r0, c0 = max(cr * size, top), max(cc * size, left)
+                    r1, c1 = min((cr + 1) * size, top + rows), min((cc + 1) * size, left + cols)
+                    board[r0 - top:r1 - top, c0 - left:c1 - left] = chunk[r0 - cr * size:r1 - cr * size, c0 - cc * size:c1 - cc * size]
+
+        return board
+
+
+    def get_candidate_chunks(self):
+        #live chunks plus empty neighbours that a live edge or corner cell could give birth into
+        candidates = set(self.chunks)
+
+        for (cr, cc), chunk in self.chunks.items():
+            top, bottom, left, right = chunk[0].any(), chunk[-1].any(), chunk[:, 0].any(), chunk[:, -1].any()
+
+            for n, m, edge in ((-1, 0, top), (1, 0, bottom), (0, -1, left), (0, 1, right),
+                               (-1, -1, chunk[0, 0]), (-1, 1, chunk[0, -1]), (1, -1, chunk[-1, 0]), (1, 1, chunk[-1, -1])):
+                if edge:
+                    candidates.add((cr + n, cc + m))
+
+        return candidates
+
+
+    def get_chunk_next_gen(self, cr, cc):
+        chunks = self.chunks
+        padded = self.padded
+        padded[...] = 0
+
+        #chunk plus a one cell halo taken from the neighbouring chunks that exist
+        for n, m, target, source in ((0, 0, (slice(1, -1), slice(1, -1)), (slice(None), slice(None))),
+                                     (-1, 0, (0, slice(1, -1)), (-1, slice(None))),
+                                     (1, 0, (-1, slice(1, -1)), (0, slice(None))),
+                                     (0, -1, (slice(1, -1), 0), (slice(None), -1)),
+                                     (0, 1, (slice(1, -1), -1), (slice(None), 0)),
+                                     (-1, -1, (0, 0), (-1, -1)),
+                                     (-1, 1, (0, -1), (-1, 0)),
+                                     (1, -1, (-1, 0), (0, -1)),
+                                     (1, 1, (-1, -1), (0, 0))):
+            chunk = chunks.get((cr + n, cc + m))
+            if chunk is not None:
+                padded[target] = chunk[source]
+
+        #alive*9 + neighbour_total, the LifeRule table index
+        index = padded[1:-1, 1:-1] * np.uint8(9)
+        index += padded[:-2, :-2]
+        index += padded[:-2, 1:-1]
+        index += padded[:-2, 2:]
+        index += padded[1:-1, :-2]
+        index += padded[1:-1, 2:]
+        index += padded[2:, :-2]
+        index += padded[2:, 1:-1]
+        index += padded[2:, 2:]
+
+        return self.rule.lookup(index)
+
+
+    def step(self):
+        next_chunks = {}
+        population = births = deaths = 0
+
+        for key in self.get_candidate_chunks():
+            chunk = self.get_chunk_next_gen(*key)
+
+            if self.stats is not None:
+                old = self.chunks.get(key)
+                live = int(np.count_nonzero(chunk))
+                born = live if old is None else int(np.count_nonzero(chunk & ~old))
+                population += live
+                births += born
+                deaths += (0 if old is None else int(np.count_nonzero(old))) - live + born
+
+            #empty chunks are freed by never being stored
+            if chunk.any():
+                next_chunks[key] = chunk
+
+        self.chunks = next_chunks
+        self.generation += 1
+
+        if self.stats is not None:
+            self.stats.record_counts(population, births, deaths, self.get_bounding_box())
+
+
+    def advance(self, n):
+        for gen in range(n):
+            self.step()
+
+
+    def get_population(self):
+        return int(sum(np.count_nonzero(chunk) for chunk in self.chunks.values()))
+
+
+    def get_chunk_count(self):
+        return len(self.chunks)
+
+
+    def get_bounding_box(self):
+        #(min row, min col, max row, max col) of the live cells, inclusive, or None when empty
+        if not self.chunks:
+            return None
+
+        size = self.chunk_size
+        top = left = bottom = right = None
+
+        for (cr, cc), chunk in self.chunks.items():
+            rows = np.flatnonzero(chunk.any(axis=1))
+            cols = np.flatnonzero(chunk.any(axis=0))
+            box = (cr * size + rows[0], cc * size + cols[0], cr * size + rows[-1], cc * size + cols[-1])
+
+            if top is None:
+                top, left, bottom, right = box
+            else:
+                top, left = min(top, box[0]), min(left, box[1])
+                bottom, right = max(bottom, box[2]), max(right, box[3])
+
+        return int(top), int(left), int(bottom), int(right)
+
+
+    def get_stats(self):
+        return {
+            'generation': self.generation,
+            'population': self.get_population(),
+            'chunks': self.get_chunk_count(),
+            'bounding_box': self.get_bounding_box(),
+        }
+
+
+    def get_board_next_gen(self, rows, cols, scale, board1, board2):
+
+        state = CellBoard().cells_to_bool_array(board1) if board1.dtype == object else board1
+
+        if board1 is self.last_board:
+            #same window as last returned: carry over any edits made to it since (mouse drawing)
+            window = self.get_board(rows, cols)
+            for r, c in np.argwhere(window != state):
+                self.set_cell(r, c, bool(state[r, c]))
+
+        else:
+            #new window (start, reset, randomise) starts a fresh universe
+            self.chunks = {}
+            self.set_board(state)
+
+        self.step()
+        window = self.get_board(rows, cols)
+
+        if board2.dtype == object:
+            CellBoard().bool_array_to_cells(window, board2)
+        else:
+            board2[...] = window
+
+        self.last_board = board2
+
+        board1, board2 = board2, board1
+
+        return board1, board2
+
+
+    def create_boards(self, board):
+        self.chunks = {}
+        self.set_board(board)
+        self.last_board = board.astype(bool)
+
+        return self.last_board, np.zeros(board.shape, dtype=bool)
+
+
+    def to_bool_array(self, rows, cols, board):
+        return NumpyConwayLogic().to_bool_array(rows, cols, board)
+
+
+
+class CycleDetector():
+    #Rolling Zobrist hashes of recent generations to spot extinction, still lifes and cycles
+    #The hash is the XOR of a random 64 bit key per live cell, so a step only XORs in the changed cells
+
+    def __init__(self, rows, cols, max_period=64, seed=0):
+        self.rows = rows
+        self.cols = cols
+        self.max_period = max_period
+        self.keys = np.random.default_rng(seed).integers(0, 2**63, size=(rows, cols), dtype=np.uint64)
+
+
+    def get_hash(self, board):
+        return int(np.bitwise_xor.reduce(self.keys[board], initial=np.uint64(0)))
+
+
+    def start(self, board, generation=0):
+        #hash the starting board in full, later generations are updated incrementally
+        self.generation = generation
+        self.hash = self.get_hash(board)
+        #last max_period + 1 generations: hash -> generation, generation -> packed board
+        self.generations = {self.hash: generation}
+        self.boards = {generation: np.packbits(board)}
+        self.hashes = {generation: self.hash}
+
+        self.status = 'running'
+        self.cycle_start = None
+        self.period = None
+        self.check_extinct(board)
+
+
+    def check_extinct(self, board):
+        if not board.any():
+            self.status = 'extinct'
+            self.cycle_start = self.generation
+            self.period = 1
+
+
+    def update(self, board, previous=None):
+        #record the next generation, previous (the generation before) enables the incremental hash
+        #returns True once a cycle (including still life or extinction) has been found
+
+        if self.status != 'running':
+            return True
+
+        self.generation += 1
+
+        if previous is None:
+            self.hash = self.get_hash(board)
+        else:
+            self.hash ^= self.get_hash(board != previous)
+
+        seen = self.generations.get(self.hash)
+
+        #a matching hash only counts once the stored board confirms it (no collision)
+        if seen is not None and np.array_equal(np.packbits(board), self.boards[seen]):
+            self.cycle_start = seen
+            self.period = self.generation - seen
+            self.status = 'still' if self.period == 1 else 'cycle'
+            return True
+
+        self.generations[self.hash] = self.generation
+        self.boards[self.generation] = np.packbits(board)
+        self.hashes[self.generation] = self.hash
+
+        #drop generations that fell out of the window
+        oldest = self.generation - self.max_period
+        if oldest in self.boards:
+            del self.boards[oldest]
+            old_hash = self.hashes.pop(oldest)
+            if self.generations.get(old_hash) == oldest:
+                del self.generations[old_hash]
+
+        self.check_extinct(board)
+
+        return self.status != 'running'
+
+
+    def get_board_at(self, generation):
+        #state at any cached generation, or any later one once a cycle is known, without stepping
+
+        if self.status != 'running' and generation >= self.cycle_start:
+            generation = self.cycle_start + (generation - self.cycle_start) % self.period
+
+        if generation not in self.boards:
+            raise ValueError(f'generation {generation} is not cached')
+
+        return np.unpackbits(self.boards[generation], count=self.rows * self.cols).reshape(self.rows, self.cols).astype(bool)
+
+
+    def get_result(self):
+        return {'status': self.status, 'cycle_start': self.cycle_start, 'period': self.period}
+
+
+
+class Ensemble():
+    #Many independent small boards stacked as one (N, rows, cols) array and stepped in one vectorised call
+    #Boards that die out or settle into a still life/cycle are retired from the batch as they finish
+
+    RUNNING, EXTINCT, STILL, CYCLE = 0, 1, 2, 3
+    STATUS = ('running', 'extinct', 'still', 'cycle')
+
+    #per-board results, generation is when the board finished (or the last one stepped if still running)
+    RESULT_DTYPE = np.dtype([('status', np.uint8), ('generation', np.int64), ('period', np.int64),
+                             ('population', np.int64), ('initial_population', np.int64), ('prob', np.float64)])
+
+    def __init__(self, rows, cols, rule=None, max_period=8, seed=0):
+        self.rows = rows
+        self.cols = cols
+        self.rule = rule or LifeRule()
+        #longest cycle spotted, boards with longer periods run until max_generations
+        self.max_period = max_period
+        self.conway = NumpyConwayLogic(self.rule)
+        #boards are bit packed into 64 cell words, hashed as a random odd key per word times the word
+        self.words = -(-rows * cols // 64)
+        self.keys = np.random.default_rng(seed).integers(0, 2**63, size=self.words, dtype=np.uint64) | np.uint64(1)
+
+
+    def set_random_boards(self, probs, seed=None):
+        #one seeded random soup per entry of probs, like Grid.fill_array_with_cells(rand=True, prob=...)
+        #the uniform draws of a single soup.Soup over the batch laid out as a grid of boards, wide enough to
+        #use whole tiles, so small boards cost no more draws than their cells
+        probs = np.asarray(probs, dtype=np.float64)
+        n = len(probs)
+        across = max(1, min(n, TILE // self.cols))
+        down = -(-n // across)
+
+        uniforms = Soup(down * self.rows, across * self.cols, seed).get_uniforms(0, down * self.rows, 0, across * self.cols)
+        uniforms = uniforms.reshape(down, self.rows, across, self.cols).swapaxes(1, 2).reshape(-1, self.rows, self.cols)
+        boards = uniforms[:n] < probs[:, None, None]
+
+        return self.set_boards(boards, probs)
+
+
+    def set_boards(self, boards, probs=None):
+        boards = np.asarray(boards, dtype=bool)
+        n = len(boards)
+
+        self.generation = 0
+        self.results = np.zeros(n, dtype=self.RESULT_DTYPE)
+        self.results['prob'] = np.nan if probs is None else probs
+        self.results['initial_population'] = boards.sum(axis=(1, 2))
+
+        #only unfinished boards are kept, active maps them back to their results row
+        self.active = np.arange(n)
+        self.boards = boards.copy()
+        self.next_boards = np.empty_like(self.boards)
+
+        #ring buffers of the last max_period generations, slot = generation % max_period
+        self.hashes = np.zeros((n, self.max_period), dtype=np.uint64)
+        self.packed = np.zeros((n, self.max_period, self.words * 8), dtype=np.uint8)
+
+        self.finish(self.record())
+
+        return self.results
+
+
+    def pack_boards(self, boards):
+        packed = np.zeros((len(boards), self.words * 8), dtype=np.uint8)
+        packed[:, :-(-self.rows * self.cols // 8)] = np.packbits(boards.reshape(len(boards), -1), axis=1)
+
+        return packed
+
+
+    def get_hashes(self, packed):
+        #wraps around modulo 2**64, collisions are caught by comparing the packed boards
+        return (packed.view(np.uint64) * self.keys).sum(axis=1, dtype=np.uint64)
+
+
+    def record(self):
+        #hash and store the current generation, returns the mask of boards that just finished
+        packed = self.pack_boards(self.boards)
+        hashes = self.get_hashes(packed)
+        population = self.boards.sum(axis=(1, 2))
+
+        self.results['population'][self.active] = population
+        self.results['generation'][self.active] = self.generation
+
+        finished = population == 0
+        self.results['status'][self.active[finished]] = self.EXTINCT
+        self.results['period'][self.active[finished]] = 1
+
+        #a hash match with a generation still in the window only counts once the stored board confirms it
+        stored = min(self.generation, self.max_period)
+        for slot in range(stored):
+            gen = self.generation - 1 - ((self.generation - 1 - slot) % self.max_period)
+            for i in np.flatnonzero((self.hashes[:, slot] == hashes) & ~finished):
+                if np.array_equal(self.packed[i, slot], packed[i]):
+                    finished[i] = True
+                    period = self.generation - gen
+                    self.results['status'][self.active[i]] = self.STILL if period == 1 else self.CYCLE
+                    self.results['period'][self.active[i]] = period
+
+        slot = self.generation % self.max_period
+        self.hashes[:, slot] = hashes
+        self.packed[:, slot] = packed
+
+        return finished
+
+
+    def finish(self, finished):
+        #retire finished boards so later generations only step the ones still running
+        if finished.any():
+            keep = ~finished
+            self.active = self.active[keep]
+            self.boards = self.boards[keep]
+            self.next_boards = self.next_boards[keep]
+            self.hashes = self.hashes[keep]
+            self.packed = self.packed[keep]
+
+
+    def step(self):
+        #one generation of every active board, returns the number still running
+        if not len(self.active):
+            return 0
+
+        self.conway.get_band_next_gen(self.rows, self.cols, self.boards, self.next_boards)
+        self.boards, self.next_boards = self.next_boards, self.boards
+        self.generation += 1
+
+        self.finish(self.record())
+
+        return len(self.active)
+
+
+    def run(self, max_generations):
+        #step until every board has finished or max_generations is reached
+        while self.generation < max_generations and self.step():
+            pass
+
+        return self.results
+
+
+    def get_status_counts(self):
+        return {name: int((self.results['status'] == code).sum()) for code, name in enumerate(self.STATUS)}
+
+
+
+class Profiler():
+    #Per-phase timers with rolling percentiles, counters and export hooks for the frame loop
+    #Disabled, start() returns None and stop()/count() return straight away, so calls can stay in hot paths
+
+    def __init__(self, enabled=False, window=240, report_every=60):
+        self.enabled = enabled
+        #samples kept per phase for the percentiles, and frames between hook calls
+        self.window = window
+        self.report_every = report_every
+
+        self.timings = {}
+        self.counters = {}
+        self.hooks = []
+        #(time, generations) at recent frame ends, for fps and gens/sec
+        self.frames = deque(maxlen=window)
+        self.frame_count = 0
+
+
+    def set_enabled(self, enabled):
+        #old samples would mix with the new ones after a gap, start afresh
+        self.enabled = enabled
+        self.frames.clear()
+
+
+    def start(self):
+        if self.enabled:
+            return time.perf_counter()
+
+        return None
+
+
+    def stop(self, phase, start):
+        if start is None:
+            return
+
+        samples = self.timings.get(phase)
+        if samples is None:
+            samples = self.timings[phase] = deque(maxlen=self.window)
+
+        samples.append(time.perf_counter() - start)
+
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+
+    def add_hook(self, hook):
+        #hook(report) is called every report_every frames while enabled
+        self.hooks.append(hook)
+
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+
+        self.frames.append((time.perf_counter(), self.counters.get('generations', 0)))
+        self.frame_count += 1
+
+        if self.hooks and self.frame_count % self.report_every == 0:
+            report = self.get_report()
+            for hook in self.hooks:
+                hook(report)
+
+
+    def get_rates(self):
+        #(frames/sec, generations/sec) over the recent frames
+        if len(self.frames) < 2:
+            return 0.0, 0.0
+
+        (t0, g0), (t1, g1) = self.frames[0], self.frames[-1]
+        if t1 == t0:
+            return 0.0, 0.0
+
+        return (len(self.frames) - 1) / (t1 - t0), (g1 - g0) / (t1 - t0)
+
+
+    def get_percentiles(self, phase, percentiles=(50, 90, 99)):
+        #ms per call of phase over the window
+        samples = np.fromiter(self.timings.get(phase, ()), dtype=np.float64) * 1000
+
+        if not len(samples):
+            return {f'p{p}': 0.0 for p in percentiles}
+
+        return dict(zip((f'p{p}' for p in percentiles), np.percentile(samples, percentiles).tolist()))
+
+
+    def get_report(self):
+        fps, gens_per_sec = self.get_rates()
+
+        return {
+            'time': time.time(),
+            'fps': fps,
+            'gens_per_sec': gens_per_sec,
+            'phases': {phase: self.get_percentiles(phase) for phase in list(self.timings)},
+            'counters': dict(self.counters),
+        }
+
+
+
+class ProfilerFileHook():
+    #Profiler hook appending each report to a file as one JSON line
+
+    def __init__(self, path):
+        self.path = path
+
+
+    def __call__(self, report):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(report) + '\n')
+
+
+
+class SimulationThread():
+    #Steps a board pair in a background thread, at full speed or a target gens/sec
+    #Completed generations are published through a triple buffer of bool snapshots: the renderer
+    #always owns one buffer, the stepper writes another, and the lock only guards swapping them
+    #Edits are queued and applied between generations, never while a step is running
+
+    def __init__(self, board_format, conway, rows, cols, scale, board1, board2, gens_per_sec=None, profiler=None,
+                 recorder=None):
+        #board_format is the CellBoard/ArrayBoard (or Grid) the boards were created with
+        self.board_format = board_format
+        self.conway = conway
+        self.rows = rows
+        self.cols = cols
+        self.scale = scale
+        self.board1, self.board2 = board1, board2
+        self.gens_per_sec = gens_per_sec
+        #times the 'step' phase and counts generations and changed cells
+        self.profiler = profiler or Profiler()
+        #recording.Recorder, written the starting board and every stepped generation
+        self.recorder = recorder
+
+        self.edits = queue.SimpleQueue()
+        self.paused = True
+        self.running = False
+        self.generation = 0
+
+        self.lock = threading.Lock()
+        self.write_buffer, self.ready_buffer, self.read_buffer = [np.zeros((rows, cols), dtype=bool) for i in range(3)]
+        self.fresh = False
+        self.thread = None
+
+
+    def start(self):
+        self.publish()
+        self.record()
+        self.running = True
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        self.running = False
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+    def set_paused(self, paused):
+        self.paused = paused
+
+
+    def queue_edit(self, r, c, state):
+        self.edits.put(('cell', r, c, state))
+
+
+    def queue_cells(self, rows, cols, state):
+        #many cells set to the same state, applied in one array operation
+        self.edits.put(('cells', rows, cols, state))
+
+
+    def set_board(self, board):
+        #replace the displayed board (reset, randomise) between generations
+        self.edits.put(('board', board))
+
+
+    def set_stats(self, stats):
+        #attach (None: detach) the engine's monitor.StatsStream between generations, numbered from the generation then
+        self.edits.put(('stats', stats))
+
+
+    def apply_edits(self):
+        edited = False
+
+        while True:
+            try:
+                edit = self.edits.get_nowait()
+            except queue.Empty:
+                return edited
+
+            if edit[0] == 'stats':
+                if edit[1] is not None:
+                    edit[1].start(self.generation)
+                self.conway.stats = edit[1]
+                continue
+
+            if edit[0] == 'board':
+                self.board1 = edit[1]
+            elif edit[0] == 'cells':
+                rows, cols, state = edit[1:]
+                self.board_format.set_cells_state(self.board1, rows, cols, state)
+
+                if hasattr(self.conway, 'mark_cells_changed'):
+                    self.conway.mark_cells_changed(rows, cols)
+            else:
+                r, c, state = edit[1:]
+                self.board_format.set_cell_state(self.board1, r, c, state)
+
+                #engines that track activity (SparseConwayLogic) need to hear about edits between generations
+                if hasattr(self.conway, 'mark_changed'):
+                    self.conway.mark_changed(r, c)
+
+            edited = True
+
+
+    def publish(self):
+        board = self.board1
+        if board.dtype == object:
+            board = CellBoard().cells_to_bool_array(board)
+
+        np.copyto(self.write_buffer, board[:self.rows, :self.cols])
+
+        with self.lock:
+            self.write_buffer, self.ready_buffer = self.ready_buffer, self.write_buffer
+            self.fresh = True
+
+
+    def record(self):
+        if self.recorder is not None:
+            self.recorder.write(self.generation, self.conway.to_bool_array(self.rows, self.cols, self.board1))
+
+
+    def count_changed(self):
+        #cells that differ between the new generation and the one before
+        board1 = self.conway.to_bool_array(self.rows, self.cols, self.board1)
+        board2 = self.conway.to_bool_array(self.rows, self.cols, self.board2)
+
+        return int(np.count_nonzero(board1[:self.rows, :self.cols] != board2[:self.rows, :self.cols]))
+
+
+    def get_snapshot(self):
+        #latest completed generation as a bool board, owned by the caller until the next call
+        with self.lock:
+            if self.fresh:
+                self.read_buffer, self.ready_buffer = self.ready_buffer, self.read_buffer
+                self.fresh = False
+
+        return self.read_buffer
+
+
+    def loop(self):
+        next_step = time.perf_counter()
+
+        while self.running:
+
+            if self.apply_edits() and self.paused:
+                self.publish()
+
+            if self.paused:
+                time.sleep(0.005)
+                next_step = time.perf_counter()
+                continue
+
+            start = self.profiler.start()
+            self.board1, self.board2 = self.conway.get_board_next_gen(self.rows, self.cols, self.scale, self.board1, self.board2)
+            self.profiler.stop('step', start)
+
+            self.generation += 1
+            self.profiler.count('generations')
+            if self.profiler.enabled:
+                self.profiler.count('cells_changed', self.count_changed())
+
+            self.publish()
+            self.record()
+
+            if self.gens_per_sec:
+                next_step += 1 / self.gens_per_sec
+                delay = next_step - time.perf_counter()
+
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    #running behind, don't try to catch up
+                    next_step = time.perf_counter()
+
+
+
+#stepping engines selectable by name, all share the get_board_next_gen/create_boards/to_bool_array contract
+ENGINES = {
+    'reference': ConwayLogic,
+    'numpy': NumpyConwayLogic,
+    'bitpacked': BitPackedConwayLogic,
+    'sparse': SparseConwayLogic,
+    'parallel': ParallelConwayLogic,
+}
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+#Headless batch runs: no window, no pygame, just stepping as fast as the engine allows
+
+#Module Imports
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+
+from core import ENGINES, LifeRule, NumpyConwayLogic, HashlifeUniverse, ChunkedUniverse, CycleDetector, Ensemble
+from recording import Recorder
+from checkpoint import MappedRun
+from soup import Soup, SYMMETRIES
+from monitor import StatsStream, NDJSONStatsSink, CSVStatsSink
+from streaming import FrameServer
+from patterns import EXTENSIONS, PatternFile, PatternLibrary, PatternWriter
+
+
+
+class HeadlessGame():
+
+    def __init__(self, rows, cols, engine='numpy', prob=0.2, seed=None, workers=None, tiles=None, max_period=0,
+                 rule='B3/S23', soup=None, pattern=None, pattern_at=None):
+
+        self.rows = rows
+        self.cols = cols
+        self.engine_name = engine
+        self.prob = prob
+        self.seed = seed
+        #stop early once the board dies out or repeats with a period up to max_period (0 = never check)
+        self.max_period = max_period
+        #soup.Soup the starting board is drawn from, a uniform soup of density prob by default
+        self.soup = soup or Soup(rows, cols, seed, prob)
+        #patterns.Pattern stamped on an empty board instead, at (top, left) pattern_at or in the middle
+        self.pattern = pattern
+        self.pattern_at = pattern_at
+
+        self.rule = LifeRule(rule)
+
+        if engine == 'hashlife':
+            self.conway = HashlifeUniverse(rule=self.rule)
+        elif engine == 'unbounded':
+            #steps the rows x cols window of an infinite plane, cells leaving it are kept, not wrapped
+            self.conway = ChunkedUniverse(rule=self.rule)
+        elif engine == 'parallel':
+            self.conway = ENGINES[engine](workers, tiles, self.rule)
+        else:
+            self.conway = ENGINES[engine](rule=self.rule)
+
+
+    def set_board(self):
+        #seeded random soup, same board for every engine given the same seed
+        if self.pattern is None:
+            return self.soup.get_rows(0, self.rows)
+
+        board = np.zeros((self.rows, self.cols), dtype=bool)
+        top, left = self.pattern_at or ((self.rows - self.pattern.height) // 2, (self.cols - self.pattern.width) // 2)
+        self.pattern.stamp(board, top, left)
+
+        return board
+
+
+    def run(self, generations, board=None, recorder=None, stats_stream=None):
+        #step generations from board (or a fresh soup), return the final bool board and timing stats
+        #recorder (recording.Recorder) is written every generation, hashlife only has the first and last to give
+        #stats_stream (monitor.StatsStream) gets every generation's counts from the engine, hashlife has none to give
+
+        #the soup's own seed, drawn when none was given, so an unseeded run can be repeated
+        seed = self.soup.seed if board is None and self.pattern is None else self.seed
+        if board is None:
+            board = self.set_board()
+
+        start = time.perf_counter()
+        stepped = generations
+        detector = None
+
+        if self.engine_name == 'hashlife':
+            #unbounded universe: the board is exported as the original window, no torus wrap
+            self.conway.set_board(board)
+            self.conway.advance(generations)
+            final = self.conway.get_board(self.rows, self.cols)
+
+            if recorder is not None:
+                recorder.write(0, board)
+                recorder.write(generations, final)
+
+        elif not self.max_period and recorder is None and stats_stream is None and isinstance(self.conway, NumpyConwayLogic):
+            #nothing to look at between generations: step them all in one temporally blocked call
+            final = self.conway.advance(board, generations)
+
+        else:
+            board1, board2 = self.conway.create_boards(board)
+            self.conway.stats = stats_stream
+
+            if self.max_period:
+                detector = CycleDetector(self.rows, self.cols, self.max_period)
+                detector.start(board)
+
+            if recorder is not None:
+                recorder.write(0, board)
+
+            for gen in range(generations):
+                board1, board2 = self.conway.get_board_next_gen(self.rows, self.cols, 1, board1, board2)
+
+                if recorder is not None:
+                    recorder.write(gen + 1, self.conway.to_bool_array(self.rows, self.cols, board1))
+
+                if detector and detector.update(self.conway.to_bool_array(self.rows, self.cols, board1),
+                                                self.conway.to_bool_array(self.rows, self.cols, board2)):
+                    stepped = gen + 1
+                    break
+
+            if detector and detector.status != 'running':
+                #the rest of the run is a repeat, answer the final generation from the cycle cache
+                final = detector.get_board_at(generations)
+            else:
+                final = np.array(self.conway.to_bool_array(self.rows, self.cols, board1))
+
+        seconds = time.perf_counter() - start
+
+        if hasattr(self.conway, 'close'):
+            self.conway.close()
+
+        stats = {
+            'engine': self.engine_name,
+            'rows': self.rows,
+            'cols': self.cols,
+            'rule': self.rule.rulestring,
+            'prob': self.prob,
+            'seed': seed,
+            'generations': generations,
+            'stepped': stepped,
+            'seconds': seconds,
+            'gens_per_sec': stepped / seconds if seconds else float('inf'),
+            'ns_per_cell': seconds * 1e9 / (stepped * self.rows * self.cols) if stepped else 0.0,
+            'population': int(final.sum()),
+        }
+
+        if detector:
+            stats.update(detector.get_result())
+
+        if hasattr(self.conway, 'get_stats'):
+            stats['engine_stats'] = self.conway.get_stats()
+
+        return final, stats
+
+
+
+class HeadlessEnsemble():
+    #batch of independent soups, each run until it dies out, settles or cycles with period up to max_period
+
+    def __init__(self, boards, rows, cols, prob=0.2, seed=None, max_period=8, rule='B3/S23'):
+        self.boards = boards
+        self.rows = rows
+        self.cols = cols
+        self.prob = prob
+        #an unseeded batch still reports the seed it drew, so it can be rerun
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.rule = LifeRule(rule)
+        self.ensemble = Ensemble(rows, cols, self.rule, max_period)
+
+
+    def run(self, generations):
+        #returns the per-board results array (Ensemble.RESULT_DTYPE) and summary stats
+        self.ensemble.set_random_boards(np.full(self.boards, self.prob), self.seed)
+
+        start = time.perf_counter()
+        results = self.ensemble.run(generations)
+        seconds = time.perf_counter() - start
+
+        stats = {
+            'engine': 'ensemble',
+            'boards': self.boards,
+            'rows': self.rows,
+            'cols': self.cols,
+            'rule': self.rule.rulestring,
+            'prob': self.prob,
+            'seed': self.seed,
+            'generations': generations,
+            'stepped': self.ensemble.generation,
+            'seconds': seconds,
+            'mean_population': float(results['population'].mean()),
+        }
+        stats.update(self.ensemble.get_status_counts())
+
+        return results, stats
+
+
+
+class HeadlessMappedRun():
+    #run on memory-mapped boards in a run directory, resumed from its last checkpoint if it has one
+
+    def __init__(self, path, rows, cols, board_format='packed', prob=0.2, seed=None, rule='B3/S23', checkpoint_every=None):
+        self.run_dir = MappedRun(path)
+        self.checkpoint_every = checkpoint_every
+
+        if os.path.exists(os.path.join(path, 'checkpoint.json')):
+            self.resumed = True
+            self.run_dir.resume()
+        else:
+            self.resumed = False
+            self.run_dir.create(rows, cols, board_format, rule, prob, seed)
+
+
+    def run(self, generations):
+        #the board stays in the run directory (it may not fit in RAM), only stats are returned
+        run_dir = self.run_dir
+        first = run_dir.generation
+
+        start = time.perf_counter()
+        run_dir.advance(generations, self.checkpoint_every)
+        seconds = time.perf_counter() - start
+
+        stats = {
+            'engine': 'mapped-' + run_dir.format,
+            'rows': run_dir.rows,
+            'cols': run_dir.cols,
+            'rule': run_dir.rule,
+            'prob': run_dir.prob,
+            'seed': run_dir.seed,
+            'resumed_from': first if self.resumed else None,
+            'generation': run_dir.generation,
+            'stepped': generations,
+            'seconds': seconds,
+            'gens_per_sec': generations / seconds if seconds else float('inf'),
+            'ns_per_cell': seconds * 1e9 / (generations * run_dir.rows * run_dir.cols) if generations else 0.0,
+            'population': run_dir.get_population(),
+        }
+
+        return None, stats
+
+
+
+class Headless():
+
+    def main(argv=None):
+
+        parser = argparse.ArgumentParser(description="Run Conway's Game of Life without a window")
+        parser.add_argument('--rows', type=int, default=60)
+        parser.add_argument('--cols', type=int, default=80)
+        parser.add_argument('--prob', type=float, default=0.2, help='initial density of live cells')
+        parser.add_argument('--prob-end', type=float, default=None,
+                            help='density gradient from --prob at the top to this at the bottom')
+        parser.add_argument('--symmetry', choices=[s for s in SYMMETRIES if s], default=None, help='symmetric soup')
+        parser.add_argument('--region', default=None, help='TOP,LEFT,HEIGHT,WIDTH: only fill this rectangle')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--generations', type=int, default=100)
+        parser.add_argument('--rule', default='B3/S23', help='Life-like rulestring, e.g. B36/S23')
+        parser.add_argument('--engine', choices=sorted(ENGINES) + ['hashlife', 'unbounded'], default='numpy')
+        parser.add_argument('--workers', type=int, default=None, help='parallel engine process count')
+        parser.add_argument('--tiles', type=int, default=None, help='parallel engine row band count')
+        parser.add_argument('--max-period', type=int, default=0,
+                            help='stop once the board dies out or cycles with period up to this (0 = off)')
+        parser.add_argument('--ensemble', type=int, default=0,
+                            help='run this many independent soups as one batch instead of a single board')
+        parser.add_argument('--output', default=None,
+                            help='save the final board (or ensemble results) as .npy, or as a .rle/.cells/.lif pattern')
+        parser.add_argument('--pattern', default=None, help='start from this pattern file (or library name) instead of a soup')
+        parser.add_argument('--library', default=None, help='directory of pattern files --pattern can name')
+        parser.add_argument('--pattern-at', default=None, help='ROW,COL of the pattern top left corner (default: centred)')
+        parser.add_argument('--rotate', type=int, default=0, help='quarter turns clockwise for --pattern')
+        parser.add_argument('--flip', action='store_true', help='mirror --pattern left to right')
+        parser.add_argument('--stats', default=None, help='write timing stats as JSON')
+        parser.add_argument('--record', default=None, help='archive every generation to this file (recording.Recorder)')
+        parser.add_argument('--keyframe-interval', type=int, default=100, help='generations between recorded keyframes')
+        parser.add_argument('--serve', default=None, metavar='HOST:PORT',
+                            help='stream every generation to viewers (main.py --connect) instead of running silently')
+        parser.add_argument('--wait-clients', type=int, default=0, help='with --serve, start once this many viewers connect')
+        parser.add_argument('--speed', type=float, default=None, help='with --serve, generations per second')
+        parser.add_argument('--stats-stream', default=None,
+                            help='write population, births, deaths and bounding box per generation (.csv or NDJSON)')
+        parser.add_argument('--checkpoint', default=None,
+                            help='run directory of memory-mapped boards, resumed from its last checkpoint if present')
+        parser.add_argument('--checkpoint-every', type=int, default=None, help='generations between checkpoints')
+        parser.add_argument('--board-format', choices=['packed', 'uint8'], default='packed',
+                            help='checkpointed board storage, 1 bit or 1 byte per cell')
+        args = parser.parse_args(argv)
+
+        #checkpointed and ensemble runs have no single in-RAM board to hand over every generation
+        for option in ('record', 'stats_stream'):
+            if getattr(args, option) and (args.checkpoint or args.ensemble):
+                parser.error(f"--{option.replace('_', '-')} only works for single board runs, not --checkpoint or --ensemble")
+
+        #hashlife jumps straight to the last generation, there are no generations between to count or check
+        for option in ('stats_stream', 'max_period'):
+            if args.engine == 'hashlife' and getattr(args, option) and not (args.checkpoint or args.ensemble):
+                parser.error(f"--{option.replace('_', '-')} does not work with --engine hashlife")
+
+        if args.serve and (args.checkpoint or args.ensemble):
+            parser.error('--serve streams a single board run, not --checkpoint or --ensemble')
+        if args.serve and args.engine == 'hashlife':
+            parser.error('--serve streams every generation, --engine hashlife jumps over them')
+
+        #the viewers get the board, a served run does not record, save or stop early on it
+        for option in ('record', 'output', 'max_period'):
+            if args.serve and getattr(args, option):
+                parser.error(f"--{option.replace('_', '-')} does not work with --serve")
+
+        output_format = EXTENSIONS.get(os.path.splitext(args.output)[1].lower()) if args.output else None
+        if output_format and (args.checkpoint or args.ensemble):
+            parser.error(f'--output {args.output}: only a single board run can be saved as a pattern, use .npy')
+
+        if args.checkpoint:
+            game = HeadlessMappedRun(args.checkpoint, args.rows, args.cols, args.board_format, args.prob, args.seed,
+                                     args.rule, args.checkpoint_every)
+        elif args.ensemble:
+            game = HeadlessEnsemble(args.ensemble, args.rows, args.cols, args.prob, args.seed, args.max_period or 8,
+                                    args.rule)
+        else:
+            region = tuple(int(n) for n in args.region.split(',')) if args.region else None
+            soup = Soup(args.rows, args.cols, args.seed, args.prob, args.prob_end, symmetry=args.symmetry, region=region)
+
+            pattern = None
+            if args.pattern:
+                library = PatternLibrary([args.library] if args.library else [])
+                pattern = library.get(args.pattern) if args.pattern in library.index else PatternFile(args.pattern).read()
+                pattern = pattern.transform(args.rotate, args.flip)
+            pattern_at = tuple(int(n) for n in args.pattern_at.split(',')) if args.pattern_at else None
+
+            game = HeadlessGame(args.rows, args.cols, args.engine, args.prob, args.seed, args.workers, args.tiles,
+                                args.max_period, args.rule, soup, pattern, pattern_at)
+
+        options = {}
+
+        if args.record:
+            options['recorder'] = Recorder(args.record, args.rows, args.cols, args.rule, args.keyframe_interval)
+
+        if args.stats_stream:
+            sink = CSVStatsSink if args.stats_stream.endswith('.csv') else NDJSONStatsSink
+            options['stats_stream'] = StatsStream([sink(args.stats_stream)])
+
+        if args.serve:
+            #one simulation for every viewer, the board only ever leaves as frames
+            host, port = args.serve.rsplit(':', 1)
+            game.conway.stats = options.get('stats_stream')
+            server = FrameServer(game.conway, args.rows, args.cols, game.set_board(), args.rule, args.keyframe_interval,
+                                 gens_per_sec=args.speed)
+            board, stats = None, asyncio.run(server.serve(host, int(port), args.generations or None, args.wait_clients))
+        else:
+            board, stats = game.run(args.generations, **options)
+
+        for option in options.values():
+            option.close()
+
+        #checkpointed runs keep their board in the run directory, served runs only send theirs
+        if args.output and board is not None:
+            if output_format:
+                PatternWriter(args.output, args.rows, args.cols, output_format, rule=args.rule).write(board)
+            else:
+                np.save(args.output, board)
+
+        if args.stats:
+            with open(args.stats, 'w') as f:
+                json.dump(stats, f, indent=2)
+
+        for key, value in stats.items():
+            print(f'{key}: {value}')
+
+        return stats
+
+
+    if __name__ == '__main__':
+        main()
@@ -4,22 +4,31 @@
 
 
 #Module Imports
+import argparse
 import pygame as pg
 import numpy as np
-import time
 import sys
-import random
+
+from core import (Cell, CellBoard, ArrayBoard, LifeRule, ConwayLogic, NumpyConwayLogic, BitPackedConwayLogic,
+                  SparseConwayLogic, QuadNode, HashlifeUniverse, ParallelConwayLogic, ChunkedUniverse, CycleDetector,
+                  SimulationThread, Profiler)
+from recording import Recorder, Replayer, ReplayThread
+from monitor import StatsStream, RingBufferStatsSink
+from streaming import StreamClient, StreamThread
+from patterns import PatternFile
 
 
 class Settings():
         
-    def __init__(self, width, height, scale, font_size, fps, prob):
+    def __init__(self, width, height, scale, font_size, fps, prob, rule='B3/S23', unbounded=False, gens_per_sec=None,
+                 rows=None, cols=None, seed=None):
     
         #Window Display
         self.WIDTH, self.HEIGHT = width, height
         self.scale = scale
-        self.rows = self.HEIGHT//self.scale
-        self.cols = self.WIDTH//self.scale
+        #board size defaults to what fits the window at scale, larger boards are viewed through a Viewport
+        self.rows = rows or self.HEIGHT//self.scale
+        self.cols = cols or self.WIDTH//self.scale
         self.SCREEN = pg.display.set_mode((self.WIDTH,self.HEIGHT))
         pg.display.set_caption("Conway's Game of Life")
 
@@ -58,6 +67,7 @@ class Settings():
         self.font_size = font_size
         self.font = pg.font.SysFont('Arial', self.font_size)
         self.menu_surf = pg.Surface((self.WIDTH, self.HEIGHT))
+        self.profiler_surf = pg.Surface((self.WIDTH, self.HEIGHT))
         
     
 
@@ -65,6 +75,13 @@ class Settings():
         self.FPS = fps
         self.clock = pg.time.Clock()
         self.prob = prob
+        self.rule = LifeRule(rule)
+        #unbounded: the window shows the top left of an infinite plane instead of wrapping at its edges
+        self.unbounded = unbounded
+        #simulation speed target, None steps as fast as the engine allows
+        self.gens_per_sec = gens_per_sec
+        #randomised boards are reproducible given a seed, None gives different soups every run
+        self.seed = seed
         
 
     def blit_to_screen(self, window, pos_x, pos_y, text, colour=(211,211,211)):
@@ -80,129 +97,408 @@ class Settings():
         self.blit_to_screen(self.menu_surf, self.scale, 13, 'x:               Reset')
         self.blit_to_screen(self.menu_surf, self.scale, 15, 'r:               Randomise')
         self.blit_to_screen(self.menu_surf, self.scale, 17, 'f:                Funky Time')      
+        self.blit_to_screen(self.menu_surf, self.scale, 19, 'arrows:       Pan')
+        self.blit_to_screen(self.menu_surf, self.scale, 21, 'wheel/+/-:  Zoom')
+        self.blit_to_screen(self.menu_surf, self.scale, 23, 'p:               Profiler')
+        self.blit_to_screen(self.menu_surf, self.scale, 25, 'a:               Colour by Age')
+        self.blit_to_screen(self.menu_surf, self.scale, 27, '[ / ]:          Seek (Replay)')
+        self.blit_to_screen(self.menu_surf, self.scale, 29, 'b / 1-9:      Brush Shape/Size')
+
+
+    def write_to_profiler_surf(self, report, latest=None):
+        #live rates and ms per phase (median / 99th percentile) down the right half of the window
+        #latest: the engine's last generation stats (monitor.RingBufferStatsSink.get_latest)
+        lines = [f"{report['fps']:.1f} fps   {report['gens_per_sec']:.1f} gens/s"]
+
+        if latest is not None:
+            lines.append(f"gen {latest['generation']}: {latest['population']} alive  +{latest['births']} -{latest['deaths']}")
+            if latest['top'] >= 0:
+                lines.append(f"box: ({latest['top']}, {latest['left']}) - ({latest['bottom']}, {latest['right']})")
+
+        lines += [f"{phase}: {times['p50']:.2f} / {times['p99']:.2f} ms" for phase, times in report['phases'].items()]
+        lines += [f"{name}: {value}" for name, value in report['counters'].items()]
+
+        for i, line in enumerate(lines):
+            self.profiler_surf.blit(self.font.render(line, True, (211,211,211)), (self.WIDTH//2, self.scale*(2 + 2*i)))
                               
 
 
 
 
-class Cell():
-    
-    def __init__(self, state=False):
-        #True = Alive, False = Dead 
-        self.state = state      
+class Viewport():
+    #Camera over the board: the top left cell on screen plus the zoom level
+    #zoomed in each cell is scale pixels, zoomed out each pixel covers block x block cells
 
+    def __init__(self, width, height, rows, cols, scale, max_scale=64):
+        self.width, self.height = width, height
+        self.rows, self.cols = rows, cols
+        self.scale = scale
+        self.block = 1
+        self.max_scale = max_scale
+        #zoomed all the way out the whole board fits the window
+        self.max_block = max(1, -(-rows // height), -(-cols // width))
+        self.top, self.left = 0, 0
 
 
-class Grid():
-    
-    def create_empty_2d_array(self, rows, cols):
-        return np.full(shape=(rows, cols),fill_value=None)
+    def get_view_shape(self):
+        #screen cells (scale pixels each) needed to cover the window
+        return -(-self.height // self.scale), -(-self.width // self.scale)
 
-    
-    def screen_colour_fill(self, screen, board, colours, rows, cols, scale, funky, rgb_loop, pause):
-        
-        for r in range(rows):
 
-            for c in range(cols):
+    def get_camera(self):
+        #changes whenever the screen position of every cell changes
+        return (self.top, self.left, self.scale, self.block)
 
-                if board[r][c].state == True:
-                    if not funky:
-                        #In pygame positions pass as an (X,Y) coordinate, so flip position in draw.rect 
-                        pg.draw.rect(screen, colours['standard']['WHITE'], (c*scale, r*scale, scale-1,scale-1))
-                    else:
-                        pg.draw.rect(screen, colours['funky'][rgb_loop], (c*scale, r*scale, scale-1,scale-1))
-                    
+
+    def clamp(self):
+        view_rows, view_cols = self.get_view_shape()
+        self.top = max(0, min(self.top, self.rows - view_rows * self.block))
+        self.left = max(0, min(self.left, self.cols - view_cols * self.block))
+
+
+    def get_view(self, board):
+        #visible part of the board, block x block cells reduced to one view cell alive if any of them are
+        view_rows, view_cols = self.get_view_shape()
+        block = self.block
+        region = board[self.top:self.top + view_rows * block, self.left:self.left + view_cols * block]
+
+        if block == 1:
+            return region
+
+        #OR together every block-th row, then every block-th column: contiguous passes, no padded copy
+        rows, cols = -(-region.shape[0] // block), -(-region.shape[1] // block)
+        by_rows = np.zeros((rows, region.shape[1]), dtype=bool)
+        for i in range(block):
+            part = region[i::block]
+            by_rows[:len(part)] |= part
+
+        view = np.zeros((rows, cols), dtype=bool)
+        for i in range(block):
+            part = by_rows[:, i::block]
+            view[:, :part.shape[1]] |= part
+
+        return view
+
+
+    def screen_to_cells(self, xs, ys):
+        #board (rows, cols) under arrays of window pixels, off the board or not
+        return self.top + (ys // self.scale) * self.block, self.left + (xs // self.scale) * self.block
+
+
+    def screen_to_cell(self, x, y):
+        #board (row, col) under a window pixel, None when it is off the board
+        r = self.top + (y // self.scale) * self.block
+        c = self.left + (x // self.scale) * self.block
+
+        if 0 <= r < self.rows and 0 <= c < self.cols:
+            return r, c
+
+        return None
+
+
+    def pan(self, rows, cols):
+        #move by screen cells, so a pan step looks the same at every zoom
+        self.top += rows * self.block
+        self.left += cols * self.block
+        self.clamp()
+
+
+    def zoom(self, steps, x=None, y=None):
+        #zoom in (steps > 0) or out by factors of two, keeping the cell under pixel (x, y) in place
+        x = self.width // 2 if x is None else x
+        y = self.height // 2 if y is None else y
+        r = self.top + (y // self.scale) * self.block
+        c = self.left + (x // self.scale) * self.block
+
+        for step in range(abs(steps)):
+            if steps > 0:
+                if self.block > 1:
+                    self.block //= 2
                 else:
-                    
-                    pg.draw.rect(screen, colours['standard']['BLACK'], (c*scale, r*scale, scale-1, scale-1))
-                    
-                    
-    def fill_array_with_cells(self, board, rows, cols, rand=None, prob=None):
+                    self.scale = min(self.scale * 2, self.max_scale)
+            else:
+                if self.scale > 1:
+                    self.scale //= 2
+                else:
+                    self.block = min(self.block * 2, self.max_block)
 
-            for r in range(rows):
+        self.top = r - (y // self.scale) * self.block
+        self.left = c - (x // self.scale) * self.block
+        self.clamp()
 
-                for c in range(cols):
 
-                    board[r][c] = Cell()
 
-                    if rand: 
-                        if random.random() < prob:
-                            board[r][c].state = True
-                            
+class Brush():
+    #Cells painted around each point of a stroke: a size x size square or circle
+
+    SHAPES = ('square', 'circle')
+
+    def __init__(self, size=1, shape='square'):
+        self.size = size
+        self.shape = shape
+
+
+    def get_offsets(self):
+        #(rows, cols) offsets of the brush cells from the point painted
+        steps = np.arange(self.size)
+        rows, cols = np.meshgrid(steps, steps, indexing='ij')
+
+        if self.shape == 'circle':
+            centre = (self.size - 1) / 2
+            inside = (rows - centre)**2 + (cols - centre)**2 <= (self.size / 2)**2
+            rows, cols = rows[inside], cols[inside]
+
+        return rows.ravel() - (self.size - 1) // 2, cols.ravel() - (self.size - 1) // 2
+
+
+
+class MouseInput():
+    #Gathers every mouse event of a frame into strokes (draw with the left button, erase with the right)
+    #A frame's strokes are painted at once: the lines joining the positions, stamped with the brush
+
+    def __init__(self, brush=None):
+        self.brush = brush or Brush()
+        #True drawing, False erasing, None with no button down
+        self.state = None
+        #window positions of the stroke being drawn, from the last one painted
+        self.points = []
+        #(state, points) of strokes finished this frame
+        self.strokes = []
+
+
+    def handle_event(self, event):
+        if event.type == pg.MOUSEBUTTONDOWN and event.button in (1, 3):
+            self.end_stroke()
+            self.state = event.button == 1
+            self.points = [event.pos]
+
+        elif event.type == pg.MOUSEMOTION and self.state is not None:
+            self.points.append(event.pos)
+
+        elif event.type == pg.MOUSEBUTTONUP and self.state == (event.button == 1) and event.button in (1, 3):
+            self.points.append(event.pos)
+            self.end_stroke()
+
+
+    def end_stroke(self):
+        if self.state is not None:
+            self.strokes.append((self.state, self.points))
+
+        self.state = None
+        self.points = []
+
+
+    def take_strokes(self):
+        #strokes since the last call, a stroke still being drawn carries on from its last position next frame
+        strokes = self.strokes
+        if self.state is not None:
+            strokes.append((self.state, self.points))
+            self.points = self.points[-1:]
+
+        self.strokes = []
+
+        return strokes
+
+
+    def get_cells(self, viewport, points):
+        #(rows, cols) of the board cells under the brush along the lines joining window positions, each once
+        rows, cols = viewport.screen_to_cells(*np.array(points).T)
+
+        #every segment is stepped once per cell along its longer side, all segments in one go
+        steps = np.maximum(np.maximum(np.abs(np.diff(rows)), np.abs(np.diff(cols))), 1)
+        segment = np.repeat(np.arange(len(steps)), steps)
+        t = np.arange(len(segment)) - np.repeat(np.cumsum(steps) - steps, steps)
+        line_rows = np.append(rows[segment] + np.rint(np.diff(rows)[segment] * t / steps[segment]), rows[-1])
+        line_cols = np.append(cols[segment] + np.rint(np.diff(cols)[segment] * t / steps[segment]), cols[-1])
+
+        brush_rows, brush_cols = self.brush.get_offsets()
+        rows = (line_rows.astype(np.int64)[:, None] + brush_rows).ravel()
+        cols = (line_cols.astype(np.int64)[:, None] + brush_cols).ravel()
+
+        inside = (rows >= 0) & (rows < viewport.rows) & (cols >= 0) & (cols < viewport.cols)
+        cells = np.unique(rows[inside] * viewport.cols + cols[inside])
+
+        return cells // viewport.cols, cells % viewport.cols
+
+
+
+class Grid(CellBoard):
+    #pygame rendering: the board is mapped to palette indexes in one array operation on an 8 bit surface
+    #colours live in the surface palette, so a colour change alone never touches the pixels
+
+    def __init__(self, dirty_tile=16, colour_mode='state'):
+        #board and colour of the last rendered frame, for dirty rects
+        self.last_board = None
+        self.last_colour = None
+        self.last_camera = None
+        #cells per side of the squares dirty rects are grouped into
+        self.dirty_tile = dirty_tile
+        #'state': live cells in one colour, 'age': coloured by how many generations they have been alive
+        self.colour_mode = colour_mode
+        #8 bit surface of palette indexes, redrawn only when the indexes change
+        self.surface = None
+        self.ages = None
+        self.last_state = None
+
+
+    def get_bool_board(self, board):
+        if board.dtype != object:
             return board
-                
 
+        return self.cells_to_bool_array(board)
 
 
-class ConwayLogic():
-    
-    def get_neighbours(self, r, c, rows, cols, board):
-    
-            total = 0
+    def get_board_pixels(self, board, scale, gap=True):
+        #(cols*scale, rows*scale) palette index array in surfarray (x, y) order
+        pixels = np.repeat(np.repeat(board.T.view(np.uint8), scale, axis=0), scale, axis=1)
 
-            for n in range(-1,2):
-                for m in range(-1,2):
+        #cells are drawn (scale-1) pixels wide, leaving a one pixel background grid gap
+        if gap:
+            pixels[scale-1::scale] = 0
+            pixels[:, scale-1::scale] = 0
 
-                    row_wrap = (r + n + rows) % (rows)
-                    col_wrap = (c + m + cols)  % (cols)
+        return pixels
 
-                    if board[row_wrap][col_wrap].state == True:
-                        total+=1
 
-            if board[r][c].state ==True:
-                total -=1
+    def get_palette(self, colours, funky, rgb_loop):
+        #index 0 is the background, 1 live cells, or in age mode 1-255 the age (255 = that old or older)
+        palette = np.zeros((256, 3), dtype=np.uint8)
+        palette[0] = colours['standard']['BLACK']
 
-            return total
-    
+        if self.colour_mode == 'age':
+            #every 4 generations of age steps one colour along the funky list, cycling it when funky
+            ramp = np.array(list(colours['funky'].values()), dtype=np.uint8)
+            if funky:
+                ramp = np.roll(ramp, -list(colours['funky']).index(rgb_loop), axis=0)
+            palette[1:] = ramp[np.minimum(np.arange(255) // 4, len(ramp) - 1)]
 
-    def get_cell_next_state(self, r, c, rows, cols, scale, board):
-        
-        neighbour_total = self.get_neighbours(r, c, rows, cols, board)
+        elif funky:
+            palette[1] = colours['funky'][rgb_loop]
+        else:
+            palette[1] = colours['standard']['WHITE']
 
-        if board[r][c].state == True:
-            
-            #RULE: ANY LIVE CELL WITH N < 2 OR N > 3 DIES
-            if neighbour_total>3 or neighbour_total < 2:
-                return False
-            
-            #RULE: ANY LIVE CELL WITH N ==2 OR N ==3 LIVES
-            if neighbour_total == 2 or neighbour_total == 3:
-                return True
+        return palette
 
 
-        #RULE: ANY DEAD CELL WITH N == 3 LIVES
-        if board[r][c].state == False:
-            if neighbour_total == 3:
-                return True
-            #ELSE DEAD REMAIN DEAD
-            else:
-                return False
-        
-                                    
-        
-        
-    def get_board_next_gen(self, rows, cols, scale, board1, board2):
+    def get_board_indexes(self, board, camera):
+        #palette index per view cell: the state, or the age of live cells
+        if self.colour_mode != 'age':
+            return board.view(np.uint8)
 
-                for r in range(rows):
+        if self.ages is None or self.ages.shape != board.shape or camera != self.last_camera:
+            self.ages = board.astype(np.uint8)
 
-                    for c in range(cols):
+        elif not np.array_equal(board, self.last_state):
+            #only a new generation ages the cells, redrawing the same one (paused) does not
+            self.ages += self.ages < 255
+            self.ages *= board
 
-                        board2[r][c].state = self.get_cell_next_state(r, c, rows, cols, scale, board1)
+        self.last_state = board.copy()
+
+        return self.ages
+
+
+    def get_dirty_rects(self, board, rows, cols, scale, colour, camera=None):
+        #screen rects covering cells changed since the last frame, grouped into dirty_tile squares
+        #a camera change (pan/zoom) moves every cell, so the whole board is redrawn
+
+        if (self.last_board is None or self.last_board.shape != board.shape or colour != self.last_colour
+                or camera != self.last_camera):
+            rects = [pg.Rect(0, 0, cols*scale, rows*scale)]
+
+        else:
+            tile = self.dirty_tile
+            changed = np.zeros((-(-rows // tile) * tile, -(-cols // tile) * tile), dtype=bool)
+            np.not_equal(board, self.last_board, out=changed[:rows, :cols])
+            changed_tiles = changed.reshape(changed.shape[0] // tile, tile, changed.shape[1] // tile, tile).any(axis=(1, 3))
+
+            rects = [pg.Rect(tc*tile*scale, tr*tile*scale, tile*scale, tile*scale) for tr, tc in np.argwhere(changed_tiles)]
+
+        self.last_board = board.copy()
+        self.last_colour = colour
+        self.last_camera = camera
+
+        return rects
+
+
+    def screen_colour_fill(self, screen, board, colours, rows, cols, scale, funky, rgb_loop, pause, viewport=None):
+        #draws the board (or only its visible part given a viewport) and returns the rects that changed since the last call
+
+        board = self.get_bool_board(board)
+        camera = None
+
+        if viewport is None:
+            board = board[:rows, :cols]
+            gap = True
+        else:
+            #the work is proportional to the visible region, not the board
+            board = viewport.get_view(board)
+            rows, cols = board.shape
+            scale = viewport.scale
+            camera = viewport.get_camera()
+            #no grid gap once cells are too small to show one
+            gap = scale > 2
+
+        indexes = self.get_board_indexes(board, camera)
+        palette = self.get_palette(colours, funky, rgb_loop)
+
+        #cells cut by the window edge are clipped
+        width, height = min(cols*scale, screen.get_width()), min(rows*scale, screen.get_height())
+
+        #same indexes as last frame: keep the pixels, only the palette may have changed
+        redraw = (self.surface is None or self.surface.get_size() != (width, height) or camera != self.last_camera
+                  or self.last_board is None or not np.array_equal(indexes, self.last_board))
+
+        if self.surface is None or self.surface.get_size() != (width, height):
+            self.surface = pg.Surface((width, height), depth=8)
+
+        if redraw:
+            pg.surfarray.blit_array(self.surface, self.get_board_pixels(indexes, scale, gap)[:width, :height])
+
+        self.surface.set_palette(palette.tolist())
+        screen.blit(self.surface, (0, 0))
+
+        return self.get_dirty_rects(indexes, rows, cols, scale, (self.colour_mode, funky, rgb_loop), camera)
+
+
+
+class ArrayGrid(ArrayBoard, Grid):
+    #pygame rendering for bool array boards
+
+    def get_bool_board(self, board):
+        return board
 
-                board1, board2 = board2, board1
 
-                return board1, board2    
-                
 
 
 #use all helper classes to execute game logic
 class RunGame():
     
-    def __init__(self, settings, grid, conway):
+    def __init__(self, settings, grid, conway, recorder=None, replayer=None, stream=None, pattern=None):
         
         self.settings = settings
         self.grid     = grid
         self.conway   = conway
+        self.simulation = None
+        #recorder archives the live run, replayer plays a recording instead of running one
+        self.recorder = recorder
+        self.replayer = replayer
+        #stream (streaming.StreamClient) shows a server's run instead of stepping one here
+        self.stream = stream
+        #patterns.Pattern stamped in the middle of the starting board
+        self.pattern = pattern
+        #soups made so far, the nth soup of a seeded run is seeded with [seed, n]
+        self.soups = 0
+        #frame timing, off until the overlay is shown
+        self.profiler = Profiler()
+        #per generation population/births/deaths from the engine, only attached while the overlay is shown
+        self.stats_ring = RingBufferStatsSink()
+        self.stats = StatsStream([self.stats_ring])
+        self.viewport = Viewport(settings.WIDTH, settings.HEIGHT, settings.rows, settings.cols, settings.scale)
+        #arrow key -> (rows, cols) pan in screen cells
+        self.pan_keys = {pg.K_UP: (-8, 0), pg.K_DOWN: (8, 0), pg.K_LEFT: (0, -8), pg.K_RIGHT: (0, 8)}
+        #mouse drawing, gathered over a frame and painted once
+        self.mouse = MouseInput()
     
 
     
@@ -210,30 +506,26 @@ class RunGame():
     
         board = self.grid.create_empty_2d_array(self.settings.rows, self.settings.cols)
 
-        self.grid.fill_array_with_cells(board, self.settings.rows, self.settings.cols, rand, prob)
+        seed = None
+        if rand and self.settings.seed is not None:
+            seed = [self.settings.seed, self.soups]
+            self.soups += 1
+
+        self.grid.fill_array_with_cells(board, self.settings.rows, self.settings.cols, rand, prob, seed)
                     
         return board
         
     
     
-    def mouse_handler(self, board):
-        #pos = row, col
-        pos = pg.mouse.get_pos()
-        
-        #FLIP X/Y of pos
-        #now pos=(col,row)
-        pos = (pos[1]//self.settings.scale, pos[0]//self.settings.scale)
-
-        cell = board[pos[0]][pos[1]]
-
-        #DRAW
-        if pg.mouse.get_pressed()[0]:
-            if cell.state == False:
-                board[pos[0]][pos[1]].state = True
-        #ERASE
-        if pg.mouse.get_pressed()[2]:
-            if cell.state == True:
-                board[pos[0]][pos[1]].state =False
+    def paint(self, board):
+        #the frame's mouse strokes as one bulk edit each, shown on the snapshot straight away and merged into
+        #the simulation's board between generations
+        for state, points in self.mouse.take_strokes():
+            rows, cols = self.mouse.get_cells(self.viewport, points)
+
+            if len(rows):
+                board[rows, cols] = state
+                self.simulation.queue_cells(rows, cols, state)
         
     
     
@@ -260,87 +552,186 @@ class RunGame():
                 
                 
         
+    def draw_profiler_surf_to_screen(self):
+        self.settings.profiler_surf.fill((0,0,0))
+        self.settings.write_to_profiler_surf(self.profiler.get_report(), self.stats_ring.get_latest())
+        self.settings.profiler_surf.set_colorkey((0,0,0))
+        self.settings.SCREEN.blit(self.settings.profiler_surf, (0,0))
+
+
+
     def run(self):
             
-        #board_1 for display, board2_ for next gen swapping
-        board_1 = self.set_board()
-        board_2 = self.set_board()
+        #stepping runs in its own thread, board_1 is the latest generation it has completed
+        if self.replayer is not None:
+            self.simulation = ReplayThread(self.replayer, self.settings.gens_per_sec, self.profiler)
+        elif self.stream is not None:
+            self.simulation = StreamThread(self.stream, self.profiler)
+        else:
+            board = self.set_board()
+            if self.pattern is not None:
+                self.pattern.stamp(board, (self.settings.rows - self.pattern.height) // 2,
+                                   (self.settings.cols - self.pattern.width) // 2)
+
+            self.simulation = SimulationThread(self.grid, self.conway, self.settings.rows, self.settings.cols, self.settings.scale,
+                                               board, self.set_board(), self.settings.gens_per_sec, self.profiler,
+                                               self.recorder)
+        self.simulation.start()
+        board_1 = self.simulation.get_snapshot()
         
         #Event loop variables
         pause = True
         show_menu = True
+        show_profiler = False
         funky = False
         rgb_loop = 0
+        full_update = True
 
         
         while True:
             
+            start = self.profiler.start()
             for event in pg.event.get():
 
                     #QUIT ===================================================================================
                     if event.type == pg.QUIT:
+                        self.simulation.stop()
+                        if self.recorder is not None:
+                            self.recorder.close()
                         pg.quit()
                         sys.exit()
 
 
                     #MOUSE DRAW =============================================================================
-                    if pg.mouse.get_pressed():
-                        self.mouse_handler(board_1)
+                    self.mouse.handle_event(event)
 
 
                     #PLAY/PAUSE =============================================================================
                     if event.type == pg.KEYDOWN:
                         if event.key == pg.K_SPACE:
                             pause = not pause
+                            self.simulation.set_paused(pause)
 
 
                     #MENU ===================================================================================
                     if event.type == pg.KEYDOWN:
                         if event.key == pg.K_m:
                             show_menu = not show_menu
+                            full_update = True
                             
                     #RESET===================================================================================
                     if event.type == pg.KEYDOWN:
                         if event.key == pg.K_x:
-                            board_1 = self.set_board()
+                            self.simulation.set_board(self.set_board())
                             
                     #RANDOMISE BOARD ========================================================================
                     if event.type == pg.KEYDOWN:
                         if event.key == pg.K_r:
-                            board_1 = self.set_board(rand=True, prob=self.settings.prob)
+                            self.simulation.set_board(self.set_board(rand=True, prob=self.settings.prob))
                             
                     
                     #FUNKY TIME==============================================================================
                     if event.type == pg.KEYDOWN:
                         if event.key == pg.K_f:
                             funky = not funky
+
+                    #COLOUR BY AGE ==========================================================================
+                    if event.type == pg.KEYDOWN:
+                        if event.key == pg.K_a:
+                            self.grid.colour_mode = 'state' if self.grid.colour_mode == 'age' else 'age'
+
+                    #BRUSH ==================================================================================
+                    if event.type == pg.KEYDOWN:
+                        if event.key == pg.K_b:
+                            shapes = Brush.SHAPES
+                            self.mouse.brush.shape = shapes[(shapes.index(self.mouse.brush.shape) + 1) % len(shapes)]
+                        if pg.K_1 <= event.key <= pg.K_9:
+                            self.mouse.brush.size = event.key - pg.K_0
+
+                    #PAN/ZOOM ===============================================================================
+                    if event.type == pg.KEYDOWN:
+                        if event.key in self.pan_keys:
+                            self.viewport.pan(*self.pan_keys[event.key])
+                        if event.key in (pg.K_EQUALS, pg.K_PLUS, pg.K_KP_PLUS):
+                            self.viewport.zoom(1)
+                        if event.key in (pg.K_MINUS, pg.K_KP_MINUS):
+                            self.viewport.zoom(-1)
+
+                    if event.type == pg.MOUSEWHEEL:
+                        self.viewport.zoom(event.y, *pg.mouse.get_pos())
+
+                    #SEEK (REPLAY) ==========================================================================
+                    if event.type == pg.KEYDOWN and self.replayer is not None:
+                        if event.key in (pg.K_LEFTBRACKET, pg.K_RIGHTBRACKET):
+                            step = self.replayer.keyframe_interval
+                            self.simulation.seek(self.simulation.generation + (step if event.key == pg.K_RIGHTBRACKET else -step))
+
+                    #PROFILER ===============================================================================
+                    if event.type == pg.KEYDOWN:
+                        if event.key == pg.K_p:
+                            show_profiler = not show_profiler
+                            self.profiler.set_enabled(show_profiler)
+                            #the engine is only touched between generations, by the simulation thread
+                            self.simulation.set_stats(self.stats if show_profiler else None)
+                            full_update = True
+
+            self.profiler.stop('events', start)
                             
 
-            #GET BOARD NEXT GENERATION / PLAY GAME ==========================================================
-            if not pause:
+            #GET LATEST GENERATION FROM THE SIMULATION THREAD ================================================
+            start = self.profiler.start()
+            board_1 = self.simulation.get_snapshot()
+            self.profiler.stop('snapshot', start)
 
-                board_1, board_2 = self.conway.get_board_next_gen(self.settings.rows, self.settings.cols, self.settings.scale, board_1, board_2)
+            start = self.profiler.start()
+            self.paint(board_1)
+            self.profiler.stop('mouse', start)
         
                 
             #SCREEN UPDATES =================================================================================
+            start = self.profiler.start()
             self.settings.SCREEN.fill((0,0,0))
             
             if funky:
             
                 rgb_loop = self.rgb_iter(rgb_loop, pause)            
 
-            self.grid.screen_colour_fill(self.settings.SCREEN, board_1, self.settings.colour_dict, self.settings.rows, self.settings.cols, self.settings.scale, funky, self.settings.rainbow_list[int(rgb_loop)],pause)                
+            rects = self.grid.screen_colour_fill(self.settings.SCREEN, board_1, self.settings.colour_dict, self.settings.rows, self.settings.cols, self.settings.scale, funky, self.settings.rainbow_list[int(rgb_loop)],pause, self.viewport)                
+            self.profiler.stop('render', start)
             
+            start = self.profiler.start()
             if show_menu:
 
                 self.draw_menu_surf_to_screen()
+
+            self.profiler.stop('menu', start)
+
+            if show_profiler:
+
+                #the overlay text changes every frame, so it needs the whole screen pushed
+                self.draw_profiler_surf_to_screen()
+                full_update = True
             
 
                 
                     
                 
             #PUSH UPDATES TO MAIN DISPLAY =================================================================
-            pg.display.update()
+            #only cells that changed since the last frame, unless the whole screen changed (menu toggle)
+            start = self.profiler.start()
+            if full_update:
+                pg.display.update()
+                full_update = False
+                self.profiler.count('rects_drawn')
+
+            elif rects:
+                pg.display.update(rects)
+                self.profiler.count('rects_drawn', len(rects))
+
+            self.profiler.stop('display', start)
+
+            self.settings.clock.tick(self.settings.FPS)
+            self.profiler.end_frame()
 
                 
 
@@ -348,13 +739,45 @@ class RunGame():
 
 class Main():
     
-    def main():
-        
-        s = Settings(800, 600, 10, 13, 60, 0.2)
-        g = Grid()
-        c = ConwayLogic()
+    def main(argv=None):
+
+        parser = argparse.ArgumentParser(description="Conway's Game of Life")
+        parser.add_argument('--record', default=None, help='archive the run to this file')
+        parser.add_argument('--replay', default=None, help='play back a recording instead of running')
+        parser.add_argument('--connect', default=None, metavar='HOST:PORT', help='watch a headless.py --serve run')
+        parser.add_argument('--pattern', default=None, help='start with this RLE/plaintext/Life 1.06 pattern in the middle')
+        parser.add_argument('--speed', type=float, default=None, help='generations per second (default: as fast as possible)')
+        parser.add_argument('--seed', type=int, default=None, help='make the randomised boards reproducible')
+        parser.add_argument('--rule', default=None, help='Life-like rulestring, e.g. B36/S23 (default: B3/S23)')
+        parser.add_argument('--unbounded', action='store_true',
+                            help='view the top left of an infinite plane instead of wrapping at the window edges')
+        args = parser.parse_args(argv)
+        #a recording or a server brings its own board, there is nothing to run unbounded
+        if args.unbounded and (args.replay or args.connect):
+            parser.error('--unbounded does not work with --replay or --connect')
+        if args.rule and (args.replay or args.connect):
+            parser.error('--rule does not work with --replay or --connect, the rule comes from the source')
+
+        replayer = Replayer(args.replay) if args.replay else None
+        stream = None
+        if args.connect:
+            host, port = args.connect.rsplit(':', 1)
+            stream = StreamClient(host, int(port))
+        source = replayer or stream
+        if source is not None:
+            #the board is the recording's (or server's) size, viewed through the window
+            s = Settings(800, 600, 10, 13, 60, 0.2, source.rule.rulestring, gens_per_sec=args.speed,
+                         rows=source.rows, cols=source.cols)
+        else:
+            s = Settings(800, 600, 10, 13, 60, 0.2, args.rule or 'B3/S23', unbounded=args.unbounded, gens_per_sec=args.speed, seed=args.seed)
+
+        g = ArrayGrid()
+        c = NumpyConwayLogic(s.rule) if not s.unbounded else ChunkedUniverse(rule=s.rule)
+        recorder = Recorder(args.record, s.rows, s.cols, s.rule.rulestring) if args.record else None
         
-        r = RunGame(s, g, c)
+        pattern = PatternFile(args.pattern).read() if args.pattern else None
+
+        r = RunGame(s, g, c, recorder, replayer, stream, pattern)
         r.run()
     
 
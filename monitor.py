@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+#Per-generation statistics streamed out of the stepping engines
+#
+#Set an engine's stats attribute to a StatsStream and every get_board_next_gen reports population, births,
+#deaths, changed cells and the bounding box of live cells. The engines that step a band of rows at a time
+#(numpy, bitpacked, parallel) count each band with count_band while it is still in cache, so the board is
+#not read again, and the sparse engine counts only the tiles it stepped. The stream hands each generation's
+#record to its sinks: NDJSON or CSV files written in buffered batches, or a ring buffer the UI reads from.
+
+#Module Imports
+import csv
+import json
+import threading
+import numpy as np
+
+
+FIELDS = ('generation', 'population', 'births', 'deaths', 'changed', 'top', 'left', 'bottom', 'right')
+
+
+
+def get_bounding_box(board):
+    #(top, left, bottom, right) of the live cells, inclusive, None for an empty board
+    live_rows = np.flatnonzero(board.any(axis=1))
+    if not len(live_rows):
+        return None
+
+    live_cols = np.flatnonzero(board[live_rows[0]:live_rows[-1] + 1].any(axis=0))
+
+    return int(live_rows[0]), int(live_cols[0]), int(live_rows[-1]), int(live_cols[-1])
+
+
+def count_band(old, new):
+    #(population, births, deaths, bounding box within the band) of a band of rows stepped from bool old to bool
+    #new, the engines call it on each band they step while the band is still in cache
+    changed = old != new
+    changes = int(np.count_nonzero(changed))
+    births = int(np.count_nonzero(changed & new))
+
+    return int(np.count_nonzero(new)), births, changes - births, get_bounding_box(new)
+
+
+def count_bits(words):
+    #set bits in an array of uint64 words, np.bitwise_count is numpy 2.0 and later, unpacked bytes before that
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(words).sum())
+
+    return int(np.unpackbits(np.ascontiguousarray(words).view(np.uint8)).sum())
+
+
+def count_packed_band(old, new, cols):
+    #count_band for a band of packed uint64 rows (BitPackedConwayLogic), counted on the words
+    population = count_bits(new)
+    changed = old ^ new
+    births = count_bits(changed & new)
+    deaths = count_bits(changed) - births
+
+    bbox = None
+    live_rows = np.flatnonzero(new.any(axis=1))
+    if len(live_rows):
+        #OR the live rows into one row of words, then find its first and last set bits
+        columns = np.bitwise_or.reduce(new[live_rows[0]:live_rows[-1] + 1], axis=0)
+        live_cols = np.flatnonzero(np.unpackbits(columns.astype('<u8').view(np.uint8), bitorder='little')[:cols])
+        bbox = int(live_rows[0]), int(live_cols[0]), int(live_rows[-1]), int(live_cols[-1])
+
+    return population, births, deaths, bbox
+
+
+
+class StatsStream():
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.generation = 0
+
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+
+    def start(self, generation=0):
+        #the next record is generation + 1
+        self.generation = generation
+
+
+    def record(self, old, new):
+        #stats of the step from bool board old to bool board new, as one band
+        return self.record_bands([(0, count_band(old, new))])
+
+
+    def record_packed(self, old, new, cols):
+        #stats of a step between packed uint64 boards (BitPackedConwayLogic), as one band
+        return self.record_bands([(0, count_packed_band(old, new, cols))])
+
+
+    def record_bands(self, bands):
+        #one generation from [(first row, count_band counts)] of every band of rows, in row order
+        population = births = deaths = 0
+        top = left = bottom = right = None
+
+        for start, (band_population, band_births, band_deaths, bbox) in bands:
+            population += band_population
+            births += band_births
+            deaths += band_deaths
+
+            if bbox is not None:
+                band_top, band_left, band_bottom, band_right = bbox
+                top = start + band_top if top is None else top
+                bottom = start + band_bottom
+                left = band_left if left is None else min(left, band_left)
+                right = band_right if right is None else max(right, band_right)
+
+        return self.record_counts(population, births, deaths, None if top is None else (top, left, bottom, right))
+
+
+    def record_counts(self, population, births, deaths, bbox):
+        #for engines that count as they step, bbox is (top, left, bottom, right) or None
+        self.generation += 1
+        top, left, bottom, right = bbox if bbox is not None else (None, None, None, None)
+
+        stats = {
+            'generation': self.generation,
+            'population': population,
+            'births': births,
+            'deaths': deaths,
+            'changed': births + deaths,
+            'top': top,
+            'left': left,
+            'bottom': bottom,
+            'right': right,
+        }
+
+        for sink in self.sinks:
+            sink.write(stats)
+
+        return stats
+
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+
+class NDJSONStatsSink():
+    #one JSON object per generation per line, written in batches of buffer_size
+
+    def __init__(self, path, buffer_size=1024):
+        self.file = open(path, 'w')
+        self.buffer_size = buffer_size
+        self.buffer = []
+
+
+    def write(self, stats):
+        self.buffer.append(json.dumps(stats))
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+
+    def flush(self):
+        if self.buffer:
+            self.file.write('\n'.join(self.buffer) + '\n')
+            self.buffer = []
+
+        self.file.flush()
+
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+
+class CSVStatsSink():
+    #CSV with a header row, empty bounding box fields for an empty board, written in batches of buffer_size
+
+    def __init__(self, path, buffer_size=1024):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(FIELDS)
+        self.buffer_size = buffer_size
+        self.buffer = []
+
+
+    def write(self, stats):
+        self.buffer.append([stats[field] for field in FIELDS])
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+
+    def flush(self):
+        self.writer.writerows(self.buffer)
+        self.buffer = []
+        self.file.flush()
+
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+
+class RingBufferStatsSink():
+    #the last size generations in a structured array, empty bounding box fields are -1
+    #written from the stepping thread and read from the UI, the lock covers both
+
+    def __init__(self, size=1024):
+        self.records = np.zeros(size, dtype=[(field, np.int64) for field in FIELDS])
+        self.count = 0
+        self.lock = threading.Lock()
+
+
+    def write(self, stats):
+        with self.lock:
+            self.records[self.count % len(self.records)] = tuple(-1 if stats[field] is None else stats[field] for field in FIELDS)
+            self.count += 1
+
+
+    def get_recent(self, n=None):
+        #up to the last n records, oldest first
+        with self.lock:
+            n = min(self.count, len(self.records), n or len(self.records))
+            end = self.count % len(self.records)
+
+            return np.roll(self.records, -end)[len(self.records) - n:]
+
+
+    def get_latest(self):
+        #the last record as a dict, None before the first generation
+        recent = self.get_recent(1)
+        if not len(recent):
+            return None
+
+        return {field: int(recent[0][field]) for field in FIELDS}
+
+
+    def close(self):
+        pass
@@ -0,0 +1,519 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+#Pattern files: RLE, plaintext (.cells) and Life 1.06 read and written in chunks, plus stamping and an index
+#
+#Readers never loop over cells in Python. A chunk of the file is decoded with numpy into runs of live cells
+#(row, first col, length), and runs become cell coordinates with one np.repeat. A file can be stamped straight
+#into a board (a bool array or memmap) one chunk at a time, or read whole into a Pattern that can be rotated,
+#reflected and stamped anywhere. Writers take a board a band of rows at a time, so a board bigger than RAM
+#(a memmap) is written without ever being loaded.
+
+#Module Imports
+import os
+import re
+import numpy as np
+
+from core import LifeRule
+
+
+FORMATS = ('rle', 'plaintext', 'life106')
+EXTENSIONS = {'.rle': 'rle', '.cells': 'plaintext', '.txt': 'plaintext', '.lif': 'life106', '.life': 'life106'}
+
+#RLE lines are at most 70 characters
+RLE_LINE = 70
+CHUNK_BYTES = 1 << 24
+WHITESPACE = np.frombuffer(b' \t\r\n', dtype=np.uint8)
+POWERS = 10 ** np.arange(19, dtype=np.int64)
+
+
+
+def encode_tokens(counts, tags):
+    #uint8 text of RLE tokens ('3o', 'b', '12$'), the count left out when it is 1, and where each token ends
+    digits = np.where(counts > 1, np.searchsorted(POWERS, counts, 'right'), 0)
+    ends = np.cumsum(digits + 1)
+    starts = ends - digits - 1
+
+    text = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+    text[ends - 1] = tags
+
+    for d in range(int(digits.max(initial=0))):
+        numbered = digits > d
+        text[starts[numbered] + d] = counts[numbered] // POWERS[digits[numbered] - 1 - d] % 10 + ord('0')
+
+    return text, ends
+
+
+def runs_to_cells(rows, starts, lengths):
+    #(rows, cols) of every cell in runs of live cells
+    total = int(lengths.sum())
+    first = np.cumsum(lengths) - lengths
+
+    return np.repeat(rows, lengths), np.repeat(starts - first, lengths) + np.arange(total)
+
+
+def get_format(path):
+    #by extension, or by the first line for anything else
+    extension = os.path.splitext(path)[1].lower()
+    if extension in EXTENSIONS:
+        return EXTENSIONS[extension]
+
+    with open(path, 'rb') as f:
+        first = f.readline()
+
+    if first.startswith(b'#Life 1.06'):
+        return 'life106'
+    if first.startswith(b'#') or first.lstrip().startswith(b'x'):
+        return 'rle'
+
+    return 'plaintext'
+
+
+
+class PatternFile():
+    #A pattern file opened for reading: the header is parsed straight away, the cells read in chunks on demand
+    #height and width come from the RLE header, for the other formats they are only known once read
+
+    def __init__(self, path, format=None):
+        self.path = path
+        self.format = format or get_format(path)
+        if self.format not in FORMATS:
+            raise ValueError(f'unknown pattern format {self.format!r}, expected one of {FORMATS}')
+
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.rule = None
+        self.comments = []
+        self.height = self.width = None
+        self.body_offset = 0
+
+        self.read_header()
+
+
+    def read_header(self):
+        with open(self.path, 'rb') as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+
+                text = line.decode('utf-8', 'replace').strip()
+
+                if self.format == 'rle' and text.startswith('#'):
+                    self.read_comment(text[1:2], text[2:].strip())
+                elif self.format == 'rle' and text.startswith('x'):
+                    #x = 3, y = 3, rule = B3/S23
+                    fields = dict(re.findall(r'(\w+)\s*=\s*([^,\s]+)', text))
+                    self.width, self.height = int(fields['x']), int(fields['y'])
+                    if 'rule' in fields:
+                        self.rule = LifeRule(fields['rule']).rulestring
+                    self.body_offset = f.tell()
+                    return
+                elif self.format == 'plaintext' and text.startswith('!Name:'):
+                    self.read_comment('N', text[6:].strip())
+                elif self.format == 'plaintext' and text.startswith('!'):
+                    self.read_comment('C', text[1:].strip())
+                elif self.format == 'life106' and text.startswith('#'):
+                    #only the description lines, #N there means the normal rules rather than a name
+                    if text[1:2] == 'D':
+                        self.read_comment('D', text[2:].strip())
+                elif not text and self.format != 'plaintext':
+                    continue
+                else:
+                    self.body_offset = offset
+                    return
+
+        if self.format == 'rle':
+            raise ValueError(f'{self.path}: no RLE header line')
+
+        self.body_offset = os.path.getsize(self.path)
+
+
+    def read_comment(self, kind, text):
+        if kind == 'N':
+            self.name = text
+        elif kind == 'r':
+            self.rule = LifeRule(text).rulestring
+        elif kind in ('C', 'c', 'D', 'O'):
+            self.comments.append(text)
+
+
+    def get_chunks(self, chunk_bytes, cut):
+        #body in chunks of about chunk_bytes, each cut at cut(data) (0: read on), the rest carried to the next
+        with open(self.path, 'rb') as f:
+            f.seek(self.body_offset)
+            carry = b''
+
+            while True:
+                data = f.read(chunk_bytes)
+                if not data:
+                    if carry:
+                        yield carry
+                    return
+
+                data = carry + data
+                end = cut(data)
+                if end == 0:
+                    carry = data
+                    continue
+
+                carry = data[end:]
+                yield data[:end]
+
+
+    def get_runs(self, chunk_bytes=CHUNK_BYTES):
+        #(rows, starts, lengths) int64 arrays of live runs, one batch per chunk, rows increase between batches
+        if self.format == 'rle':
+            return self.get_rle_runs(chunk_bytes)
+        if self.format == 'plaintext':
+            return self.get_plaintext_runs(chunk_bytes)
+
+        return self.get_life106_runs(chunk_bytes)
+
+
+    def get_rle_runs(self, chunk_bytes):
+        row = col = 0
+
+        #chunks end after a tag, so a run count is never split from its tag
+        for chunk in self.get_chunks(chunk_bytes, lambda data: len(data.rstrip(b'0123456789 \t\r\n'))):
+            data = np.frombuffer(chunk, dtype=np.uint8)
+            data = data[~np.isin(data, WHITESPACE)]
+
+            stop = np.flatnonzero(data == ord('!'))
+            if len(stop):
+                data = data[:stop[0]]
+
+            digit = (data >= ord('0')) & (data <= ord('9'))
+            tag_index = np.flatnonzero(~digit)
+            tags = data[tag_index]
+            if not len(tags):
+                continue
+
+            #a tag's count is the number written before it, 1 when there is none
+            digit_index = np.flatnonzero(digit)
+            owner = np.searchsorted(tag_index, digit_index)
+            values = (data[digit_index] - ord('0')) * 10.0 ** (tag_index[owner] - digit_index - 1)
+            counts = np.bincount(owner, values, len(tags))
+            counts = np.where(np.bincount(owner, minlength=len(tags)) > 0, np.rint(counts), 1).astype(np.int64)
+
+            newline = tags == ord('$')
+            advance = np.where(newline, 0, counts)
+            live = ~newline & (tags != ord('b')) & (tags != ord('.'))
+
+            #row and column before each tag: rows move on at '$', which also sends the column back to 0
+            rows = row + np.cumsum(np.where(newline, counts, 0)) - np.where(newline, counts, 0)
+            cols = np.cumsum(advance) - advance
+            last_newline = np.maximum.accumulate(np.where(newline, np.arange(len(tags)), -1))
+            before = np.concatenate([[-1], last_newline[:-1]])
+            cols = np.where(before >= 0, cols - cols[np.maximum(before, 0)], cols + col)
+
+            yield rows[live], cols[live], counts[live]
+
+            row = int(rows[-1] + (counts[-1] if newline[-1] else 0))
+            col = 0 if newline[-1] else int(cols[-1] + advance[-1])
+
+            if len(stop):
+                return
+
+
+    def get_plaintext_runs(self, chunk_bytes):
+        row = 0
+        width = 0
+
+        for chunk in self.get_chunks(chunk_bytes, lambda data: data.rfind(b'\n') + 1):
+            data = np.frombuffer(chunk, dtype=np.uint8)
+            if data[-1] != ord('\n'):
+                data = np.append(data, np.uint8(ord('\n')))
+
+            #lines, and the row of each (comment lines have none)
+            ends = np.flatnonzero(data == ord('\n'))
+            starts = np.concatenate([[0], ends[:-1] + 1])
+            comment = data[starts] == ord('!')
+            line_rows = row + np.cumsum(~comment) - 1
+
+            #runs of live cells as they are in the text, then placed by line
+            live = np.zeros(len(data) + 1, dtype=np.int8)
+            live[1:] = (data == ord('O')) | (data == ord('*'))
+            edges = np.diff(live)
+            run_starts, run_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+            line = np.searchsorted(ends, run_starts)
+            keep = ~comment[line]
+
+            line_lengths = ends - starts - (data[np.maximum(ends - 1, 0)] == ord('\r'))
+            width = max(width, int(line_lengths[~comment].max(initial=0)))
+            yield line_rows[line[keep]], run_starts[keep] - starts[line[keep]], (run_ends - run_starts)[keep]
+
+            row += int(np.count_nonzero(~comment))
+
+        self.height, self.width = row, width
+
+
+    def get_life106_runs(self, chunk_bytes):
+        for chunk in self.get_chunks(chunk_bytes, lambda data: data.rfind(b'\n') + 1):
+            if b'#' in chunk:
+                chunk = b'\n'.join(line for line in chunk.split(b'\n') if not line.startswith(b'#'))
+
+            #x y per line, x is the column
+            xy = np.array(chunk.split(), dtype=np.int64).reshape(-1, 2)
+            yield xy[:, 1], xy[:, 0], np.ones(len(xy), dtype=np.int64)
+
+
+    def get_cells(self, chunk_bytes=CHUNK_BYTES):
+        #(rows, cols) of the live cells, one batch per chunk
+        for rows, starts, lengths in self.get_runs(chunk_bytes):
+            yield runs_to_cells(rows, starts, lengths)
+
+
+    def read(self, chunk_bytes=CHUNK_BYTES):
+        #the whole pattern as a Pattern, moved so its bounding box starts at (0, 0) for Life 1.06
+        batches = list(self.get_cells(chunk_bytes))
+        rows = np.concatenate([batch[0] for batch in batches] or [np.zeros(0, dtype=np.int64)])
+        cols = np.concatenate([batch[1] for batch in batches] or [np.zeros(0, dtype=np.int64)])
+        height, width = self.height, self.width
+
+        if self.format == 'life106':
+            top, left = (int(rows.min()), int(cols.min())) if len(rows) else (0, 0)
+            rows, cols = rows - top, cols - left
+            height, width = (int(rows.max()) + 1, int(cols.max()) + 1) if len(rows) else (0, 0)
+
+        return Pattern(rows, cols, height, width, self.name, self.rule, self.comments)
+
+
+    def stamp(self, board, top=0, left=0, wrap=True, chunk_bytes=CHUNK_BYTES):
+        #set the pattern's live cells in board chunk by chunk without reading it all in, returns the count set
+        #Life 1.06 coordinates are relative to (top, left), they are not moved to start at 0
+        count = 0
+
+        for rows, cols in self.get_cells(chunk_bytes):
+            count += set_cells(board, rows + top, cols + left, wrap)
+
+        return count
+
+
+
+def set_cells(board, rows, cols, wrap=True, state=True):
+    #set cells of a bool board in one indexed assignment, wrapped onto the torus or clipped at the edges
+    height, width = board.shape
+
+    if wrap:
+        rows, cols = rows % height, cols % width
+    else:
+        inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        rows, cols = rows[inside], cols[inside]
+
+    board[rows, cols] = state
+
+    return len(rows)
+
+
+
+class Pattern():
+    #Live cells of a height x width pattern as row and column arrays
+
+    def __init__(self, rows, cols, height, width, name=None, rule=None, comments=()):
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.height = height
+        self.width = width
+        self.name = name
+        self.rule = rule
+        self.comments = list(comments)
+
+
+    def get_population(self):
+        return len(self.rows)
+
+
+    def to_array(self):
+        board = np.zeros((self.height, self.width), dtype=bool)
+        board[self.rows, self.cols] = True
+
+        return board
+
+
+    def transform(self, rotate=0, flip=False):
+        #new Pattern, mirrored left to right when flip, then turned rotate quarter turns clockwise
+        rows, cols, height, width = self.rows, self.cols, self.height, self.width
+
+        if flip:
+            cols = width - 1 - cols
+
+        for turn in range(rotate % 4):
+            rows, cols, height, width = cols, height - 1 - rows, width, height
+
+        return Pattern(rows, cols, height, width, self.name, self.rule, self.comments)
+
+
+    def stamp(self, board, top=0, left=0, rotate=0, flip=False, wrap=True, clear=False):
+        #set the pattern's live cells in board with its top left corner at (top, left), returns the count set
+        #clear: kill every cell under the pattern's bounding box first, so the box ends up exactly the pattern
+        pattern = self.transform(rotate, flip) if rotate % 4 or flip else self
+
+        if clear:
+            box_rows, box_cols = top + np.arange(pattern.height), left + np.arange(pattern.width)
+            if wrap:
+                board[np.ix_(box_rows % board.shape[0], box_cols % board.shape[1])] = False
+            else:
+                board[max(top, 0):max(top + pattern.height, 0), max(left, 0):max(left + pattern.width, 0)] = False
+
+        return set_cells(board, pattern.rows + top, pattern.cols + left, wrap)
+
+
+
+class PatternLibrary():
+    #Index of pattern files by name (#N / !Name:, else the file name), built from headers only
+    #Patterns are read the first time they are asked for and kept
+
+    def __init__(self, paths=()):
+        self.index = {}
+        self.patterns = {}
+
+        for path in paths:
+            self.add(path)
+
+
+    def add(self, path):
+        #a pattern file, or every pattern file under a directory, returns the names added
+        if os.path.isdir(path):
+            names = []
+            for folder, dirs, files in os.walk(path):
+                for file in sorted(files):
+                    if os.path.splitext(file)[1].lower() in EXTENSIONS:
+                        names += self.add(os.path.join(folder, file))
+            return names
+
+        pattern_file = PatternFile(path)
+        self.index[pattern_file.name] = {
+            'path': path,
+            'format': pattern_file.format,
+            'height': pattern_file.height,
+            'width': pattern_file.width,
+            'rule': pattern_file.rule,
+        }
+        self.patterns.pop(pattern_file.name, None)
+
+        return [pattern_file.name]
+
+
+    def find(self, text):
+        #names containing text, any case
+        return sorted(name for name in self.index if text.lower() in name.lower())
+
+
+    def get(self, name):
+        if name not in self.patterns:
+            entry = self.index[name]
+            self.patterns[name] = PatternFile(entry['path'], entry['format']).read()
+
+        return self.patterns[name]
+
+
+
+class PatternWriter():
+    #Writes a rows x cols board a band of rows at a time (write_rows), close() finishes the file
+
+    def __init__(self, path, rows, cols, format='rle', name=None, rule='B3/S23', comments=()):
+        if format not in FORMATS:
+            raise ValueError(f'unknown pattern format {format!r}, expected one of {FORMATS}')
+
+        self.rows = rows
+        self.cols = cols
+        self.format = format
+        self.file = open(path, 'wb')
+        #next board row to be written
+        self.row = 0
+
+        if format == 'rle':
+            header = [f'#N {name}'] if name else []
+            header += [f'#C {comment}' for comment in comments]
+            header.append(f'x = {cols}, y = {rows}, rule = {LifeRule(rule).rulestring}')
+            #the row the RLE has got to, and the end of the last line that is not full yet
+            self.rle_row = 0
+            self.pending = b''
+
+        elif format == 'plaintext':
+            header = [f'!Name: {name}'] if name else []
+            header += [f'! {comment}' for comment in comments]
+
+        else:
+            header = ['#Life 1.06']
+
+        self.file.write(''.join(line + '\n' for line in header).encode())
+
+
+    def write_rows(self, board):
+        #the next len(board) rows, a bool array (or memmap band) of width cols
+        board = np.asarray(board, dtype=bool)
+
+        if self.format == 'rle':
+            self.write_rle_rows(board)
+        elif self.format == 'plaintext':
+            text = np.full((len(board), self.cols + 1), ord('\n'), dtype=np.uint8)
+            text[:, :-1] = np.where(board, ord('O'), ord('.'))
+            self.file.write(text.tobytes())
+        else:
+            rows, cols = np.nonzero(board)
+            np.savetxt(self.file, np.column_stack([cols, rows + self.row]), fmt='%d')
+
+        self.row += len(board)
+
+
+    def write_rle_rows(self, board):
+        edges = np.diff(np.pad(board.view(np.int8), ((0, 0), (1, 1))), axis=1)
+        rows, starts = np.nonzero(edges == 1)
+        ends = np.nonzero(edges == -1)[1]
+        if not len(rows):
+            return
+
+        #before each live run: '$'s to reach its row, then the dead cells since the last run on that row
+        rows = rows + self.row
+        newlines = np.diff(rows, prepend=self.rle_row)
+        gaps = np.where(newlines > 0, starts, starts - np.concatenate([[0], ends[:-1]]))
+
+        counts = np.column_stack([newlines, gaps, ends - starts]).ravel()
+        tags = np.tile(np.array([ord('$'), ord('b'), ord('o')], dtype=np.uint8), len(rows))
+        self.write_tokens(*encode_tokens(counts[counts > 0], tags[counts > 0]))
+        self.rle_row = int(rows[-1])
+
+
+    def write_tokens(self, text, ends):
+        #whole lines of at most RLE_LINE characters, never splitting a token, the rest is kept for later
+        text = np.concatenate([np.frombuffer(self.pending, dtype=np.uint8), text])
+        #the unfinished line can end a line on its own
+        ends = np.concatenate([[len(self.pending)], len(self.pending) + ends])
+        start = 0
+        breaks = []
+
+        while True:
+            end = np.searchsorted(ends, start + RLE_LINE, 'right')
+            if end == len(ends):
+                break
+
+            stop = int(ends[end - 1]) if ends[end - 1] > start else int(ends[end])
+            breaks.append(stop)
+            start = stop
+
+        self.file.write(np.insert(text[:start], breaks, ord('\n')).tobytes())
+        self.pending = text[start:].tobytes()
+
+
+    def write(self, board, chunk_rows=1024):
+        #a whole board (which may be a memmap) in bands of chunk_rows rows, then close
+        for start in range(0, len(board), chunk_rows):
+            self.write_rows(board[start:start + chunk_rows])
+
+        self.close()
+
+
+    def close(self):
+        if self.file is None:
+            return
+
+        if self.format == 'rle':
+            end = self.pending + b'!'
+            self.file.write(end + b'\n' if len(end) <= RLE_LINE else self.pending + b'\n!\n')
+
+        self.file.close()
+        self.file = None
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+#Recording and replay of runs: periodic keyframes plus compressed deltas, with an index for seeking
+#
+#File layout (little endian):
+#  b'LIFEREC1', uint32 header length, JSON header (rows, cols, rule, keyframe_interval)
+#  frames: uint8 kind, int64 generation, uint32 payload length, zlib payload
+#    K keyframe: packed bits of the board
+#    X delta: packed bits of the board XOR the previous frame
+#    I delta: uint32 flat indexes of the cells that changed (smaller than X when few cells change)
+#  on close: the keyframe index (int64 generation, int64 offset pairs), then int64 index offset, b'LIFEIDX1'
+#A file without the trailing index (crashed run) is still readable, the frames are scanned instead
+
+#Module Imports
+import bisect
+import json
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+
+from core import ArrayBoard, LifeRule, SimulationThread
+
+
+MAGIC = b'LIFEREC1'
+INDEX_MAGIC = b'LIFEIDX1'
+FRAME = struct.Struct('<cqI')
+
+
+
+def encode_frame(generation, board, previous=None, level=1):
+    #board as one frame (header and payload): a keyframe without previous, otherwise the smaller delta
+    if previous is None:
+        kind, payload = b'K', np.packbits(board).tobytes()
+
+    else:
+        changed = board != previous
+        count = int(np.count_nonzero(changed))
+
+        #4 bytes per changed cell against 1 bit per cell
+        if count * 32 < board.size:
+            kind, payload = b'I', np.flatnonzero(changed).astype('<u4').tobytes()
+        else:
+            kind, payload = b'X', np.packbits(changed).tobytes()
+
+    payload = zlib.compress(payload, level)
+
+    return FRAME.pack(kind, generation, len(payload)) + payload
+
+
+def decode_frame(kind, payload, rows, cols, board=None):
+    #board after a frame: a keyframe makes a new board, deltas are applied to board in place
+    data = np.frombuffer(zlib.decompress(payload), dtype=np.uint8)
+    size = rows * cols
+
+    if kind == b'K':
+        return np.unpackbits(data, count=size).reshape(rows, cols).astype(bool)
+
+    if kind == b'X':
+        board ^= np.unpackbits(data, count=size).reshape(rows, cols).astype(bool)
+    else:
+        board.reshape(-1)[data.view('<u4')] ^= True
+
+    return board
+
+
+
+class Recorder():
+    #Streams generations to a file as they are stepped, pass it to SimulationThread/HeadlessGame as recorder
+
+    def __init__(self, path, rows, cols, rule='B3/S23', keyframe_interval=100, level=1):
+        self.rows = rows
+        self.cols = cols
+        #frames between keyframes: longer is smaller, shorter seeks faster
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+
+        self.file = open(path, 'wb')
+        header = json.dumps({'rows': rows, 'cols': cols, 'rule': LifeRule(rule).rulestring,
+                             'keyframe_interval': keyframe_interval}).encode()
+        self.file.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+        self.index = []
+        self.previous = None
+        self.since_keyframe = 0
+        self.last_generation = None
+        #the simulation thread writes, anything else may close
+        self.lock = threading.Lock()
+
+
+    def write(self, generation, board):
+        #record board as generation, generations must increase
+        board = np.asarray(board[:self.rows, :self.cols], dtype=bool)
+
+        with self.lock:
+            if self.file is None:
+                return
+
+            if self.last_generation is not None and generation <= self.last_generation:
+                raise ValueError(f'generation {generation} recorded after {self.last_generation}')
+
+            if self.previous is None or self.since_keyframe >= self.keyframe_interval:
+                self.index.append((generation, self.file.tell()))
+                self.file.write(encode_frame(generation, board, level=self.level))
+                self.since_keyframe = 0
+                #a crash loses at most the frames since the last keyframe
+                self.file.flush()
+
+            else:
+                self.file.write(encode_frame(generation, board, self.previous, self.level))
+
+            self.previous = board.copy()
+            self.since_keyframe += 1
+            self.last_generation = generation
+
+
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+
+            index_offset = self.file.tell()
+            self.file.write(np.array(self.index, dtype='<i8').reshape(-1, 2).tobytes())
+            self.file.write(struct.pack('<q', index_offset) + INDEX_MAGIC)
+            self.file.close()
+            self.file = None
+
+
+
+class Replayer():
+    #Random access to a recording: seek to the nearest keyframe at or before a generation, then apply deltas
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a recording')
+
+        length = struct.unpack('<I', self.file.read(4))[0]
+        header = json.loads(self.file.read(length))
+        self.rows, self.cols = header['rows'], header['cols']
+        self.rule = LifeRule(header['rule'])
+        self.keyframe_interval = header['keyframe_interval']
+        self.frames_offset = self.file.tell()
+
+        self.index, self.last_generation = self.read_index()
+        self.index_generations = [generation for generation, offset in self.index]
+
+        #decoded position: the board at self.generation, the next frame starts at self.offset
+        self.generation = None
+        self.board = None
+        self.offset = None
+
+
+    def read_index(self):
+        #(keyframe index, last generation) from the trailer, or by scanning a file that was never closed
+        self.file.seek(0, 2)
+        end = self.file.tell()
+
+        if end >= self.frames_offset + 16:
+            self.file.seek(end - 16)
+            index_offset, magic = struct.unpack('<q8s', self.file.read(16))
+
+            if magic == INDEX_MAGIC:
+                self.file.seek(index_offset)
+                index = np.frombuffer(self.file.read(end - 16 - index_offset), dtype='<i8').reshape(-1, 2)
+                self.frames_end = index_offset
+
+                #the last generation is in the last frame after the last keyframe
+                last = None
+                for kind, generation, offset, payload in self.read_frames(int(index[-1, 1]) if len(index) else end):
+                    last = generation
+
+                return [tuple(int(n) for n in entry) for entry in index], last
+
+        self.frames_end = end
+        index = []
+        last = None
+
+        for kind, generation, offset, payload in self.read_frames(self.frames_offset):
+            if kind == b'K':
+                index.append((generation, offset))
+            last = generation
+
+        return index, last
+
+
+    def read_frames(self, offset):
+        #(kind, generation, offset, compressed payload) from offset to the end of the frames
+        self.file.seek(offset)
+
+        while offset + FRAME.size <= self.frames_end:
+            kind, generation, length = FRAME.unpack(self.file.read(FRAME.size))
+            payload = self.file.read(length)
+
+            #a frame cut short by a crash ends the recording
+            if len(payload) < length:
+                return
+
+            yield kind, generation, offset, payload
+            offset += FRAME.size + length
+
+
+    def apply_frame(self, kind, payload):
+        self.board = decode_frame(kind, payload, self.rows, self.cols, self.board)
+
+
+    def get_board(self, generation):
+        #board at generation (the last recorded generation at or before it), a fresh array each call
+
+        if self.last_generation is None or generation < self.index_generations[0]:
+            raise ValueError(f'generation {generation} is not in the recording')
+
+        keyframe = bisect.bisect_right(self.index_generations, generation) - 1
+        keyframe_generation, keyframe_offset = self.index[keyframe]
+
+        #carry on from the decoded position when it is on the way, otherwise start at the keyframe
+        if self.generation is None or not keyframe_generation <= self.generation <= generation:
+            self.generation, self.offset = None, keyframe_offset
+
+        for kind, frame_generation, offset, payload in self.read_frames(self.offset):
+            if frame_generation > generation:
+                break
+
+            self.apply_frame(kind, payload)
+            self.generation = frame_generation
+            self.offset = offset + FRAME.size + len(payload)
+
+        return self.board.copy()
+
+
+    def close(self):
+        self.file.close()
+
+
+
+class ReplayThread(SimulationThread):
+    #Plays a recording through the SimulationThread snapshot interface, so RunGame can show it instead of a live run
+    #gens_per_sec sets the playback speed (None plays as fast as frames decode), edits are ignored
+
+    def __init__(self, replayer, gens_per_sec=None, profiler=None):
+        self.replayer = replayer
+        board = replayer.get_board(replayer.index_generations[0])
+
+        super().__init__(ArrayBoard(), None, replayer.rows, replayer.cols, 1, board, None, gens_per_sec, profiler)
+        self.generation = replayer.index_generations[0]
+
+
+    def queue_edit(self, r, c, state):
+        pass
+
+
+    def queue_cells(self, rows, cols, state):
+        pass
+
+
+    def set_board(self, board):
+        pass
+
+
+    def set_stats(self, stats):
+        pass
+
+
+    def seek(self, generation):
+        #jump to generation (clamped to the recording), shown straight away even while paused
+        self.edits.put(('seek', max(self.replayer.index_generations[0], min(generation, self.replayer.last_generation))))
+
+
+    def apply_edits(self):
+        edited = False
+
+        while not self.edits.empty():
+            self.generation = self.edits.get_nowait()[1]
+            self.board1 = self.replayer.get_board(self.generation)
+            edited = True
+
+        return edited
+
+
+    def loop(self):
+        next_step = time.perf_counter()
+
+        while self.running:
+
+            if self.apply_edits():
+                self.publish()
+
+            if self.paused or self.generation >= self.replayer.last_generation:
+                time.sleep(0.005)
+                next_step = time.perf_counter()
+                continue
+
+            start = self.profiler.start()
+            self.generation += 1
+            self.board1 = self.replayer.get_board(self.generation)
+            self.profiler.stop('step', start)
+            self.profiler.count('generations')
+            self.publish()
+
+            if self.gens_per_sec:
+                next_step += 1 / self.gens_per_sec
+                delay = next_step - time.perf_counter()
+
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_step = time.perf_counter()
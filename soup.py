@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+#Seeded random soups, generated vectorised and in chunks
+#
+#The uniform draws come from fixed TILE x TILE tiles, each with its own generator keyed by (seed, tile row,
+#tile col). Any chunk of a board is made from the tiles it overlaps, so a board comes out bit for bit the
+#same for a seed however it is split into chunks or spread across workers.
+
+#Module Imports
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+TILE = 256
+SYMMETRIES = (None, 'horizontal', 'vertical', 'both', 'rotate')
+
+
+
+class Soup():
+    #prob: live cell density, or with prob_end a density changing linearly from prob to prob_end along axis
+    #symmetry: 'horizontal' mirrors left/right, 'vertical' top/bottom, 'both' does both, 'rotate' is 180 degrees
+    #region: (top, left, height, width), cells outside it stay dead
+
+    def __init__(self, rows, cols, seed=None, prob=0.2, prob_end=None, axis=0, symmetry=None, region=None):
+        if symmetry not in SYMMETRIES:
+            raise ValueError(f'unknown symmetry {symmetry!r}, expected one of {SYMMETRIES}')
+
+        self.rows = rows
+        self.cols = cols
+        #an int or a list of ints, None picks a fresh one that is kept so the soup can be made again
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.prob = prob
+        self.prob_end = prob_end
+        self.axis = axis
+        self.symmetry = symmetry
+        self.region = region
+
+
+    def get_tile(self, tr, tc):
+        entropy = list(self.seed) if isinstance(self.seed, (list, tuple)) else self.seed
+        sequence = np.random.SeedSequence(entropy, spawn_key=(tr, tc))
+
+        return np.random.Generator(np.random.PCG64(sequence)).random((TILE, TILE), dtype=np.float32)
+
+
+    def get_uniforms(self, top, bottom, left, right):
+        #uniform draws for board rows top:bottom, cols left:right
+        out = np.empty((bottom - top, right - left), dtype=np.float32)
+
+        for tr in range(top // TILE, -(-bottom // TILE)):
+            for tc in range(left // TILE, -(-right // TILE)):
+                tile = self.get_tile(tr, tc)
+                r0, r1 = max(top, tr * TILE), min(bottom, (tr + 1) * TILE)
+                c0, c1 = max(left, tc * TILE), min(right, (tc + 1) * TILE)
+                out[r0 - top:r1 - top, c0 - left:c1 - left] = tile[r0 - tr*TILE:r1 - tr*TILE, c0 - tc*TILE:c1 - tc*TILE]
+
+        return out
+
+
+    def get_canonical(self, rows, cols):
+        #(row, col) index grids of the cell each cell copies under the symmetry
+        rows, cols = np.broadcast_arrays(rows[:, None], cols[None, :])
+        mirror_rows, mirror_cols = self.rows - 1 - rows, self.cols - 1 - cols
+
+        if self.symmetry in ('vertical', 'both'):
+            rows = np.minimum(rows, mirror_rows)
+        if self.symmetry in ('horizontal', 'both'):
+            cols = np.minimum(cols, mirror_cols)
+
+        if self.symmetry == 'rotate':
+            #the bottom half copies the top half turned round, the middle row (odd rows) copies itself reversed
+            flip = (mirror_rows < rows) | ((mirror_rows == rows) & (mirror_cols < cols))
+            rows = np.where(flip, mirror_rows, rows)
+            cols = np.where(flip, mirror_cols, cols)
+
+        return rows, cols
+
+
+    def get_probs(self, rows, cols):
+        #density per cell from broadcastable row/col index grids
+        if self.prob_end is None:
+            return np.float32(self.prob)
+
+        length = self.rows if self.axis == 0 else self.cols
+        position = (rows if self.axis == 0 else cols) / max(length - 1, 1)
+
+        return (self.prob + (self.prob_end - self.prob) * position).astype(np.float32)
+
+
+    def get_rows(self, start, stop, left=0, right=None):
+        #bool board chunk of rows start:stop, cols left:right
+        right = self.cols if right is None else right
+        rows, cols = np.arange(start, stop), np.arange(left, right)
+
+        if self.symmetry is None:
+            uniforms = self.get_uniforms(start, stop, left, right)
+            chunk = uniforms < self.get_probs(rows[:, None], cols[None, :])
+
+        else:
+            canonical_rows, canonical_cols = self.get_canonical(rows, cols)
+            top, bottom = int(canonical_rows.min()), int(canonical_rows.max()) + 1
+            first, last = int(canonical_cols.min()), int(canonical_cols.max()) + 1
+            uniforms = self.get_uniforms(top, bottom, first, last)[canonical_rows - top, canonical_cols - first]
+
+            #the density is taken where the draw came from, so symmetric gradients stay symmetric
+            chunk = uniforms < self.get_probs(canonical_rows, canonical_cols)
+
+        if self.region is not None:
+            top, left, height, width = self.region
+            chunk &= ((rows >= top) & (rows < top + height))[:, None]
+            chunk &= ((cols >= left) & (cols < left + width))[None, :]
+
+        return chunk
+
+
+    def fill(self, board, chunk_rows=1024, workers=1):
+        #write the soup into board (a bool array, memmap or view) chunk_rows rows at a time
+        chunks = [(start, min(start + chunk_rows, self.rows)) for start in range(0, self.rows, chunk_rows)]
+
+        def fill_chunk(chunk):
+            board[chunk[0]:chunk[1], :self.cols] = self.get_rows(*chunk)
+
+        if workers > 1:
+            with ThreadPoolExecutor(workers) as pool:
+                list(pool.map(fill_chunk, chunks))
+        else:
+            for chunk in chunks:
+                fill_chunk(chunk)
+
+        return board
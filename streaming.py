@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+#One simulation, many viewers: an asyncio server steps a board once and streams it to every connected client
+#
+#The stream uses the recording frame format (recording.encode_frame). A connection gets b'LIFESTR1', a
+#uint32 header length and a JSON header (rows, cols, rule, keyframe_interval), then one frame per generation:
+#a keyframe when it connects and every keyframe_interval generations, deltas in between. Each client has a
+#bounded queue of frames waiting to be sent. A client too slow to keep up fills its queue, which is then
+#emptied, and the client gets a keyframe of the latest generation next instead of the deltas it missed.
+
+#Module Imports
+import asyncio
+import json
+import socket
+import struct
+import time
+import numpy as np
+
+from core import ArrayBoard, LifeRule, SimulationThread
+from recording import FRAME, encode_frame, decode_frame
+
+
+MAGIC = b'LIFESTR1'
+
+
+
+class Subscriber():
+    #one connected client: frames waiting to be sent, and whether its next frame has to be a keyframe
+
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        self.needs_keyframe = True
+        self.sent = 0
+        self.skipped = 0
+
+
+    def offer(self, frame):
+        #queue a frame without waiting, a full queue is dropped and the client resynced with a keyframe
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.skipped += 1
+
+            self.skipped += 1
+            self.needs_keyframe = True
+
+
+    def hang_up(self, keyframe):
+        #None ends the sender after the frames already queued, a client that is behind gets keyframe (the
+        #last generation) in place of its queue, so every client finishes on the same board
+        if self.needs_keyframe or (self.queue.maxsize and self.queue.qsize() + 2 > self.queue.maxsize):
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.skipped += 1
+
+            self.queue.put_nowait(keyframe)
+
+        self.queue.put_nowait(None)
+
+
+
+class FrameServer():
+    #Steps board with conway (any engine with the get_board_next_gen contract) and streams every generation
+    #gens_per_sec: None steps as fast as the engine goes, slow clients just see fewer generations
+    #queue_size: frames a client may fall behind by before it is skipped to a keyframe, at least 2
+
+    def __init__(self, conway, rows, cols, board, rule='B3/S23', keyframe_interval=100, queue_size=64,
+                 gens_per_sec=None, level=1):
+        self.conway = conway
+        self.rows = rows
+        self.cols = cols
+        self.rule = LifeRule(rule).rulestring
+        self.keyframe_interval = keyframe_interval
+        self.queue_size = queue_size
+        self.gens_per_sec = gens_per_sec
+        self.level = level
+
+        self.board1, self.board2 = conway.create_boards(board)
+        #the last generation sent, deltas are taken against it
+        self.generation = 0
+        self.previous = np.array(board, dtype=bool)
+
+        self.subscribers = []
+        self.clients_served = 0
+        self.frames_skipped = 0
+        self.server = None
+        self.port = None
+        #set once the first wait_for_clients clients are connected
+        self.clients_ready = None
+        self.wait_for_clients = 0
+
+
+    def get_header(self):
+        header = json.dumps({'rows': self.rows, 'cols': self.cols, 'rule': self.rule,
+                             'keyframe_interval': self.keyframe_interval}).encode()
+
+        return MAGIC + struct.pack('<I', len(header)) + header
+
+
+    async def handle_client(self, reader, writer):
+        subscriber = Subscriber(writer, self.queue_size)
+        writer.write(self.get_header())
+        #the current generation straight away, so a viewer of a slow run is not left with a blank board
+        writer.write(encode_frame(self.generation, self.previous, level=self.level))
+        subscriber.needs_keyframe = False
+        self.subscribers.append(subscriber)
+        self.clients_served += 1
+
+        if len(self.subscribers) >= self.wait_for_clients:
+            self.clients_ready.set()
+
+        try:
+            await writer.drain()
+
+            while True:
+                frame = await subscriber.queue.get()
+                if frame is None:
+                    break
+
+                writer.write(frame)
+                await writer.drain()
+                subscriber.sent += 1
+
+        except (ConnectionError, OSError):
+            pass
+
+        finally:
+            self.subscribers.remove(subscriber)
+            self.frames_skipped += subscriber.skipped
+            writer.close()
+
+
+    def step(self, keyframe):
+        #runs in an executor thread: next generation, its delta frame and a keyframe if one is wanted
+        self.board1, self.board2 = self.conway.get_board_next_gen(self.rows, self.cols, 1, self.board1, self.board2)
+        board = np.array(self.conway.to_bool_array(self.rows, self.cols, self.board1), dtype=bool)
+        generation = self.generation + 1
+
+        delta = encode_frame(generation, board, self.previous, self.level)
+        key = encode_frame(generation, board, level=self.level) if keyframe else None
+
+        return board, delta, key
+
+
+    def broadcast(self, delta, key):
+        periodic = self.generation % self.keyframe_interval == 0
+
+        for subscriber in self.subscribers:
+            if key is not None and (periodic or subscriber.needs_keyframe):
+                subscriber.needs_keyframe = False
+                subscriber.offer(key)
+            elif not subscriber.needs_keyframe:
+                subscriber.offer(delta)
+
+
+    async def start(self, host='127.0.0.1', port=0, wait_for_clients=0):
+        #listen on host:port (port 0 picks a free one, see self.port)
+        self.wait_for_clients = wait_for_clients
+        self.clients_ready = asyncio.Event()
+        if wait_for_clients == 0:
+            self.clients_ready.set()
+
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+
+    async def run(self, generations=None):
+        #step generations (None: until cancelled) once the clients waited for are connected
+        await self.clients_ready.wait()
+        loop = asyncio.get_running_loop()
+        next_step = time.perf_counter()
+        stepped = 0
+
+        while generations is None or stepped < generations:
+            periodic = (self.generation + 1) % self.keyframe_interval == 0
+            keyframe = periodic or any(subscriber.needs_keyframe for subscriber in self.subscribers)
+
+            board, delta, key = await loop.run_in_executor(None, self.step, keyframe)
+            self.previous = board
+            self.generation += 1
+            stepped += 1
+            self.broadcast(delta, key)
+
+            if self.gens_per_sec:
+                next_step += 1 / self.gens_per_sec
+                await asyncio.sleep(max(0, next_step - time.perf_counter()))
+                if next_step < time.perf_counter():
+                    next_step = time.perf_counter()
+            else:
+                #let the senders run between generations
+                await asyncio.sleep(0)
+
+
+    async def close(self, timeout=5):
+        #send what is queued, then hang up on every client, cutting off any still not reading after timeout
+        keyframe = encode_frame(self.generation, self.previous, level=self.level)
+        for subscriber in list(self.subscribers):
+            subscriber.hang_up(keyframe)
+
+        end = time.perf_counter() + timeout
+        while self.subscribers and time.perf_counter() < end:
+            await asyncio.sleep(0.01)
+
+        for subscriber in list(self.subscribers):
+            subscriber.writer.transport.abort()
+
+        self.server.close()
+        await self.server.wait_closed()
+
+        if hasattr(self.conway, 'close'):
+            self.conway.close()
+
+
+    async def serve(self, host='127.0.0.1', port=0, generations=None, wait_for_clients=0):
+        await self.start(host, port, wait_for_clients)
+
+        try:
+            await self.run(generations)
+        finally:
+            await self.close()
+
+        return self.get_stats()
+
+
+    def get_stats(self):
+        return {
+            'generation': self.generation,
+            'clients_served': self.clients_served,
+            'frames_skipped': self.frames_skipped,
+            'port': self.port,
+        }
+
+
+
+class StreamClient():
+    #Blocking reader of a FrameServer stream, keeps the latest board it has decoded
+
+    def __init__(self, host, port, timeout=None):
+        self.socket = socket.create_connection((host, port), timeout)
+        self.file = self.socket.makefile('rb')
+
+        if self.read_exactly(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{host}:{port} is not a frame stream')
+
+        length = struct.unpack('<I', self.read_exactly(4))[0]
+        header = json.loads(self.read_exactly(length))
+        self.rows, self.cols = header['rows'], header['cols']
+        self.rule = LifeRule(header['rule'])
+        self.keyframe_interval = header['keyframe_interval']
+
+        self.generation = None
+        self.board = None
+        #generations jumped over by keyframes sent after a skip
+        self.missed = 0
+
+
+    def read_exactly(self, size):
+        data = self.file.read(size)
+
+        if len(data) < size:
+            raise EOFError('stream closed')
+
+        return data
+
+
+    def read_frame(self):
+        #decode the next frame, returns its (kind, generation), None once the server hangs up
+        try:
+            kind, generation, length = FRAME.unpack(self.read_exactly(FRAME.size))
+            payload = self.read_exactly(length)
+        except (EOFError, OSError, ValueError):
+            return None
+
+        if self.generation is not None and generation > self.generation + 1:
+            self.missed += generation - self.generation - 1
+
+        self.board = decode_frame(kind, payload, self.rows, self.cols, self.board)
+        self.generation = generation
+
+        return kind, generation
+
+
+    def close(self):
+        #shutdown wakes a read blocked in another thread
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        self.file.close()
+        self.socket.close()
+
+
+
+class StreamThread(SimulationThread):
+    #Shows a StreamClient through the SimulationThread snapshot interface, so RunGame can view a server's run
+    #pausing freezes the view while frames keep arriving, edits are ignored (the server owns the board)
+
+    def __init__(self, client, profiler=None):
+        self.client = client
+        board = np.zeros((client.rows, client.cols), dtype=bool)
+
+        super().__init__(ArrayBoard(), None, client.rows, client.cols, 1, board, None, None, profiler)
+
+
+    def queue_edit(self, r, c, state):
+        pass
+
+
+    def queue_cells(self, rows, cols, state):
+        pass
+
+
+    def set_board(self, board):
+        pass
+
+
+    def set_stats(self, stats):
+        pass
+
+
+    def record(self):
+        pass
+
+
+    def stop(self):
+        self.running = False
+        self.client.close()
+        super().stop()
+
+
+    def loop(self):
+        shown = False
+
+        while self.running:
+            start = self.profiler.start()
+            frame = self.client.read_frame()
+            if frame is None:
+                break
+
+            self.profiler.stop('receive', start)
+            self.profiler.count('generations')
+            self.generation = self.client.generation
+            self.board1 = self.client.board
+
+            #the first frame is shown even while paused
+            if not self.paused or not shown:
+                self.publish()
+                shown = True
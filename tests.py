@@ -6,9 +6,27 @@
 
 import unittest
 import Conway 
+import core
+import headless
+import benchmark
+import recording
+import checkpoint
+import soup
+import monitor
+import streaming
+import threading
+import asyncio
+import verify
+import patterns
+import json
+import subprocess
+import sys
 import pygame as pg
 import numpy as np
 import random
+import time
+import os
+import tempfile
 
 
 
@@ -291,10 +309,1004 @@ class Test(unittest.TestCase):
                     for c in range(col_test):
                                             
                             self.assertEqual(arr2[r][c].state, arr3[r][c].state)
-                
 
 
-                
+
+    def test_numpy_conway_board_next_gen(self):
+            g = Conway.Grid()
+            ag = Conway.ArrayGrid()
+            conwaylogic = Conway.ConwayLogic()
+            numpylogic = Conway.NumpyConwayLogic()
+
+            #awkward sizes to exercise the torus wrap, including single row/col boards
+            for row_test, col_test in [(60, 80), (7, 13), (1, 9), (9, 1), (2, 2)]:
+
+                arr1 = g.fill_array_with_cells(g.create_empty_2d_array(row_test, col_test), row_test, col_test, True, 0.4)
+                arr2 = g.fill_array_with_cells(g.create_empty_2d_array(row_test, col_test), row_test, col_test)
+
+                bool1 = g.cells_to_bool_array(arr1)
+                bool2 = ag.create_empty_2d_array(row_test, col_test)
+
+                for gen in range(5):
+                    arr1, arr2 = conwaylogic.get_board_next_gen(row_test, col_test, 10, arr1, arr2)
+                    bool1, bool2 = numpylogic.get_board_next_gen(row_test, col_test, 10, bool1, bool2)
+
+                    self.assertTrue(np.array_equal(g.cells_to_bool_array(arr1), bool1))
+
+            #Cell object boards are accepted too
+            cells1 = g.fill_array_with_cells(g.create_empty_2d_array(6, 6), 6, 6, True, 0.5)
+            cells2 = g.fill_array_with_cells(g.create_empty_2d_array(6, 6), 6, 6)
+            cells3 = g.fill_array_with_cells(g.create_empty_2d_array(6, 6), 6, 6)
+            expected = conwaylogic.get_board_next_gen(6, 6, 10, cells1, cells3)[0]
+            result = numpylogic.get_board_next_gen(6, 6, 10, cells1, cells2)[0]
+            self.assertTrue(np.array_equal(g.cells_to_bool_array(result), g.cells_to_bool_array(expected)))
+
+
+    def test_bitpacked_conway_board_next_gen(self):
+            g = Conway.Grid()
+            numpylogic = Conway.NumpyConwayLogic()
+            bitlogic = Conway.BitPackedConwayLogic(block_rows=4)
+
+            #lossless round trip through the Cell board format
+            arr = g.fill_array_with_cells(g.create_empty_2d_array(60, 80), 60, 80, True, 0.3)
+            packed = bitlogic.pack_board(arr)
+            self.assertEqual(packed.shape, (60, 2))
+            back = bitlogic.packed_to_cells(packed, 80, g.fill_array_with_cells(g.create_empty_2d_array(60, 80), 60, 80))
+            self.assertTrue(np.array_equal(g.cells_to_bool_array(back), g.cells_to_bool_array(arr)))
+
+            #word and row edge wrap on widths either side of the 64 bit word size
+            for row_test, col_test in [(60, 80), (1, 1), (9, 1), (5, 63), (5, 64), (7, 65), (6, 128), (11, 130)]:
+
+                bool1 = np.random.random((row_test, col_test)) < 0.4
+                bool2 = np.zeros_like(bool1)
+                packed1 = bitlogic.pack_board(bool1)
+                packed2 = bitlogic.create_empty_packed_array(row_test, col_test)
+
+                for gen in range(10):
+                    bool1, bool2 = numpylogic.get_board_next_gen(row_test, col_test, 10, bool1, bool2)
+                    packed1, packed2 = bitlogic.get_board_next_gen(row_test, col_test, 10, packed1, packed2)
+
+                    self.assertTrue(np.array_equal(bitlogic.unpack_board(packed1, col_test), bool1))
+
+
+    def test_sparse_conway_board_next_gen(self):
+            g = Conway.Grid()
+            numpylogic = Conway.NumpyConwayLogic()
+            sparselogic = Conway.SparseConwayLogic(tile_size=8)
+
+            for row_test, col_test in [(60, 80), (1, 9), (9, 1), (2, 2), (17, 33)]:
+
+                bool1 = np.random.random((row_test, col_test)) < 0.4
+                bool2 = np.zeros_like(bool1)
+                sparse1 = bool1.copy()
+                sparse2 = np.zeros_like(bool1)
+
+                for gen in range(20):
+                    bool1, bool2 = numpylogic.get_board_next_gen(row_test, col_test, 10, bool1, bool2)
+                    sparse1, sparse2 = sparselogic.get_board_next_gen(row_test, col_test, 10, sparse1, sparse2)
+
+                    self.assertTrue(np.array_equal(sparse1, bool1))
+
+                    #edits between generations are picked up once marked
+                    if gen == 10:
+                        bool1[0, col_test-1] = sparse1[0, col_test-1] = True
+                        sparselogic.mark_changed(0, col_test-1)
+
+            #a still life in an empty field leaves no active tiles to evaluate
+            block = np.zeros((64, 64), dtype=bool)
+            block[30:32, 30:32] = True
+            board2 = np.zeros_like(block)
+            for gen in range(3):
+                block, board2 = sparselogic.get_board_next_gen(64, 64, 10, block, board2)
+            self.assertEqual(sparselogic.changed_tiles, set())
+            self.assertEqual(block.sum(), 4)
+
+
+    def test_hashlife_advance(self):
+            numpylogic = Conway.NumpyConwayLogic()
+
+            #a soup in the middle of a large torus never reaches the edges, so it matches the unbounded universe
+            row_test, col_test = 120, 120
+            bool1 = np.zeros((row_test, col_test), dtype=bool)
+            bool1[50:70, 50:70] = np.random.random((20, 20)) < 0.4
+            bool2 = np.zeros_like(bool1)
+
+            #small node budget to force garbage collection between steps
+            hashlife = Conway.HashlifeUniverse(max_nodes=500)
+            hashlife.set_board(bool1)
+
+            for jump in [1, 2, 5, 8]:
+                hashlife.advance(jump)
+                for gen in range(jump):
+                    bool1, bool2 = numpylogic.get_board_next_gen(row_test, col_test, 10, bool1, bool2)
+
+                self.assertTrue(np.array_equal(hashlife.get_board(row_test, col_test), bool1))
+
+            stats = hashlife.get_stats()
+            self.assertEqual(stats['generation'], 16)
+            self.assertEqual(stats['population'], bool1.sum())
+            self.assertGreater(stats['gc_runs'], 0)
+
+            #a glider moves one cell diagonally every 4 generations, even after 2**30 of them
+            glider = np.zeros((3, 3), dtype=bool)
+            glider[0, 1] = glider[1, 2] = glider[2, :] = True
+            hashlife = Conway.HashlifeUniverse()
+            hashlife.set_board(glider)
+            hashlife.advance(2**30)
+            self.assertTrue(np.array_equal(hashlife.get_board(3, 3, 2**28, 2**28), glider))
+            self.assertEqual(hashlife.get_population(), 5)
+
+
+    def test_parallel_conway_board_next_gen(self):
+            g = Conway.Grid()
+            numpylogic = Conway.NumpyConwayLogic()
+            parallellogic = Conway.ParallelConwayLogic(workers=2, tiles=5)
+
+            try:
+                for row_test, col_test in [(60, 80), (1, 9), (7, 13)]:
+
+                    bool1 = np.random.random((row_test, col_test)) < 0.4
+                    bool2 = np.zeros_like(bool1)
+                    shared1 = bool1.copy()
+                    shared2 = np.zeros_like(bool1)
+
+                    for gen in range(10):
+                        bool1, bool2 = numpylogic.get_board_next_gen(row_test, col_test, 10, bool1, bool2)
+                        shared1, shared2 = parallellogic.get_board_next_gen(row_test, col_test, 10, shared1, shared2)
+
+                        self.assertTrue(np.array_equal(shared1, bool1))
+
+                #Cell object boards are copied in and out of shared memory
+                arr1 = g.fill_array_with_cells(g.create_empty_2d_array(60, 80), 60, 80, True, 0.3)
+                arr2 = g.fill_array_with_cells(g.create_empty_2d_array(60, 80), 60, 80)
+                expected = numpylogic.get_board_next_gen(60, 80, 10, g.cells_to_bool_array(arr1), np.zeros((60, 80), dtype=bool))[0]
+                result = parallellogic.get_board_next_gen(60, 80, 10, arr1, arr2)[0]
+                self.assertTrue(np.array_equal(g.cells_to_bool_array(result), expected))
+
+            finally:
+                parallellogic.close()
+
+
+    #HEADLESS ========================================================================================
+    def test_core_imports_without_pygame(self):
+            code = "import sys, core, headless; print('pygame' in sys.modules)"
+            out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+            self.assertEqual(out.stdout.strip(), 'False')
+
+
+    def test_headless_engines_agree(self):
+            #every engine stepping the same seeded soup ends on the same board
+            reference, stats = headless.HeadlessGame(30, 70, 'reference', 0.3, seed=7).run(15)
+            self.assertEqual(stats['generations'], 15)
+            self.assertEqual(stats['population'], reference.sum())
+
+            for engine in ['numpy', 'bitpacked', 'sparse', 'parallel']:
+                board, stats = headless.HeadlessGame(30, 70, engine, 0.3, seed=7, workers=2).run(15)
+                self.assertTrue(np.array_equal(board, reference), engine)
+
+            #an unseeded run reports the seed its soup drew, which repeats it
+            board, stats = headless.HeadlessGame(30, 70, 'numpy', 0.3).run(15)
+            repeat, _ = headless.HeadlessGame(30, 70, 'numpy', 0.3, seed=stats['seed']).run(15)
+            self.assertTrue(np.array_equal(board, repeat))
+
+
+    #RENDERING ========================================================================================
+    def test_grid_screen_colour_fill_matches_rect_drawing(self):
+            s = Conway.Settings(800, 600, 10, 13, 60, 0.2)
+            ag = Conway.ArrayGrid()
+
+            for scale in [10, 3, 1]:
+                row_test, col_test = s.HEIGHT//scale, s.WIDTH//scale
+                board = np.random.random((row_test, col_test)) < 0.3
+
+                for funky, colour_name in [(False, 0), (True, 'OCEAN')]:
+
+                    #reference: one rect per cell, as the original renderer drew them
+                    s.SCREEN.fill((0,0,0))
+                    colour = s.colour_dict['funky'][colour_name] if funky else s.colour_dict['standard']['WHITE']
+                    for r, c in np.argwhere(board):
+                        pg.draw.rect(s.SCREEN, colour, (c*scale, r*scale, scale-1, scale-1))
+                    expected = pg.surfarray.array3d(s.SCREEN)
+
+                    s.SCREEN.fill((0,0,0))
+                    ag.screen_colour_fill(s.SCREEN, board, s.colour_dict, row_test, col_test, scale, funky, colour_name, False)
+                    self.assertTrue(np.array_equal(pg.surfarray.array3d(s.SCREEN), expected))
+
+
+    def test_grid_dirty_rects(self):
+            s = Conway.Settings(800, 600, 10, 13, 60, 0.2)
+            ag = Conway.ArrayGrid(dirty_tile=16)
+            board = np.zeros((s.rows, s.cols), dtype=bool)
+
+            #first frame pushes the whole board
+            rects = ag.screen_colour_fill(s.SCREEN, board, s.colour_dict, s.rows, s.cols, s.scale, False, 0, False)
+            self.assertEqual(rects, [pg.Rect(0, 0, 800, 600)])
+
+            #unchanged board pushes nothing
+            rects = ag.screen_colour_fill(s.SCREEN, board, s.colour_dict, s.rows, s.cols, s.scale, False, 0, False)
+            self.assertEqual(rects, [])
+
+            #one changed cell pushes only its tile
+            board[20, 40] = True
+            rects = ag.screen_colour_fill(s.SCREEN, board, s.colour_dict, s.rows, s.cols, s.scale, False, 0, False)
+            self.assertEqual(rects, [pg.Rect(320, 160, 160, 160)])
+            self.assertEqual(s.SCREEN.get_at((400, 200)), (255,255,255))
+
+
+    #BENCHMARK ========================================================================================
+    def test_benchmark_results_and_regression_check(self):
+            bench = benchmark.Benchmark([(20, 30)], [0.2, 0.5], ['reference', 'numpy'], min_seconds=0.01, max_generations=5)
+            results = bench.run()
+
+            self.assertEqual(len(results), 4)
+            for result in results:
+                self.assertGreater(result['gens_per_sec'], 0)
+                self.assertGreater(result['ns_per_cell'], 0)
+                self.assertGreaterEqual(result['peak_mb'], 0)
+
+            #same results are never a regression, a much faster baseline always is
+            self.assertEqual(bench.check_regression(results, results, 0.1), [])
+            faster = [dict(result, gens_per_sec=result['gens_per_sec'] * 10) for result in results]
+            self.assertEqual(len(bench.check_regression(results, faster, 0.1)), 4)
+
+
+    def test_benchmark_scaling_report(self):
+            bench = benchmark.Benchmark([], [0.3], ['parallel'])
+            results = bench.run_scaling(64, 64, [1, 2], generations=3)
+
+            self.assertEqual([result['workers'] for result in results], [1, 2])
+            self.assertEqual(results[0]['speedup'], 1.0)
+            for result in results:
+                self.assertEqual((result['rows'], result['cols'], result['prob']), (64, 64, 0.3))
+                self.assertGreater(result['gens_per_sec'], 0)
+
+            #the command line takes the worker counts as a comma list, more than one only for --scaling
+            results = benchmark.BenchmarkCLI.main(['--scaling', '32x48', '--workers', '1,2', '--scaling-generations', '2'])
+            self.assertEqual([(result['workers'], result['cols']) for result in results], [(1, 48), (2, 48)])
+            with self.assertRaises(SystemExit):
+                benchmark.BenchmarkCLI.main(['--workers', '1,2'])
+
+
+    #CYCLE DETECTION ========================================================================================
+    def test_cycle_detector(self):
+            numpylogic = Conway.NumpyConwayLogic()
+
+            def run(board, max_period, generations):
+                rows, cols = board.shape
+                detector = core.CycleDetector(rows, cols, max_period)
+                detector.start(board)
+                board2 = np.zeros_like(board)
+                for gen in range(generations):
+                    board, board2 = numpylogic.get_board_next_gen(rows, cols, 10, board, board2)
+                    if detector.update(board, board2):
+                        break
+                    #incremental hash stays equal to a full rehash
+                    self.assertEqual(detector.hash, detector.get_hash(board))
+                return detector, board
+
+            #blinker: period 2 from generation 0
+            blinker = np.zeros((10, 10), dtype=bool)
+            blinker[4, 3:6] = True
+            detector, board = run(blinker.copy(), 8, 10)
+            self.assertEqual(detector.get_result(), {'status': 'cycle', 'cycle_start': 0, 'period': 2})
+            self.assertTrue(np.array_equal(detector.get_board_at(10**9), blinker))
+            self.assertTrue(np.array_equal(detector.get_board_at(10**9 + 1), blinker.T))
+
+            #block: still life
+            block = np.zeros((10, 10), dtype=bool)
+            block[2:4, 2:4] = True
+            detector, board = run(block, 8, 10)
+            self.assertEqual(detector.get_result(), {'status': 'still', 'cycle_start': 0, 'period': 1})
+
+            #lone cell: extinct after one generation
+            lone = np.zeros((10, 10), dtype=bool)
+            lone[5, 5] = True
+            detector, board = run(lone, 8, 10)
+            self.assertEqual(detector.get_result(), {'status': 'extinct', 'cycle_start': 1, 'period': 1})
+
+            #glider on an 8x8 torus repeats after 32 generations, only seen with a long enough window
+            glider = np.zeros((8, 8), dtype=bool)
+            glider[0, 1] = glider[1, 2] = glider[2, :3] = True
+            detector, board = run(glider.copy(), 16, 40)
+            self.assertEqual(detector.status, 'running')
+            self.assertEqual(len(detector.boards), 16)
+            detector, board = run(glider.copy(), 40, 40)
+            self.assertEqual(detector.get_result(), {'status': 'cycle', 'cycle_start': 0, 'period': 32})
+            with self.assertRaises(ValueError):
+                detector.get_board_at(-1)
+
+
+    #RULES ========================================================================================
+    def test_life_rule_parsing(self):
+            conway = Conway.LifeRule()
+            self.assertEqual(conway.rulestring, 'B3/S23')
+            self.assertEqual(Conway.LifeRule('s23/b3'), conway)
+            self.assertEqual(Conway.LifeRule('23/3'), conway)
+            self.assertEqual(Conway.LifeRule('B36/S23').birth, [3, 6])
+            self.assertEqual(Conway.LifeRule('B2/S').survival, [])
+
+            #table matches the hard coded B3/S23 branches of ConwayLogic
+            for total in range(9):
+                self.assertEqual(conway.get_next_state(False, total), total == 3)
+                self.assertEqual(conway.get_next_state(True, total), total in (2, 3))
+
+            for bad in ['B3S23', 'B9/S23', 'X3/S23', 'B3/B23']:
+                with self.assertRaises(ValueError):
+                    Conway.LifeRule(bad)
+
+
+    def test_rules_agree_across_engines(self):
+            g = Conway.Grid()
+
+            for rulestring in ['B36/S23', 'B2/S', 'B0/S8', 'B1357/S1357']:
+                rule = Conway.LifeRule(rulestring)
+                board = np.random.random((13, 70)) < 0.3
+
+                reference = Conway.ConwayLogic(rule)
+                arr1, arr2 = reference.create_boards(board)
+                for gen in range(6):
+                    arr1, arr2 = reference.get_board_next_gen(13, 70, 10, arr1, arr2)
+                expected = g.cells_to_bool_array(arr1)
+
+                for engine in [Conway.NumpyConwayLogic(rule), Conway.BitPackedConwayLogic(rule=rule), Conway.SparseConwayLogic(8, rule)]:
+                    board1, board2 = engine.create_boards(board)
+                    for gen in range(6):
+                        board1, board2 = engine.get_board_next_gen(13, 70, 10, board1, board2)
+
+                    self.assertTrue(np.array_equal(engine.to_bool_array(13, 70, board1), expected), (rulestring, engine))
+
+            #HighLife replicator grows the same in Hashlife as on a big enough torus
+            highlife = Conway.LifeRule('B36/S23')
+            board = np.zeros((80, 80), dtype=bool)
+            board[38:41, 38:41] = [[0, 1, 1], [1, 1, 0], [0, 1, 0]]
+            numpylogic = Conway.NumpyConwayLogic(highlife)
+            board1, board2 = numpylogic.create_boards(board)
+            for gen in range(20):
+                board1, board2 = numpylogic.get_board_next_gen(80, 80, 10, board1, board2)
+
+            hashlife = Conway.HashlifeUniverse(rule=highlife)
+            hashlife.set_board(board)
+            hashlife.advance(20)
+            self.assertTrue(np.array_equal(hashlife.get_board(80, 80), board1))
+
+            with self.assertRaises(ValueError):
+                Conway.HashlifeUniverse(rule=Conway.LifeRule('B0/S8'))
+
+
+    #UNBOUNDED ========================================================================================
+    def test_chunked_universe(self):
+            soup = np.random.random((30, 30)) < 0.4
+
+            #same unbounded plane as Hashlife
+            chunked = Conway.ChunkedUniverse(chunk_size=8)
+            chunked.set_board(soup, -15, -15)
+            hashlife = Conway.HashlifeUniverse()
+            hashlife.set_board(soup)
+            chunked.advance(40)
+            hashlife.advance(40)
+            self.assertTrue(np.array_equal(chunked.get_board(200, 200, -100, -100), hashlife.get_board(200, 200, -85, -85)))
+            self.assertEqual(chunked.get_population(), hashlife.get_population())
+
+            #a glider leaving the window keeps going instead of wrapping, memory stays one or two chunks
+            glider = np.zeros((3, 3), dtype=bool)
+            glider[0, 1] = glider[1, 2] = glider[2, :] = True
+            chunked = Conway.ChunkedUniverse(chunk_size=16)
+            chunked.set_board(glider)
+            chunked.advance(400)
+            self.assertEqual(chunked.get_bounding_box(), (100, 100, 102, 102))
+            self.assertTrue(np.array_equal(chunked.get_board(3, 3, 100, 100), glider))
+            self.assertLessEqual(chunked.get_chunk_count(), 2)
+
+            #dying cells free their chunks
+            chunks = chunked.get_chunk_count()
+            chunked.set_cell(-1000, 5000, True)
+            self.assertEqual(chunked.get_chunk_count(), chunks + 1)
+            chunked.step()
+            self.assertFalse(chunked.get_cell(-1000, 5000))
+            self.assertNotIn((-1000 // 16, 5000 // 16), chunked.chunks)
+
+            #window contract: edits to the returned board are carried into the universe
+            board1, board2 = chunked.create_boards(np.zeros((10, 10), dtype=bool))
+            board1, board2 = chunked.get_board_next_gen(10, 10, 10, board1, board2)
+            board1[4, 3:6] = True
+            board1, board2 = chunked.get_board_next_gen(10, 10, 10, board1, board2)
+            self.assertTrue(np.array_equal(np.argwhere(board1), [[3, 4], [4, 4], [5, 4]]))
+
+
+    #SIMULATION THREAD ========================================================================================
+    def test_simulation_thread(self):
+            ab = Conway.ArrayBoard()
+            numpylogic = Conway.NumpyConwayLogic()
+
+            board = np.zeros((20, 30), dtype=bool)
+            simulation = Conway.SimulationThread(ab, Conway.NumpyConwayLogic(), 20, 30, 10, board, np.zeros_like(board))
+            simulation.start()
+
+            try:
+                #edits while paused are applied and published without stepping
+                for c in range(3):
+                    simulation.queue_edit(10, 10 + c, True)
+                deadline = time.time() + 5
+                while not simulation.get_snapshot()[10, 10:13].all() and time.time() < deadline:
+                    time.sleep(0.01)
+                self.assertEqual(simulation.generation, 0)
+                self.assertTrue(np.array_equal(np.argwhere(simulation.get_snapshot()), [[10, 10], [10, 11], [10, 12]]))
+
+                #run, pause, and the snapshot is exactly that generation
+                simulation.set_paused(False)
+                while simulation.generation < 5 and time.time() < deadline:
+                    time.sleep(0.01)
+                simulation.set_paused(True)
+                time.sleep(0.05)
+                snapshot = simulation.get_snapshot().copy()
+
+                expected = np.zeros_like(board)
+                expected[10, 10:13] = True
+                scratch = np.zeros_like(board)
+                for gen in range(simulation.generation):
+                    expected, scratch = numpylogic.get_board_next_gen(20, 30, 10, expected, scratch)
+                self.assertTrue(np.array_equal(snapshot, expected))
+
+                #a replaced board shows up in the next snapshot
+                simulation.set_board(np.ones((20, 30), dtype=bool))
+                while not simulation.get_snapshot().all() and time.time() < deadline:
+                    time.sleep(0.01)
+                self.assertTrue(simulation.get_snapshot().all())
+
+            finally:
+                simulation.stop()
+
+
+    def test_ensemble(self):
+            rows, cols = 12, 14
+            numpylogic = Conway.NumpyConwayLogic()
+
+            ensemble = core.Ensemble(rows, cols, max_period=8)
+            results = ensemble.set_random_boards(np.linspace(0.1, 0.5, 60), seed=4)
+            boards = ensemble.boards.copy()
+            results = ensemble.run(200)
+
+            #every board has its own draws, the same again for the same seed
+            self.assertEqual(len({board.tobytes() for board in boards}), len(boards))
+            again = core.Ensemble(rows, cols, max_period=8)
+            again.set_random_boards(np.linspace(0.1, 0.5, 60), seed=4)
+            self.assertTrue(np.array_equal(again.boards, boards))
+
+            #every board agrees with stepping it on its own under a CycleDetector
+            for i in range(len(boards)):
+                detector = core.CycleDetector(rows, cols, 8)
+                detector.start(boards[i])
+                board, board2 = boards[i].copy(), np.zeros((rows, cols), dtype=bool)
+                for gen in range(200):
+                    board, board2 = numpylogic.get_board_next_gen(rows, cols, 10, board, board2)
+                    if detector.update(board, board2):
+                        break
+
+                self.assertEqual(core.Ensemble.STATUS[results['status'][i]], detector.status)
+                self.assertEqual(results['period'][i], detector.period or 0)
+                self.assertEqual(results['generation'][i], detector.generation)
+                self.assertEqual(results['population'][i], board.sum())
+                self.assertEqual(results['initial_population'][i], boards[i].sum())
+
+            #finished boards were retired from the batch
+            self.assertEqual(len(ensemble.boards), ensemble.get_status_counts()['running'])
+
+
+    def test_viewport(self):
+            s = Conway.Settings(800, 600, 10, 13, 60, 0.2)
+            ag = Conway.ArrayGrid()
+            board = soup.Soup(3000, 4000, 1, 0.1).get_rows(0, 3000)
+            v = Conway.Viewport(800, 600, 3000, 4000, 10)
+
+            #default camera draws the same as the window sized board without a viewport
+            ag.screen_colour_fill(s.SCREEN, board[:60, :80], s.colour_dict, 60, 80, 10, False, 0, False)
+            expected = pg.surfarray.array3d(s.SCREEN)
+            s.SCREEN.fill((0,0,0))
+            rects = ag.screen_colour_fill(s.SCREEN, board, s.colour_dict, 60, 80, 10, False, 0, False, v)
+            self.assertTrue(np.array_equal(pg.surfarray.array3d(s.SCREEN), expected))
+            self.assertEqual(v.screen_to_cell(15, 25), (2, 1))
+
+            #panning maps pixels to the moved cells and redraws everything
+            v.pan(8, 3)
+            self.assertEqual(v.screen_to_cell(15, 25), (10, 4))
+            rects = ag.screen_colour_fill(s.SCREEN, board, s.colour_dict, 60, 80, 10, False, 0, False, v)
+            self.assertEqual(rects, [pg.Rect(0, 0, 800, 600)])
+
+            #zooming keeps the cell under the cursor in place
+            v.pan(142, 197)
+            self.assertEqual(v.screen_to_cell(400, 300), (180, 240))
+            v.zoom(-2, 400, 300)
+            self.assertEqual(v.scale, 2)
+            self.assertEqual(v.screen_to_cell(400, 300), (180, 240))
+            v.zoom(-3, 400, 300)
+            self.assertEqual((v.scale, v.block), (1, 4))
+
+            #zoomed out each pixel is alive if any cell of its block is
+            view = v.get_view(board)
+            region = board[v.top:v.top + 600*4, v.left:v.left + 800*4]
+            padded = np.zeros((view.shape[0]*4, view.shape[1]*4), dtype=bool)
+            padded[:region.shape[0], :region.shape[1]] = region
+            self.assertTrue(np.array_equal(view, padded.reshape(view.shape[0], 4, view.shape[1], 4).any(axis=(1, 3))))
+
+            #fully zoomed out the whole board fits the window
+            v.zoom(-10)
+            self.assertEqual((v.top, v.left), (0, 0))
+            self.assertEqual(v.get_view(board).shape, (600, 800))
+            self.assertEqual(v.screen_to_cell(799, 599), (2995, 3995))
+
+
+    def test_profiler(self):
+            profiler = core.Profiler()
+
+            #disabled: nothing is recorded
+            profiler.stop('step', profiler.start())
+            profiler.count('generations')
+            profiler.end_frame()
+            self.assertEqual((profiler.timings, profiler.counters, len(profiler.frames)), ({}, {}, 0))
+
+            reports = []
+            profiler = core.Profiler(enabled=True, report_every=5)
+            profiler.add_hook(reports.append)
+            for frame in range(10):
+                start = profiler.start()
+                time.sleep(0.001)
+                profiler.stop('render', start)
+                profiler.count('generations', 2)
+                profiler.end_frame()
+
+            self.assertEqual(len(reports), 2)
+            report = profiler.get_report()
+            self.assertEqual(report['counters'], {'generations': 20})
+            self.assertGreaterEqual(report['phases']['render']['p50'], 1.0)
+            self.assertLessEqual(report['phases']['render']['p50'], report['phases']['render']['p99'])
+            self.assertAlmostEqual(report['gens_per_sec'] / report['fps'], 2.0)
+
+            #the simulation thread times its steps and counts generations and changed cells
+            board = np.zeros((10, 10), dtype=bool)
+            board[4, 3:6] = True
+            simulation = core.SimulationThread(core.ArrayBoard(), Conway.NumpyConwayLogic(), 10, 10, 1, board,
+                                               np.zeros_like(board), profiler=profiler)
+            simulation.start()
+            simulation.set_paused(False)
+            while simulation.generation < 5:
+                time.sleep(0.001)
+            simulation.stop()
+            self.assertEqual(profiler.counters['cells_changed'], 4 * simulation.generation)
+            self.assertIn('step', profiler.get_report()['phases'])
+
+
+    def test_grid_palette_rendering(self):
+            s = Conway.Settings(800, 600, 10, 13, 60, 0.2)
+            ag = Conway.ArrayGrid()
+            board = np.zeros((s.rows, s.cols), dtype=bool)
+            board[5, 5:8] = True
+
+            #a colour only change swaps the palette without redrawing any pixels
+            calls = []
+            get_board_pixels = ag.get_board_pixels
+            ag.get_board_pixels = lambda *args: calls.append(1) or get_board_pixels(*args)
+            ag.screen_colour_fill(s.SCREEN, board, s.colour_dict, s.rows, s.cols, s.scale, True, 'RED', False)
+            rects = ag.screen_colour_fill(s.SCREEN, board, s.colour_dict, s.rows, s.cols, s.scale, True, 'OCEAN', False)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(rects, [pg.Rect(0, 0, 800, 600)])
+            self.assertEqual(s.SCREEN.get_at((50, 50)), s.colour_dict['funky']['OCEAN'])
+
+            #colour by age: a blinker's centre cell survives and ages, its ends are reborn each generation
+            ag.colour_mode = 'age'
+            ramp = list(s.colour_dict['funky'].values())
+            horizontal, vertical = np.zeros_like(board), np.zeros_like(board)
+            horizontal[5, 5:8] = True
+            vertical[4:7, 6] = True
+            for gen in range(10):
+                board = vertical if gen % 2 else horizontal
+                ag.screen_colour_fill(s.SCREEN, board, s.colour_dict, s.rows, s.cols, s.scale, False, 'RED', False)
+            self.assertEqual(ag.ages[5, 6], 10)
+            self.assertEqual(ag.ages[4, 6], 1)
+            self.assertEqual(s.SCREEN.get_at((65, 55)), ramp[(10 - 1) // 4])
+            self.assertEqual(s.SCREEN.get_at((65, 45)), ramp[0])
+
+            #redrawing the same generation (paused) does not age it
+            ag.screen_colour_fill(s.SCREEN, board, s.colour_dict, s.rows, s.cols, s.scale, False, 'RED', False)
+            self.assertEqual(ag.ages[5, 6], 10)
+
+
+    def test_recording_and_replay(self):
+            path = os.path.join(tempfile.mkdtemp(), 'run.rec')
+            rows, cols = 40, 50
+            game = headless.HeadlessGame(rows, cols, 'numpy', seed=2)
+            board = game.set_board()
+
+            #reference generations stepped directly
+            numpylogic = Conway.NumpyConwayLogic()
+            expected = [board.copy()]
+            board1, board2 = board.copy(), np.zeros_like(board)
+            for gen in range(120):
+                board1, board2 = numpylogic.get_board_next_gen(rows, cols, 10, board1, board2)
+                expected.append(board1.copy())
+
+            recorder = recording.Recorder(path, rows, cols, keyframe_interval=25)
+            game.run(120, board, recorder)
+
+            #a run that crashed before close is still readable by scanning its frames
+            replayer = recording.Replayer(path)
+            self.assertGreaterEqual(replayer.last_generation, 100)
+            self.assertTrue(np.array_equal(replayer.get_board(77), expected[77]))
+            recorder.close()
+
+            #random access through the index, then sequential and backwards
+            replayer = recording.Replayer(path)
+            self.assertEqual(replayer.index_generations, [0, 25, 50, 75, 100])
+            for gen in [120, 3, 60, 61, 62, 0, 99, 100]:
+                self.assertTrue(np.array_equal(replayer.get_board(gen), expected[gen]))
+            self.assertLess(os.path.getsize(path), rows * cols * 121 // 8)
+
+            #the replay thread feeds snapshots like a live simulation
+            simulation = recording.ReplayThread(replayer)
+            simulation.start()
+            simulation.seek(50)
+            while simulation.generation != 50:
+                time.sleep(0.001)
+            self.assertTrue(np.array_equal(simulation.get_snapshot(), expected[50]))
+            simulation.set_paused(False)
+            while simulation.generation < 120:
+                time.sleep(0.001)
+            simulation.stop()
+            self.assertTrue(np.array_equal(simulation.get_snapshot(), expected[120]))
+
+
+    def test_mapped_run_checkpoint_and_resume(self):
+            rows, cols = 70, 130
+            numpylogic = Conway.NumpyConwayLogic()
+            expected = [soup.Soup(rows, cols, 5, 0.3).get_rows(0, rows)]
+            board2 = np.zeros((rows, cols), dtype=bool)
+            for gen in range(30):
+                board1, board2 = numpylogic.get_board_next_gen(rows, cols, 10, expected[-1].copy(), board2)
+                expected.append(board1.copy())
+
+            for board_format in ['packed', 'uint8']:
+                path = tempfile.mkdtemp()
+                run = checkpoint.MappedRun(path, band_rows=16)
+                run.create(rows, cols, board_format, prob=0.3, seed=5)
+                self.assertTrue(np.array_equal(run.get_board(), expected[0]))
+
+                run.advance(10, checkpoint_every=4)
+                self.assertTrue(np.array_equal(run.get_board(), expected[10]))
+                self.assertTrue(np.array_equal(run.get_board(20, 50, 30, 70), expected[10][30:50, 70:120]))
+                self.assertEqual(run.get_population(), expected[10].sum())
+
+                #steps after the last checkpoint are lost in a crash, the checkpoint itself is not
+                for gen in range(5):
+                    run.step()
+                resumed = checkpoint.MappedRun(path, band_rows=16)
+                self.assertEqual(resumed.resume(), 10)
+                self.assertTrue(np.array_equal(resumed.get_board(), expected[10]))
+
+                resumed.advance(20)
+                self.assertTrue(np.array_equal(resumed.get_board(), expected[30]))
+                self.assertEqual(checkpoint.MappedRun(path).resume(), 30)
+
+            #a mapped board is never handed over a generation at a time
+            for option in ['--record', '--stats-stream']:
+                with self.assertRaises(SystemExit):
+                    headless.Headless.main(['--checkpoint', tempfile.mkdtemp(), option, os.path.join(path, 'out')])
+
+
+    def test_soup_generators(self):
+            rows, cols = 300, 530
+            kinds = [{}, {'prob_end': 0.9}, {'prob_end': 0.9, 'axis': 1}, {'symmetry': 'horizontal'},
+                     {'symmetry': 'vertical'}, {'symmetry': 'both'}, {'symmetry': 'rotate'}, {'region': (20, 30, 100, 200)}]
+
+            for kind in kinds:
+                generator = soup.Soup(rows, cols, 7, 0.3, **kind)
+                board = generator.get_rows(0, rows)
+
+                #bit identical however it is chunked or spread over workers, and for the same seed
+                for chunk_rows, workers in [(1, 1), (37, 3), (256, 2)]:
+                    chunked = generator.fill(np.zeros((rows, cols), dtype=bool), chunk_rows, workers)
+                    self.assertTrue(np.array_equal(chunked, board))
+                self.assertTrue(np.array_equal(generator.get_rows(50, 90, 100, 400), board[50:90, 100:400]))
+                self.assertTrue(np.array_equal(soup.Soup(rows, cols, 7, 0.3, **kind).get_rows(0, rows), board))
+
+            self.assertFalse(np.array_equal(soup.Soup(rows, cols, 8, 0.3).get_rows(0, rows), soup.Soup(rows, cols, 7, 0.3).get_rows(0, rows)))
+
+            board = soup.Soup(rows, cols, 7, 0.3, symmetry='rotate').get_rows(0, rows)
+            self.assertTrue(np.array_equal(board, board[::-1, ::-1]))
+            board = soup.Soup(rows, cols, 7, 0.3, symmetry='both').get_rows(0, rows)
+            self.assertTrue(np.array_equal(board, board[::-1]) and np.array_equal(board, board[:, ::-1]))
+            board = soup.Soup(rows, cols, 7, 0.1, prob_end=0.9).get_rows(0, rows)
+            self.assertLess(board[:30].mean(), 0.2)
+            self.assertGreater(board[-30:].mean(), 0.8)
+            board = soup.Soup(rows, cols, 7, 1.0, region=(20, 30, 100, 200)).get_rows(0, rows)
+            self.assertEqual(board.sum(), 100 * 200)
+            self.assertTrue(board[20:120, 30:230].all())
+
+            #seeded randomising through the board formats
+            g = Conway.ArrayGrid()
+            arr1 = g.fill_array_with_cells(g.create_empty_2d_array(60, 80), 60, 80, True, 0.3, seed=[1, 0])
+            cells = Conway.Grid().fill_array_with_cells(Conway.Grid().create_empty_2d_array(60, 80), 60, 80, True, 0.3, seed=[1, 0])
+            self.assertTrue(np.array_equal(arr1, Conway.Grid().cells_to_bool_array(cells)))
+
+
+    def test_numpy_advance_matches_single_steps(self):
+            for rule in ['B3/S23', 'B36/S23', 'B0/S8']:
+                for rows, cols in [(60, 80), (7, 5), (130, 33)]:
+                    board = np.random.default_rng(3).random((rows, cols)) < 0.3
+                    numpylogic = Conway.NumpyConwayLogic(core.LifeRule(rule))
+                    expected, board2 = board.copy(), np.zeros_like(board)
+                    results = {}
+                    for gen in range(21):
+                        results[gen] = expected.copy()
+                        expected, board2 = numpylogic.get_board_next_gen(rows, cols, 10, expected, board2)
+
+                    blocked = Conway.NumpyConwayLogic(core.LifeRule(rule))
+                    for k, depth, band_rows in [(0, 8, None), (1, 8, None), (20, 8, None), (20, 3, 16), (13, 16, 1)]:
+                        self.assertTrue(np.array_equal(blocked.advance(board, k, depth=depth, band_rows=band_rows), results[k]))
+
+            #buffers are reused between calls
+            buffers = blocked.buffers
+            out = np.zeros_like(board)
+            self.assertIs(blocked.advance(board, 13, out, depth=16, band_rows=1), out)
+            self.assertIs(blocked.buffers, buffers)
+
+
+    def test_stats_stream(self):
+            rows, cols = 30, 70
+            board = np.random.default_rng(5).random((rows, cols)) < 0.3
+            #a dead margin, so the first generation is the same on the torus and the unbounded plane
+            board[:3], board[-3:], board[:, :3], board[:, -10:] = False, False, False, False
+
+            #expected stats computed directly from the numpy engine's boards
+            expected = []
+            state, board2 = board.copy(), np.zeros_like(board)
+            numpylogic = Conway.NumpyConwayLogic()
+            for gen in range(12):
+                old = state.copy()
+                state, board2 = numpylogic.get_board_next_gen(rows, cols, 10, state, board2)
+                births, deaths = int((state & ~old).sum()), int((old & ~state).sum())
+                live_rows, live_cols = np.nonzero(state.any(axis=1))[0], np.nonzero(state.any(axis=0))[0]
+                expected.append({'generation': gen + 1, 'population': int(state.sum()), 'births': births, 'deaths': deaths,
+                                 'changed': births + deaths, 'top': int(live_rows[0]), 'left': int(live_cols[0]),
+                                 'bottom': int(live_rows[-1]), 'right': int(live_cols[-1])})
+
+            for name, engine in [('cells', Conway.ConwayLogic()), ('numpy', Conway.NumpyConwayLogic()),
+                                 ('bitpacked', core.BitPackedConwayLogic(7)), ('sparse', core.SparseConwayLogic(8)),
+                                 ('parallel', core.ParallelConwayLogic(2, 2))]:
+                ring = monitor.RingBufferStatsSink(8)
+                board1, board2 = engine.create_boards(board)
+                for gen in range(12):
+                    #attached part way through the run, the counts are still of the whole board
+                    if gen == 3:
+                        engine.stats = monitor.StatsStream([ring])
+                        engine.stats.start(3)
+                    board1, board2 = engine.get_board_next_gen(rows, cols, 10, board1, board2)
+                if hasattr(engine, 'close'):
+                    engine.close()
+
+                #the ring keeps the last 8, oldest first
+                recent = ring.get_recent()
+                self.assertEqual([{field: int(record[field]) for field in monitor.FIELDS} for record in recent], expected[4:], name)
+                self.assertEqual(ring.get_latest(), expected[-1], name)
+
+            universe = core.ChunkedUniverse(16)
+            universe.set_board(board)
+            ring = monitor.RingBufferStatsSink()
+            universe.stats = monitor.StatsStream([ring])
+            universe.step()
+            self.assertEqual(ring.get_latest(), expected[0])
+
+            #hashlife has no generations in between to report
+            for option in (['--stats-stream', 's.csv'], ['--max-period', '4']):
+                with self.assertRaises(SystemExit):
+                    headless.Headless.main(['--engine', 'hashlife'] + option)
+
+            with tempfile.TemporaryDirectory() as path:
+                for suffix in ('csv', 'ndjson'):
+                    out = os.path.join(path, 'stats.' + suffix)
+                    headless.Headless.main(['--rows', '20', '--cols', '20', '--seed', '1', '--generations', '30',
+                                            '--stats-stream', out])
+                    with open(out) as f:
+                        lines = f.read().splitlines()
+                    if suffix == 'csv':
+                        self.assertEqual(lines[0].split(','), list(monitor.FIELDS))
+                        lines = lines[1:]
+                    self.assertEqual(len(lines), 30)
+                    self.assertEqual(lines[-1].split(',')[0] if suffix == 'csv' else json.loads(lines[-1])['generation'],
+                                     '30' if suffix == 'csv' else 30)
+
+            #a running simulation attaches and detaches stats between generations, numbered from where it is
+            ring = monitor.RingBufferStatsSink()
+            sparse = core.SparseConwayLogic(8)
+            simulation = core.SimulationThread(core.ArrayBoard(), sparse, rows, cols, 1, board.copy(), np.zeros_like(board))
+            simulation.start()
+            try:
+                simulation.set_paused(False)
+                simulation.set_stats(monitor.StatsStream([ring]))
+                deadline = time.time() + 5
+                while ring.count < 20 and time.time() < deadline:
+                    time.sleep(0.001)
+                simulation.set_stats(None)
+                while sparse.stats is not None and time.time() < deadline:
+                    time.sleep(0.001)
+            finally:
+                simulation.stop()
+
+            recent = ring.get_recent()
+            self.assertGreaterEqual(len(recent), 20)
+            self.assertTrue(np.array_equal(np.diff(recent['generation']), np.ones(len(recent) - 1)))
+            state, scratch = board.copy(), np.zeros_like(board)
+            for gen in range(int(recent['generation'][-1])):
+                state, scratch = numpylogic.get_board_next_gen(rows, cols, 1, state, scratch)
+            self.assertEqual(int(recent['population'][-1]), state.sum())
+
+
+    def test_frame_streaming(self):
+            rows, cols = 64, 96
+            board = np.random.default_rng(2).random((rows, cols)) < 0.3
+            expected = [board]
+            board1, board2 = board.copy(), np.zeros_like(board)
+            numpylogic = Conway.NumpyConwayLogic()
+            for gen in range(60):
+                board1, board2 = numpylogic.get_board_next_gen(rows, cols, 10, board1, board2)
+                expected.append(board1.copy())
+
+            server = streaming.FrameServer(Conway.NumpyConwayLogic(), rows, cols, board, keyframe_interval=16, queue_size=4)
+            result = {}
+            thread = threading.Thread(target=lambda: result.update(asyncio.run(server.serve(port=0, generations=60,
+                                                                                             wait_for_clients=2))))
+            thread.start()
+            while server.port is None:
+                time.sleep(0.01)
+
+            #every frame a client decodes is the server's board for that generation, and both end on the last one
+            clients = [streaming.StreamClient('127.0.0.1', server.port, timeout=10) for i in range(2)]
+            for delay, client in zip((0, 0.01), clients):
+                self.assertEqual((client.rows, client.cols, client.rule.rulestring), (rows, cols, 'B3/S23'))
+                while client.read_frame() is not None:
+                    self.assertTrue(np.array_equal(client.board, expected[client.generation]))
+                    time.sleep(delay)
+                self.assertEqual(client.generation, 60)
+                client.close()
+
+            thread.join()
+            self.assertEqual((result['generation'], result['clients_served']), (60, 2))
+
+            #a full queue is dropped and the client waits for a keyframe
+            subscriber = streaming.Subscriber(None, 2)
+            for frame in (b'a', b'b', b'c'):
+                subscriber.offer(frame)
+            self.assertTrue(subscriber.needs_keyframe)
+            self.assertEqual((subscriber.skipped, subscriber.queue.qsize()), (3, 0))
+
+            #only a single board run stepped a generation at a time has a board to serve, and it is only served
+            for option in (['--ensemble', '4'], ['--checkpoint', tempfile.mkdtemp()], ['--engine', 'hashlife'],
+                           ['--record', 'r.rec'], ['--output', 'o.npy'], ['--max-period', '4']):
+                with self.assertRaises(SystemExit):
+                    headless.Headless.main(['--serve', '127.0.0.1:0'] + option)
+
+
+    #VERIFICATION ========================================================================================
+    def test_verifier(self):
+            verifier = verify.Verifier(['numpy', 'bitpacked', 'sparse'], generations=6, shapes=[(1, 1), (1, 5), (3, 65), (9, 7)],
+                                       random_shapes=2, max_rows=12, max_cols=70, rule='B36/S23')
+            self.assertEqual(verifier.run(), {'numpy': [], 'bitpacked': [], 'sparse': []})
+
+            #an engine that loses the wrap between the last and first column is caught and shrunk to one cell
+            def no_column_wrap(board, generations):
+                boards = {}
+                for gen in range(generations):
+                    padded = np.pad(board, 1, mode='wrap')
+                    padded[:, 0] = padded[:, -1] = False
+                    counts = sum(np.roll(np.roll(padded, i, 0), j, 1) for i in (-1, 0, 1) for j in (-1, 0, 1) if i or j)
+                    board = (counts[1:-1, 1:-1] == 3) | (board & (counts[1:-1, 1:-1] == 2))
+                    boards[gen + 1] = board
+                return boards
+
+            verifier = verify.Verifier(generations=10)
+            board = verifier.get_board(20, 30, 0.4, 1)
+            self.assertEqual(verifier.compare(no_column_wrap, board, 10)[0], 1)
+            shrunk, generation, error = verifier.shrink(no_column_wrap, board, 10)
+            self.assertEqual((verify.to_plaintext(shrunk), generation, error), (['O'], 1, None))
+
+            #benchmarks verify before timing
+            bench = benchmark.Benchmark([(20, 30)], [0.2], ['numpy'], min_seconds=0.01, max_generations=5, verify=True)
+            self.assertTrue(all(result['verified'] for result in bench.run()))
+
+
+    #PATTERNS ========================================================================================
+    def test_pattern_files(self):
+            with tempfile.TemporaryDirectory() as path:
+                #every format round trips, however the file is cut into chunks
+                board = np.random.default_rng(4).random((37, 150)) < 0.3
+                board[-3:] = False
+                for format, extension in [('rle', '.rle'), ('plaintext', '.cells'), ('life106', '.lif')]:
+                    out = os.path.join(path, 'soup' + extension)
+                    patterns.PatternWriter(out, 37, 150, format, name='soup').write(board, chunk_rows=5)
+                    for chunk_bytes in (5, 1 << 20):
+                        stamped = np.zeros_like(board)
+                        self.assertEqual(patterns.PatternFile(out).stamp(stamped, chunk_bytes=chunk_bytes), board.sum())
+                        self.assertTrue(np.array_equal(stamped, board), format)
+
+                with open(os.path.join(path, 'soup.rle')) as f:
+                    self.assertTrue(all(len(line) <= 70 for line in f.read().splitlines()))
+
+                with open(os.path.join(path, 'glider.rle'), 'w') as f:
+                    f.write('#N Glider\n#C the smallest spaceship\nx = 3, y = 3, rule = B3/S23\nbo$2bo$3o!\n')
+
+                library = patterns.PatternLibrary([path])
+                self.assertEqual(library.find('GLI'), ['Glider'])
+                self.assertEqual(library.index['Glider']['height'], 3)
+                glider = library.get('Glider')
+                self.assertEqual((glider.get_population(), glider.comments), (5, ['the smallest spaceship']))
+
+                #rotations and reflections, placed with an offset and wrapped onto the torus
+                array = glider.to_array()
+                self.assertTrue(np.array_equal(glider.transform(1).to_array(), np.rot90(array, -1)))
+                self.assertTrue(np.array_equal(glider.transform(3, True).to_array(), np.rot90(array[:, ::-1], 1)))
+                board = np.zeros((10, 10), dtype=bool)
+                glider.stamp(board, 8, 9, rotate=2)
+                self.assertTrue(np.array_equal(np.roll(board, (-8, -9), (0, 1))[:3, :3], np.rot90(array, 2)))
+                board[...] = True
+                glider.stamp(board, 0, 0, clear=True)
+                self.assertTrue(np.array_equal(board[:3, :3], array))
+
+                #headless runs start from a pattern and save patterns
+                out = os.path.join(path, 'out.rle')
+                headless.Headless.main(['--rows', '20', '--cols', '20', '--generations', '4', '--library', path,
+                                        '--pattern', 'Glider', '--pattern-at', '2,2', '--output', out])
+                stamped = np.zeros((20, 20), dtype=bool)
+                patterns.PatternFile(out).stamp(stamped)
+                self.assertTrue(np.array_equal(np.roll(stamped, (-1, -1), (0, 1))[2:5, 2:5], array))
+
+                #ensemble and checkpointed runs have no single board to write as a pattern
+                for option in (['--ensemble', '4'], ['--checkpoint', os.path.join(path, 'run')]):
+                    with self.assertRaises(SystemExit):
+                        headless.Headless.main(['--rows', '20', '--cols', '20', '--output', out] + option)
+
+
+    #MOUSE INPUT ========================================================================================
+    def test_mouse_strokes(self):
+            v = Conway.Viewport(800, 600, 60, 80, 10)
+            mouse = Conway.MouseInput()
+            click = lambda kind, button, pos: pg.event.Event(kind, button=button, pos=pos)
+
+            #a fast drag, two events across the window, draws a gap free line
+            mouse.handle_event(click(pg.MOUSEBUTTONDOWN, 1, (5, 55)))
+            mouse.handle_event(pg.event.Event(pg.MOUSEMOTION, pos=(405, 55), buttons=(1, 0, 0)))
+            (state, points), = mouse.take_strokes()
+            rows, cols = mouse.get_cells(v, points)
+            self.assertTrue(state)
+            self.assertEqual((rows.tolist(), cols.tolist()), ([5] * 41, list(range(41))))
+
+            #the held stroke carries on from where the last frame left off, a diagonal steps one cell at a time
+            mouse.handle_event(click(pg.MOUSEBUTTONUP, 1, (435, 85)))
+            (state, points), = mouse.take_strokes()
+            self.assertEqual(points, [(405, 55), (435, 85)])
+            self.assertEqual(mouse.get_cells(v, points)[0].tolist(), [5, 6, 7, 8])
+            self.assertEqual(mouse.take_strokes(), [])
+
+            #brushes, clipped at the board edge
+            mouse.brush = Conway.Brush(3)
+            rows, cols = mouse.get_cells(v, [(5, 5)])
+            self.assertEqual(sorted(zip(rows.tolist(), cols.tolist())), [(0, 0), (0, 1), (1, 0), (1, 1)])
+            mouse.brush = Conway.Brush(5, 'circle')
+            self.assertEqual(len(mouse.get_cells(v, [(205, 205)])[0]), 21)
+
+            #erasing with the right button, applied by the simulation in one edit
+            mouse.brush = Conway.Brush(1)
+            mouse.handle_event(click(pg.MOUSEBUTTONDOWN, 3, (5, 55)))
+            mouse.handle_event(click(pg.MOUSEBUTTONUP, 3, (95, 55)))
+            (state, points), = mouse.take_strokes()
+            self.assertFalse(state)
+
+            board = np.ones((60, 80), dtype=bool)
+            simulation = Conway.SimulationThread(Conway.ArrayBoard(), core.SparseConwayLogic(), 60, 80, 10, board,
+                                                 np.zeros_like(board))
+            simulation.queue_cells(*mouse.get_cells(v, points), state)
+            simulation.apply_edits()
+            self.assertEqual(np.argwhere(~board).tolist(), [[5, c] for c in range(10)])
+            self.assertEqual(simulation.conway.changed_tiles, {(0, 0)})
+
+
 
 if __name__== '__main__':
     unittest.main()
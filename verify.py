@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+
+
+#Differential verification: every fast engine against the reference ConwayLogic
+#
+#Seeded soups on awkward board shapes (single rows and columns, odd widths, widths either side of 64, boards
+#smaller than a tile or block) are stepped by the reference and by each candidate, and compared generation by
+#generation. A mismatch (or a crash) is shrunk to a small board that still reproduces it: rows and columns are
+#cut out and live cells cleared for as long as the candidate keeps disagreeing with the reference.
+#The unbounded engines (hashlife, chunked) have no torus to agree with and are not candidates.
+
+#Module Imports
+import argparse
+import sys
+import numpy as np
+
+from core import ENGINES, LifeRule, ConwayLogic, NumpyConwayLogic, BitPackedConwayLogic, SparseConwayLogic, ParallelConwayLogic
+from soup import Soup
+
+
+#(rows, cols): every degenerate torus, odd sizes, and sizes around a packed word and a sparse tile
+SHAPES = [(1, 1), (1, 2), (2, 1), (1, 3), (3, 1), (2, 2), (3, 3), (1, 67), (67, 1), (2, 65), (5, 7), (7, 5),
+          (4, 63), (4, 64), (4, 65), (3, 129), (17, 15), (16, 33), (33, 17), (31, 63), (20, 70)]
+
+
+
+class Verifier():
+    #engines: names from core.ENGINES, each checked in every variant get_candidates gives it
+    #random_shapes: extra seeded shapes up to max_rows x max_cols on top of SHAPES
+
+    def __init__(self, engines=None, generations=32, seed=0, rule='B3/S23', probs=(0.25, 0.5), shapes=None,
+                 random_shapes=8, max_rows=40, max_cols=140):
+        self.engines = [name for name in (engines or ENGINES) if name != 'reference']
+        self.generations = generations
+        self.seed = seed
+        self.rule = LifeRule(rule)
+        self.probs = probs
+        self.shapes = SHAPES if shapes is None else shapes
+        self.random_shapes = random_shapes
+        self.max_rows = max_rows
+        self.max_cols = max_cols
+
+
+    def get_shapes(self):
+        rng = np.random.default_rng([self.seed, 1])
+        extra = [(int(rng.integers(1, self.max_rows + 1)), int(rng.integers(1, self.max_cols + 1)))
+                 for i in range(self.random_shapes)]
+
+        return self.shapes + extra
+
+
+    def get_board(self, rows, cols, prob, case):
+        return Soup(rows, cols, [self.seed, case], prob).get_rows(0, rows)
+
+
+    def step(self, conway, board, generations):
+        #{generation: bool board} for every generation, through the get_board_next_gen contract
+        rows, cols = board.shape
+        board1, board2 = conway.create_boards(board)
+        boards = {}
+
+        try:
+            for gen in range(generations):
+                board1, board2 = conway.get_board_next_gen(rows, cols, 1, board1, board2)
+                boards[gen + 1] = np.array(conway.to_bool_array(rows, cols, board1), dtype=bool)
+        finally:
+            if hasattr(conway, 'close'):
+                conway.close()
+
+        return boards
+
+
+    def run_reference(self, board, generations):
+        #the hard coded B3/S23 branches for Conway's rule, the rule table for anything else
+        rule = None if self.rule.rulestring == 'B3/S23' else self.rule
+
+        return self.step(ConwayLogic(rule), board, generations)
+
+
+    def run_advance(self, board, generations):
+        #temporally blocked NumpyConwayLogic.advance, in sweeps of 5 generations 3 deep over bands of 4 rows,
+        #so halos wrap the torus and blocks end part way through a sweep
+        conway = NumpyConwayLogic(self.rule)
+        boards = {}
+        gen = 0
+
+        while gen < generations:
+            k = min(5, generations - gen)
+            board = conway.advance(board, k, depth=3, band_rows=4)
+            gen += k
+            boards[gen] = board
+
+        return boards
+
+
+    def get_candidates(self, engine):
+        #[(variant, run(board, generations) -> {generation: bool board})], small tiles and blocks are there to
+        #straddle the board edges
+        rule = self.rule
+        stepped = lambda factory: lambda board, generations: self.step(factory(), board, generations)
+
+        if engine == 'numpy':
+            return [('numpy', stepped(lambda: NumpyConwayLogic(rule))), ('numpy advance', self.run_advance)]
+
+        if engine == 'bitpacked':
+            return [('bitpacked', stepped(lambda: BitPackedConwayLogic(rule=rule))),
+                    ('bitpacked 3 row blocks', stepped(lambda: BitPackedConwayLogic(3, rule)))]
+
+        if engine == 'sparse':
+            return [('sparse', stepped(lambda: SparseConwayLogic(rule=rule))),
+                    ('sparse 5 cell tiles', stepped(lambda: SparseConwayLogic(5, rule)))]
+
+        if engine == 'parallel':
+            return [('parallel', stepped(lambda: ParallelConwayLogic(2, 3, rule)))]
+
+        return [(engine, stepped(lambda: ENGINES[engine](rule=rule)))]
+
+
+    def compare(self, run, board, generations, expected=None):
+        #first generation the candidate gets wrong (the error, if it raised), None if it agrees throughout
+        #expected: the reference boards, when they are already known
+        expected = expected or self.run_reference(board, generations)
+
+        try:
+            boards = run(board, generations)
+        except Exception as error:
+            return 0, error
+
+        for gen in sorted(boards):
+            if not np.array_equal(boards[gen], expected[gen]):
+                return gen, None
+
+        return None
+
+
+    def shrink(self, run, board, generations):
+        #smallest (board, generations) found that still fails, greedily cutting rows, columns and live cells
+        failure = self.compare(run, board, generations)
+        generations = failure[0] or generations
+
+        def fails(candidate):
+            return candidate.size and self.compare(run, candidate, generations) is not None
+
+        progress = True
+        while progress:
+            progress = False
+
+            for axis in (0, 1):
+                #halves first, then ever smaller runs of rows (columns), down to one at a time
+                size = board.shape[axis] // 2
+                while size:
+                    start = 0
+                    while start < board.shape[axis]:
+                        candidate = np.delete(board, np.s_[start:start + size], axis)
+                        if fails(candidate):
+                            board, progress = candidate, True
+                        else:
+                            start += size
+                    size //= 2
+
+            live = np.argwhere(board)
+            size = len(live) // 2
+            while size:
+                start = 0
+                while start < len(live):
+                    candidate = board.copy()
+                    candidate[tuple(live[start:start + size].T)] = False
+                    if fails(candidate):
+                        board, live, progress = candidate, np.concatenate([live[:start], live[start + size:]]), True
+                    else:
+                        start += size
+                size //= 2
+
+        failure = self.compare(run, board, generations)
+
+        return board, failure[0] or generations, failure[1]
+
+
+    def run(self, log=None):
+        #{engine: failures} for every variant of every engine over every shape and density, each failure shrunk
+        #the reference boards are stepped once per case and shared by all the candidates
+        failures = {engine: [] for engine in self.engines}
+        candidates = [(engine, variant, run) for engine in self.engines for variant, run in self.get_candidates(engine)]
+        case = 0
+
+        for rows, cols in self.get_shapes():
+            for prob in self.probs:
+                case += 1
+                board = self.get_board(rows, cols, prob, case)
+                expected = self.run_reference(board, self.generations)
+
+                for engine, variant, run in candidates:
+                    if self.compare(run, board, self.generations, expected) is None:
+                        continue
+
+                    shrunk, generation, error = self.shrink(run, board, self.generations)
+                    failure = {
+                        'engine': engine,
+                        'variant': variant,
+                        'rule': self.rule.rulestring,
+                        'rows': rows,
+                        'cols': cols,
+                        'prob': prob,
+                        'seed': [self.seed, case],
+                        'generation': generation,
+                        'error': repr(error) if error is not None else None,
+                        'board': to_plaintext(shrunk),
+                    }
+                    failures[engine].append(failure)
+
+                    if log:
+                        log(format_failure(failure))
+
+        return failures
+
+
+
+def to_plaintext(board):
+    #rows of '.' and 'O', the plaintext pattern convention
+    return [''.join('O' if cell else '.' for cell in row) for row in board]
+
+
+def format_failure(failure):
+    cause = failure['error'] or f"differs from the reference at generation {failure['generation']}"
+    lines = [f"MISMATCH {failure['variant']} {failure['rule']} {failure['rows']}x{failure['cols']} p={failure['prob']} "
+             f"seed={failure['seed']}: {cause}, shrunk to {len(failure['board'])}x{len(failure['board'][0])}:"]
+
+    return '\n'.join(lines + ['    ' + row for row in failure['board']])
+
+
+
+class VerifyCLI():
+
+    def main(argv=None):
+
+        parser = argparse.ArgumentParser(description='Check the stepping engines against the reference ConwayLogic')
+        parser.add_argument('--engines', default=','.join(name for name in ENGINES if name != 'reference'),
+                            help='comma separated engine names')
+        parser.add_argument('--generations', type=int, default=32)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--rule', default='B3/S23', help='Life-like rulestring, e.g. B36/S23')
+        parser.add_argument('--probs', default='0.25,0.5', help='comma separated initial densities')
+        parser.add_argument('--random-shapes', type=int, default=8, help='seeded random shapes on top of the fixed ones')
+        args = parser.parse_args(argv)
+
+        verifier = Verifier(args.engines.split(','), args.generations, args.seed, args.rule,
+                            [float(prob) for prob in args.probs.split(',')], random_shapes=args.random_shapes)
+        results = verifier.run(log=print)
+
+        for engine, failures in results.items():
+            print(f"{engine}: {'FAILED ' + str(len(failures)) if failures else 'ok'}")
+
+        if any(results.values()):
+            sys.exit(1)
+
+        return results
+
+
+    if __name__ == '__main__':
+        main()